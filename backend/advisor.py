@@ -0,0 +1,32 @@
+import numpy as np
+
+# Advisor Logic, as lookup tables so whole batches can be labelled at once.
+# A score >= SCORE_THRESHOLDS[i] moves the wine up to tier i + 1.
+SCORE_THRESHOLDS = np.array([6.0, 7.5])
+VERDICTS = np.array([
+    "Below Average",
+    "Fine Table Wine",
+    "Exceptional Vintage",
+], dtype=object)
+ADVICE = np.array([
+    "This wine may have noticeable flaws or lacks balance. Might be best used for cooking or sangria.",
+    "A solid, enjoyable wine with good character. Perfect for daily consumption or casual dining.",
+    "This wine shows outstanding complexity and balance. A truly superior choice suitable for aging.",
+], dtype=object)
+
+
+def round_scores(predictions):
+    """Round raw model output to the one-decimal score shown to users."""
+    return np.round(np.asarray(predictions, dtype=np.float64), 1)
+
+
+def verdict_tiers(scores):
+    """Vectorized tier index (0 = Below Average ... 2 = Exceptional) per score."""
+    return np.searchsorted(SCORE_THRESHOLDS, scores, side="right")
+
+
+def advise(predictions):
+    """Return (scores, verdicts, advice) arrays aligned with `predictions`."""
+    scores = round_scores(predictions)
+    tiers = verdict_tiers(scores)
+    return scores, VERDICTS[tiers], ADVICE[tiers]
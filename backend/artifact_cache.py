@@ -0,0 +1,138 @@
+import gzip
+import hashlib
+import os
+import threading
+from dataclasses import dataclass
+from email.utils import formatdate, parsedate_to_datetime
+
+from starlette.responses import Response
+
+# Validators are always checked; clients may reuse a copy only after a 304
+CACHE_CONTROL = "public, no-cache"
+# Bodies smaller than this aren't worth a gzip variant
+MIN_GZIP_BYTES = 256
+
+
+@dataclass(frozen=True)
+class CachedArtifact:
+    """One rendered response body plus its validators and gzip variant."""
+    body: bytes
+    gzipped: bytes
+    media_type: str
+    etag: str
+    last_modified: str
+    mtime: float
+
+
+class ArtifactCache:
+    """Serves small artifact files from memory with ETag/Last-Modified validation.
+
+    Each path is read and rendered once (`render(raw bytes) -> body bytes`),
+    hashed for a strong ETag, and, for text types, gzipped ahead of time.
+    Every lookup stats the file and re-renders only when its resolved path,
+    mtime or size changed, so a retrain, report regeneration or promotion is
+    picked up on the next request. Conditional requests matching the current ETag get a 304.
+    """
+
+    def __init__(self, cache_control=CACHE_CONTROL):
+        self.cache_control = cache_control
+        self._entries = {}  # path -> ((real path, mtime, size), CachedArtifact)
+        self._lock = threading.Lock()
+        # Counters for /metrics/artifacts
+        self.hits = 0
+        self.loads = 0
+        self.not_modified = 0
+
+    def get(self, path, media_type, render=None, compress=True):
+        """The cached artifact for `path`, or None if the file does not exist."""
+        # Through a registry alias the same path names another version's file after a promotion
+        real_path = os.path.realpath(path)
+        try:
+            st = os.stat(real_path)
+        except FileNotFoundError:
+            self._entries.pop(path, None)
+            return None
+        signature = (real_path, st.st_mtime_ns, st.st_size)
+        cached = self._entries.get(path)
+        if cached is not None and cached[0] == signature:
+            self.hits += 1
+            return cached[1]
+        with self._lock:
+            cached = self._entries.get(path)
+            if cached is not None and cached[0] == signature:
+                return cached[1]
+            with open(real_path, "rb") as f:
+                raw = f.read()
+            body = render(raw) if render is not None else raw
+            digest = hashlib.sha256(body).hexdigest()[:32]
+            gzipped = None
+            if compress and len(body) >= MIN_GZIP_BYTES:
+                # mtime=0 keeps the gzip bytes (and so the response) deterministic
+                gzipped = gzip.compress(body, compresslevel=9, mtime=0)
+                if len(gzipped) >= len(body):
+                    gzipped = None
+            artifact = CachedArtifact(
+                body=body,
+                gzipped=gzipped,
+                media_type=media_type,
+                etag=f'"{digest}"',
+                last_modified=formatdate(st.st_mtime, usegmt=True),
+                mtime=st.st_mtime,
+            )
+            self._entries[path] = (signature, artifact)
+            self.loads += 1
+            return artifact
+
+    def response(self, request, artifact):
+        """200 with the best encoding the client accepts, or 304 if it is current."""
+        use_gzip = artifact.gzipped is not None and "gzip" in request.headers.get("accept-encoding", "")
+        # Strong ETags are per representation, so the gzip body gets its own
+        etag = f'{artifact.etag[:-1]}-gzip"' if use_gzip else artifact.etag
+        headers = {
+            "ETag": etag,
+            "Last-Modified": artifact.last_modified,
+            "Cache-Control": self.cache_control,
+        }
+        if artifact.gzipped is not None:
+            headers["Vary"] = "Accept-Encoding"
+        if _not_modified(request, artifact):
+            self.not_modified += 1
+            return Response(status_code=304, headers=headers)
+        if use_gzip:
+            headers["Content-Encoding"] = "gzip"
+            return Response(artifact.gzipped, media_type=artifact.media_type, headers=headers)
+        return Response(artifact.body, media_type=artifact.media_type, headers=headers)
+
+    def stats(self):
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "loads": self.loads,
+            "not_modified": self.not_modified,
+        }
+
+
+def _not_modified(request, artifact):
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        # If-None-Match takes precedence over If-Modified-Since (RFC 9110 13.1.3)
+        if if_none_match.strip() == "*":
+            return True
+        current = artifact.etag.strip('"')
+        for tag in if_none_match.split(","):
+            tag = tag.strip()
+            if tag.startswith("W/"):
+                tag = tag[2:]
+            tag = tag.strip('"')
+            if tag in (current, f"{current}-gzip"):
+                return True
+        return False
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since is not None:
+        try:
+            since = parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+        # HTTP dates have one-second resolution
+        return int(artifact.mtime) <= since
+    return False
@@ -0,0 +1,128 @@
+import asyncio
+import time
+
+import numpy as np
+from starlette.concurrency import run_in_threadpool
+
+
+class QueueFullError(Exception):
+    """Raised when the coalescer queue is at capacity."""
+
+
+class MicroBatcher:
+    """Coalesces concurrent single-row predictions into one vectorized call.
+
+    Each request queues its row and awaits a future. A single worker task
+    takes the first queued row, keeps collecting until `window_ms` has passed
+    or `max_batch` rows are waiting, stacks them into one matrix, runs one
+    `model.predict` (on `executor` if given, else the threadpool) and resolves
+    every caller's future with its own prediction.
+    """
+
+    def __init__(self, window_ms=2.0, max_batch=64, max_queue=10000, metrics=None, executor=None):
+        self.window = window_ms / 1000.0
+        self.metrics = metrics
+        self.executor = executor
+        self.max_batch = max(1, int(max_batch))
+        self.max_queue = max_queue
+        self._queue = None
+        self._task = None
+        # Counters for /metrics/batching
+        self.requests = 0
+        self.batches = 0
+        self.rows = 0
+        self.largest_batch = 0
+        self.max_queue_depth = 0
+        self.rejected = 0
+
+    def start(self):
+        self._queue = asyncio.Queue(maxsize=self.max_queue)
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    @property
+    def running(self):
+        return self._task is not None
+
+    async def submit(self, snapshot, row):
+        """Queue one float64 row (in `snapshot.feature_order`); await its prediction."""
+        future = asyncio.get_running_loop().create_future()
+        try:
+            self._queue.put_nowait((snapshot, row, future))
+        except asyncio.QueueFull:
+            self.rejected += 1
+            raise QueueFullError("Prediction queue is full")
+        self.requests += 1
+        self.max_queue_depth = max(self.max_queue_depth, self._queue.qsize())
+        return await future
+
+    async def _collect(self):
+        batch = [await self._queue.get()]
+        deadline = time.monotonic() + self.window
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self):
+        while True:
+            batch = await self._collect()
+            # Requests that raced a hot-reload may carry different snapshots;
+            # score each group with the model its row was built for. Groups are
+            # dispatched together so a slow one doesn't hold up the others.
+            groups = {}
+            for item in batch:
+                groups.setdefault(id(item[0]), []).append(item)
+            await asyncio.gather(*(self._flush(items) for items in groups.values()))
+
+    async def _flush(self, items):
+        snapshot = items[0][0]
+        X = np.vstack([row for _, row, _ in items])
+        self.batches += 1
+        self.rows += len(items)
+        self.largest_batch = max(self.largest_batch, len(items))
+        if self.metrics is not None:
+            self.metrics.observe_size("wine_batch_rows", "coalesced", len(items), help="Rows per batch")
+        try:
+            if self.executor is not None:
+                predictions = await self.executor.run(snapshot.model.predict, X, endpoint="coalesced")
+            else:
+                predictions = await run_in_threadpool(snapshot.model.predict, X)
+        except Exception as e:
+            for _, _, future in items:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, _, future), prediction in zip(items, predictions):
+            # The caller may have gone away (client disconnect cancels the handler)
+            if not future.done():
+                future.set_result(float(prediction))
+
+    def stats(self):
+        return {
+            "enabled": self.running,
+            "window_ms": self.window * 1000.0,
+            "max_batch": self.max_batch,
+            "max_queue": self.max_queue,
+            "queue_depth": self._queue.qsize() if self._queue is not None else 0,
+            "max_queue_depth": self.max_queue_depth,
+            "requests": self.requests,
+            "batches": self.batches,
+            "rows": self.rows,
+            "mean_batch_size": self.rows / self.batches if self.batches else 0.0,
+            "largest_batch": self.largest_batch,
+            "rejected": self.rejected,
+        }
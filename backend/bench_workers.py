@@ -0,0 +1,142 @@
+# Benchmark the multi-process inference pool: memory per worker and throughput
+# as the worker count grows, for the shared mmap bundle vs. a private
+# joblib-unpickled pipeline in every worker.
+#
+#   python bench_workers.py --workers 1 2 4 --requests 2000
+#
+# RSS counts shared pages in every process; PSS splits them between the
+# processes mapping them, so it shows what each extra worker really costs.
+
+import argparse
+import json
+import os
+import shutil
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import numpy as np
+
+from compiled_model import compile_pipeline
+import inference_pool
+
+MODEL_PATH = "best_model_wine_quality.joblib"
+_joblib_model = None
+
+
+def _joblib_init(model_path):
+    global _joblib_model
+    import joblib
+    _joblib_model = joblib.load(model_path)
+
+
+def _joblib_predict(X):
+    return _joblib_model.predict(X)
+
+
+def _ping(_):
+    return os.getpid()
+
+
+def memory_kb(pid):
+    """(RSS, PSS) of a process in kB, from /proc (Linux only)."""
+    rss = pss = None
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            for line in f:
+                if line.startswith("Rss:"):
+                    rss = int(line.split()[1])
+                elif line.startswith("Pss:"):
+                    pss = int(line.split()[1])
+    except OSError:
+        pass
+    return rss, pss
+
+
+def make_pool(mode, workers, bundle_dir):
+    # Started the way the server's pool starts its workers
+    if mode == "bundle":
+        return ProcessPoolExecutor(workers, mp_context=inference_pool.MP_CONTEXT,
+                                   initializer=inference_pool._worker_init, initargs=(bundle_dir,))
+    return ProcessPoolExecutor(workers, mp_context=inference_pool.MP_CONTEXT,
+                               initializer=_joblib_init, initargs=(MODEL_PATH,))
+
+
+def run(mode, workers, bundle_dir, rows, n_requests, batch_size, concurrency):
+    pool = make_pool(mode, workers, bundle_dir)
+    if mode == "bundle":
+        predict = lambda X: pool.submit(inference_pool._worker_predict, bundle_dir, X).result()
+    else:
+        predict = lambda X: pool.submit(_joblib_predict, X).result()
+    try:
+        # Warm every worker (model loaded, first predict done) before timing
+        list(pool.map(_ping, range(workers * 4)))
+        with ThreadPoolExecutor(workers * 2) as warm:
+            list(warm.map(predict, [rows[:batch_size]] * workers * 4))
+
+        batches = [rows[(i * batch_size) % len(rows):][:batch_size] for i in range(n_requests)]
+        t0 = time.perf_counter()
+        with ThreadPoolExecutor(concurrency) as clients:
+            list(clients.map(predict, batches))
+        elapsed = time.perf_counter() - t0
+
+        pids = [p.pid for p in pool._processes.values()]
+        mem = [memory_kb(pid) for pid in pids]
+        rss = [m[0] for m in mem if m[0] is not None]
+        pss = [m[1] for m in mem if m[1] is not None]
+        return {
+            "mode": mode,
+            "workers": workers,
+            "batch_size": batch_size,
+            "requests_per_sec": n_requests / elapsed,
+            "rows_per_sec": n_requests * batch_size / elapsed,
+            "rss_kb_per_worker": sum(rss) / len(rss) if rss else None,
+            "pss_kb_per_worker": sum(pss) / len(pss) if pss else None,
+        }
+    finally:
+        pool.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark multi-process inference workers.")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--modes", nargs="+", choices=["bundle", "joblib"], default=["bundle", "joblib"])
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--batch-size", type=int, default=1)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--output", default="bench_workers.json")
+    args = parser.parse_args()
+
+    import joblib
+    with open("feature_names.json", "r") as f:
+        feature_names = json.load(f)
+    # A fresh directory every run: export_bundle keeps an existing bundle, which may be an older model's
+    scratch = tempfile.mkdtemp(prefix="wine_bench_bundle_")
+    bundle = compile_pipeline(joblib.load(MODEL_PATH), feature_names).export_bundle(os.path.join(scratch, "bundle"))
+
+    # Wine-shaped random rows; throughput does not depend on the values
+    rng = np.random.default_rng(0)
+    scale = np.array([15, 1.5, 1, 30, 0.3, 100, 300, 1.01, 4, 1.5, 15])
+    rows = rng.random((4096, len(feature_names))) * scale
+
+    results = []
+    try:
+        for mode in args.modes:
+            for workers in args.workers:
+                result = run(mode, workers, bundle, rows, args.requests, args.batch_size, args.concurrency)
+                results.append(result)
+                rss = result["rss_kb_per_worker"]
+                pss = result["pss_kb_per_worker"]
+                print(f"{mode:7s} workers={workers:2d}  {result['requests_per_sec']:9.0f} req/s  "
+                      f"RSS/worker={rss / 1024 if rss else float('nan'):6.1f} MB  "
+                      f"PSS/worker={pss / 1024 if pss else float('nan'):6.1f} MB")
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"Saved {args.output}")
+
+
+if __name__ == "__main__":
+    main()
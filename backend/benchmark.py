@@ -0,0 +1,256 @@
+# Latency/throughput benchmark for the prediction API and the model itself.
+#
+#   python benchmark.py                                  # in-process server.app
+#   python benchmark.py --url http://localhost:8000      # a running uvicorn
+#   python benchmark.py --mix predict=8,batch=1,features=1,metrics=1 --concurrency 32
+#   python benchmark.py --baseline bench_before.json --max-regression 0.10
+#
+# Results are written as JSON (--output). With --baseline, every latency,
+# throughput and model-timing figure is compared against the earlier run and
+# the script exits non-zero if any got worse by more than --max-regression.
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+
+import httpx
+import numpy as np
+
+DEFAULT_MIX = "predict=8,batch=1,features=1,metrics=1"
+MODEL_BATCH_SIZES = [1, 10, 100, 1000, 10000, 100000]
+# Wine-shaped feature scales for random payloads (feature_names.json order)
+FEATURE_SCALE = np.array([15, 1.5, 1, 30, 0.3, 100, 300, 1.01, 4, 1.5, 15])
+
+
+def percentiles(samples):
+    if not samples:
+        return {}
+    a = np.asarray(samples) * 1000.0
+    return {
+        "count": len(samples),
+        "p50_ms": float(np.percentile(a, 50)),
+        "p95_ms": float(np.percentile(a, 95)),
+        "p99_ms": float(np.percentile(a, 99)),
+        "mean_ms": float(a.mean()),
+    }
+
+
+def parse_mix(text):
+    mix = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        mix[name.strip()] = float(weight or 1)
+    return mix
+
+
+def make_requests(feature_names, batch_rows, seed=0):
+    """Request factories per endpoint name: () -> (method, path, json body or raw bytes)."""
+    rng = np.random.default_rng(seed)
+    rows = rng.random((1024, len(feature_names))) * FEATURE_SCALE[:len(feature_names)]
+
+    def predict():
+        row = rows[rng.integers(len(rows))]
+        return "POST", "/predict", {"features": dict(zip(feature_names, row.tolist()))}
+
+    def predict_values():
+        return "POST", "/predict", {"values": rows[rng.integers(len(rows))].tolist()}
+
+    def predict_binary():
+        # Packed little-endian float64, parsed server-side with np.frombuffer
+        return "POST", "/predict", rows[rng.integers(len(rows))].astype("<f8").tobytes()
+
+    def batch():
+        start = int(rng.integers(len(rows) - batch_rows)) if batch_rows < len(rows) else 0
+        return "POST", "/predict/batch", {"rows": rows[start:start + batch_rows].tolist()}
+
+    return {
+        "predict": predict,
+        "predict_values": predict_values,
+        "predict_binary": predict_binary,
+        "batch": batch,
+        "features": lambda: ("GET", "/features", None),
+        "metrics": lambda: ("GET", "/metrics", None),
+        "ready": lambda: ("GET", "/ready", None),
+    }
+
+
+async def drive(client, factories, mix, n_requests, concurrency, seed=0):
+    """Fire n_requests drawn from `mix` with `concurrency` in flight."""
+    names = list(mix)
+    weights = [mix[n] for n in names]
+    chooser = random.Random(seed)
+    plan = chooser.choices(names, weights=weights, k=n_requests)
+    latencies = {name: [] for name in names}
+    errors = {name: 0 for name in names}
+    queue = asyncio.Queue()
+    for name in plan:
+        queue.put_nowait(name)
+
+    async def worker():
+        while True:
+            try:
+                name = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            method, path, body = factories[name]()
+            t0 = time.perf_counter()
+            try:
+                if isinstance(body, bytes):
+                    response = await client.request(method, path, content=body,
+                                                    headers={"content-type": "application/x-wine-f64"})
+                else:
+                    response = await client.request(method, path, json=body)
+                ok = response.status_code < 400
+            except httpx.HTTPError:
+                ok = False
+            latencies[name].append(time.perf_counter() - t0)
+            if not ok:
+                errors[name] += 1
+
+    cpu0 = time.process_time()
+    t0 = time.perf_counter()
+    await asyncio.gather(*[worker() for _ in range(concurrency)])
+    wall = time.perf_counter() - t0
+    cpu = time.process_time() - cpu0
+
+    all_latencies = [x for samples in latencies.values() for x in samples]
+    return {
+        "requests": n_requests,
+        "concurrency": concurrency,
+        "wall_s": wall,
+        "requests_per_sec": n_requests / wall,
+        # In-process runs include the server's CPU; --url runs only the client's
+        "cpu_ms_per_request": cpu / n_requests * 1000.0,
+        "errors": errors,
+        "overall": percentiles(all_latencies),
+        "endpoints": {name: percentiles(samples) for name, samples in latencies.items() if samples},
+    }
+
+
+async def bench_api(args, feature_names):
+    factories = make_requests(feature_names, args.batch_rows)
+    mix = parse_mix(args.mix)
+    unknown = set(mix) - set(factories)
+    if unknown:
+        raise SystemExit(f"Unknown endpoints in --mix: {sorted(unknown)}")
+
+    if args.url:
+        async with httpx.AsyncClient(base_url=args.url, timeout=60.0) as client:
+            await drive(client, factories, mix, min(50, args.requests), args.concurrency)
+            return await drive(client, factories, mix, args.requests, args.concurrency)
+
+    import server
+    async with server.lifespan(server.app):
+        transport = httpx.ASGITransport(app=server.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=60.0) as client:
+            await drive(client, factories, mix, min(50, args.requests), args.concurrency)  # warm-up
+            return await drive(client, factories, mix, args.requests, args.concurrency)
+
+
+def bench_model(model, n_features, batch_sizes, min_time=0.2):
+    """Time model.predict alone for each batch size (median of repeats)."""
+    rng = np.random.default_rng(0)
+    results = {}
+    for n in batch_sizes:
+        X = rng.random((n, n_features)) * FEATURE_SCALE[:n_features]
+        model.predict(X)
+        times = []
+        start = time.perf_counter()
+        while len(times) < 3 or (time.perf_counter() - start < min_time and len(times) < 1000):
+            t0 = time.perf_counter()
+            model.predict(X)
+            times.append(time.perf_counter() - t0)
+        median = float(np.median(times))
+        results[str(n)] = {"median_ms": median * 1000.0, "rows_per_sec": n / median}
+        print(f"  predict batch={n:>6d}: {median * 1000.0:9.3f} ms  ({n / median:12.0f} rows/s)")
+    return results
+
+
+# (path in results, True if higher is better)
+def comparable_metrics(results):
+    out = {}
+    api = results.get("api")
+    if api:
+        out["api.requests_per_sec"] = (api["requests_per_sec"], True)
+        out["api.cpu_ms_per_request"] = (api["cpu_ms_per_request"], False)
+        for name, stats in [("overall", api["overall"])] + list(api["endpoints"].items()):
+            for p in ("p50_ms", "p95_ms", "p99_ms"):
+                out[f"api.{name}.{p}"] = (stats[p], False)
+    for n, stats in results.get("model", {}).items():
+        out[f"model.batch_{n}.median_ms"] = (stats["median_ms"], False)
+    return out
+
+
+def compare(current, baseline, max_regression):
+    """Return (metric, before, after, change) for every regression beyond the threshold."""
+    now = comparable_metrics(current)
+    regressions = []
+    for key, (before, higher_is_better) in comparable_metrics(baseline).items():
+        if key not in now or not before:
+            continue
+        after = now[key][0]
+        change = (after - before) / before
+        worse = -change if higher_is_better else change
+        if worse > max_regression:
+            regressions.append((key, before, after, change))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the Wine Quality API and model.")
+    parser.add_argument("--url", help="benchmark a running server instead of server.app in-process")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help=f"endpoint weights (default: {DEFAULT_MIX})")
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--batch-rows", type=int, default=100, help="rows per /predict/batch request")
+    parser.add_argument("--model-batch-sizes", type=int, nargs="+", default=MODEL_BATCH_SIZES)
+    parser.add_argument("--skip-api", action="store_true")
+    parser.add_argument("--skip-model", action="store_true")
+    parser.add_argument("--output", default="benchmark_results.json")
+    parser.add_argument("--baseline", help="earlier results JSON to compare against")
+    parser.add_argument("--max-regression", type=float, default=0.10,
+                        help="allowed relative slowdown before failing (default 0.10 = 10%%)")
+    args = parser.parse_args()
+
+    with open("feature_names.json", "r") as f:
+        feature_names = json.load(f)
+
+    results = {"timestamp": time.time(), "args": vars(args), "pid": os.getpid()}
+    if not args.skip_api:
+        print(f"API: {args.requests} requests, concurrency {args.concurrency}, mix {args.mix}")
+        api = asyncio.run(bench_api(args, feature_names))
+        results["api"] = api
+        print(f"  {api['requests_per_sec']:.0f} req/s, {api['cpu_ms_per_request']:.3f} ms CPU/request")
+        for name, stats in [("overall", api["overall"])] + list(api["endpoints"].items()):
+            print(f"  {name:10s} p50={stats['p50_ms']:8.3f} ms  p95={stats['p95_ms']:8.3f} ms  "
+                  f"p99={stats['p99_ms']:8.3f} ms  (n={stats['count']}, errors={api['errors'].get(name, 0)})")
+
+    if not args.skip_model:
+        from model_store import ModelHolder
+        mode = os.environ.get("WINE_MODEL_MODE", "sklearn")
+        model_path = "best_model_wine_quality.wqm" if mode == "wqm" else "best_model_wine_quality.joblib"
+        snapshot = ModelHolder(model_path, "feature_names.json", mode=mode).load()
+        print(f"Model predict in isolation ({snapshot.mode}):")
+        results["model"] = bench_model(snapshot.model, len(feature_names), args.model_batch_sizes)
+
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"Saved {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, "r") as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.max_regression)
+        for key, before, after, change in regressions:
+            print(f"REGRESSION {key}: {before:.4g} -> {after:.4g} ({change:+.1%})")
+        if regressions:
+            sys.exit(1)
+        print(f"No regressions beyond {args.max_regression:.0%} against {args.baseline}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,251 @@
+# Bin the training data once and share it across hyperparameter-search fits.
+#
+# HistGradientBoostingRegressor starts every fit by quantile-binning X into a
+# uint8 matrix. In a CV search every candidate re-bins exactly the same fold
+# data (early stopping carves out the same validation split, since
+# random_state is fixed), so the work is repeated candidates x folds times.
+#
+# BinCachedHGBRegressor keys the binning on the data's content hash and the
+# binner settings. The first fit to see a fold bins it and saves the uint8
+# matrix (.npy) and the fitted binner under WINE_BIN_CACHE_DIR. Every later
+# fit, in this process or any joblib worker, memory-maps the same read-only
+# file, so the binned data is never recomputed or copied. The bins are the
+# ones the plain estimator would compute, so fits and scores are identical.
+#
+#   python bin_cache.py                  # time/memory on the wine data
+#   python bin_cache.py --upscale 100    # ... and on a 100x synthetic version
+
+import hashlib
+import os
+import pickle
+import shutil
+import tempfile
+import time
+
+import numpy as np
+from sklearn.ensemble import HistGradientBoostingRegressor
+
+# Unset -> binning is not cached (the estimator behaves exactly like its parent)
+ENV_DIR = "WINE_BIN_CACHE_DIR"
+
+# Open memmaps per process, so repeated fits in one worker skip even np.load
+_opened = {}
+# Per-process counters (the benchmark runs the search in-process to read them)
+stats = {"binned": 0, "reused": 0, "bin_seconds": 0.0}
+
+
+def _key(X, mapper, is_training_data):
+    h = hashlib.sha1()
+    X = np.ascontiguousarray(X)
+    h.update(repr((X.shape, X.dtype.str, is_training_data)).encode("utf-8"))
+    h.update(repr((mapper.n_bins, mapper.subsample, mapper.random_state,
+                   mapper.is_categorical, mapper.known_categories)).encode("utf-8"))
+    if not is_training_data:
+        # Validation data is binned with the thresholds fitted on the training part
+        h.update(b"".join(np.asarray(t).tobytes() for t in mapper.bin_thresholds_))
+    h.update(X.data)
+    return h.hexdigest()
+
+
+def _save(cache_dir, key, X_binned, mapper):
+    # Concurrent workers may race on the same key; both write identical
+    # files and rename into place, so readers only ever see complete ones.
+    tmp = tempfile.mkdtemp(dir=cache_dir, prefix=f".{key}.")
+    try:
+        np.save(os.path.join(tmp, "binned.npy"), X_binned)
+        os.replace(os.path.join(tmp, "binned.npy"), os.path.join(cache_dir, f"{key}.npy"))
+        if mapper is not None:
+            with open(os.path.join(tmp, "mapper.pkl"), "wb") as f:
+                pickle.dump(mapper, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(os.path.join(tmp, "mapper.pkl"), os.path.join(cache_dir, f"{key}.mapper.pkl"))
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+def _load(cache_dir, key, is_training_data):
+    if key in _opened:
+        return _opened[key]
+    path = os.path.join(cache_dir, f"{key}.npy")
+    mapper_path = os.path.join(cache_dir, f"{key}.mapper.pkl")
+    # The mapper is renamed in last, so its presence means the entry is complete
+    if is_training_data and not os.path.exists(mapper_path):
+        return None
+    if not os.path.exists(path):
+        return None
+    mapper = None
+    if is_training_data:
+        with open(mapper_path, "rb") as f:
+            mapper = pickle.load(f)
+    # Plain ndarray view: avoids np.memmap subclass overhead on every slice
+    entry = _opened[key] = (np.asarray(np.load(path, mmap_mode="r")), mapper)
+    return entry
+
+
+class BinCachedHGBRegressor(HistGradientBoostingRegressor):
+    """HistGradientBoostingRegressor that reuses cached binned data between fits.
+
+    Only meant for searches: refit the final model with the plain estimator so
+    the saved pipeline does not depend on this module.
+    """
+
+    def _bin_data(self, X, is_training_data):
+        cache_dir = os.environ.get(ENV_DIR)
+        if not cache_dir:
+            return super()._bin_data(X, is_training_data)
+        key = _key(X, self._bin_mapper, is_training_data)
+        entry = _load(cache_dir, key, is_training_data)
+        if entry is not None:
+            X_binned, mapper = entry
+            if is_training_data:
+                self._bin_mapper = mapper
+            stats["reused"] += 1
+            return X_binned
+        t0 = time.perf_counter()
+        X_binned = super()._bin_data(X, is_training_data)
+        stats["binned"] += 1
+        stats["bin_seconds"] += time.perf_counter() - t0
+        _save(cache_dir, key, X_binned, self._bin_mapper if is_training_data else None)
+        return X_binned
+
+
+def bin_cache_dir(root=None):
+    """Create a fresh cache directory and point WINE_BIN_CACHE_DIR at it.
+
+    Call before the search starts so joblib workers inherit the setting.
+    """
+    path = tempfile.mkdtemp(prefix="wine_bins_", dir=root)
+    os.environ[ENV_DIR] = path
+    return path
+
+
+def clear_bin_cache(path):
+    _opened.clear()
+    if os.environ.get(ENV_DIR) == path:
+        del os.environ[ENV_DIR]
+    shutil.rmtree(path, ignore_errors=True)
+
+
+class _TimedHGBRegressor(HistGradientBoostingRegressor):
+    """Plain estimator that only counts binning time (benchmark baseline)."""
+
+    def _bin_data(self, X, is_training_data):
+        t0 = time.perf_counter()
+        X_binned = super()._bin_data(X, is_training_data)
+        stats["binned"] += 1
+        stats["bin_seconds"] += time.perf_counter() - t0
+        return X_binned
+
+
+def _run_search(variant, upscale, candidates, max_iter, n_jobs):
+    """One timed RandomizedSearchCV (plain or cached estimator); returns a summary dict."""
+    import resource
+
+    from scipy.stats import randint, uniform
+    from sklearn.metrics import make_scorer
+    from sklearn.model_selection import RandomizedSearchCV
+    from sklearn.pipeline import Pipeline
+
+    from wine_data import load_wine_data
+
+    X, y, _ = load_wine_data()
+    X = np.asarray(X)
+    if upscale > 1:
+        rng = np.random.default_rng(0)
+        X = np.tile(X, (upscale, 1)) * rng.normal(1.0, 0.01, (len(X) * upscale, X.shape[1]))
+        y = np.tile(y, upscale)
+
+    def weighted_mae(y_true, y_pred):
+        weights = np.where(y_true >= 7, 2.0, 1.0)
+        return np.average(np.abs(y_true - y_pred), weights=weights)
+
+    estimator_class = BinCachedHGBRegressor if variant == "cached" else _TimedHGBRegressor
+    cache_dir = bin_cache_dir() if variant == "cached" else None
+    search = RandomizedSearchCV(
+        Pipeline([("model", estimator_class(random_state=42, early_stopping=True))]),
+        {
+            "model__max_iter": randint(max_iter // 2, max_iter),
+            "model__learning_rate": uniform(0.01, 0.2),
+            "model__max_leaf_nodes": randint(16, 128),
+            "model__min_samples_leaf": randint(1, 50),
+            "model__max_depth": randint(3, 12),
+            "model__l2_regularization": uniform(0.0, 1.0),
+        },
+        n_iter=candidates, cv=4, random_state=42, n_jobs=n_jobs, refit=False,
+        scoring=make_scorer(weighted_mae, greater_is_better=False),
+    )
+    t0 = time.perf_counter()
+    try:
+        search.fit(X, y)
+    finally:
+        if cache_dir:
+            clear_bin_cache(cache_dir)
+    wall = time.perf_counter() - t0
+    return {
+        "variant": variant,
+        "rows": len(X),
+        "wall_s": wall,
+        # ru_maxrss is in kB on Linux; children covers joblib workers
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "peak_worker_rss_mb": resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024,
+        # Only complete when the search ran in this process (--jobs 1 or a single core)
+        "binning": dict(stats),
+        "scores": search.cv_results_["mean_test_score"].tolist(),
+    }
+
+
+def main():
+    import argparse
+    import json
+    import subprocess
+    import sys
+
+    parser = argparse.ArgumentParser(description="Measure binning-once vs. per-fit binning in a CV search.")
+    parser.add_argument("--upscale", type=int, nargs="+", default=[1, 100],
+                        help="dataset multipliers to benchmark (100 = synthetic 100x wine data)")
+    parser.add_argument("--candidates", type=int, default=6)
+    parser.add_argument("--max-iter", type=int, default=200)
+    parser.add_argument("--jobs", type=int, default=1)
+    parser.add_argument("--output", default="bin_cache_report.json")
+    parser.add_argument("--run", choices=["plain", "cached"], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run:
+        print(json.dumps(_run_search(args.run, args.upscale[0], args.candidates, args.max_iter, args.jobs)))
+        return
+
+    report = {}
+    for upscale in args.upscale:
+        runs = {}
+        for variant in ("plain", "cached"):
+            # Separate processes so peak RSS is measured per variant
+            out = subprocess.run(
+                [sys.executable, __file__, "--run", variant, "--upscale", str(upscale),
+                 "--candidates", str(args.candidates), "--max-iter", str(args.max_iter),
+                 "--jobs", str(args.jobs)],
+                check=True, capture_output=True, text=True,
+            ).stdout
+            runs[variant] = json.loads(out.strip().splitlines()[-1])
+        plain, cached = runs["plain"], runs["cached"]
+        same = plain.pop("scores") == cached.pop("scores")
+        report[f"x{upscale}"] = {
+            "plain": plain,
+            "cached": cached,
+            "speedup": plain["wall_s"] / cached["wall_s"],
+            "identical_scores": same,
+        }
+        print(f"x{upscale} ({plain['rows']} rows, {args.candidates} candidates x 4 folds): "
+              f"plain {plain['wall_s']:.1f}s / {max(plain['peak_rss_mb'], plain['peak_worker_rss_mb']):.0f} MB, "
+              f"cached {cached['wall_s']:.1f}s / "
+              f"{max(cached['peak_rss_mb'], cached['peak_worker_rss_mb']):.0f} MB, "
+              f"speedup {plain['wall_s'] / cached['wall_s']:.2f}x, identical scores: {same}")
+        print(f"  binning: plain {plain['binning']['binned']} x = {plain['binning']['bin_seconds']:.2f}s, "
+              f"cached {cached['binning']['binned']} x = {cached['binning']['bin_seconds']:.2f}s "
+              f"({cached['binning']['reused']} reused)")
+
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Saved {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,177 @@
+import csv
+import io
+import json
+
+import numpy as np
+
+from advisor import advise
+
+DEFAULT_CHUNK_ROWS = 4096
+# Longest line held while waiting for its newline; a wine row is well under 1 KiB
+MAX_LINE_BYTES = 64 * 1024
+FORMATS = ("csv", "ndjson")
+
+
+def detect_format(content_type=None, filename=None):
+    """Guess csv/ndjson from a Content-Type header or a file name."""
+    hint = (content_type or "").lower()
+    name = (filename or "").lower()
+    if "ndjson" in hint or "jsonl" in hint or "json" in hint or name.endswith((".ndjson", ".jsonl", ".json")):
+        return "ndjson"
+    return "csv"
+
+
+class RowParser:
+    """Incrementally turns CSV or NDJSON bytes into float64 chunks in feature order.
+
+    Feed it raw bytes as they arrive; it returns every completed
+    `(start_row, chunk)` pair of `chunk_rows` rows and holds back at most one
+    partial line plus one partial chunk, so memory does not depend on the
+    input size. A line longer than `max_line_bytes` is an error rather than
+    being buffered until its newline arrives. A bad line ends parsing: the
+    rows before it are still returned and the problem is left in `error`.
+    """
+
+    def __init__(self, fmt, feature_order, chunk_rows=DEFAULT_CHUNK_ROWS, max_line_bytes=MAX_LINE_BYTES):
+        if fmt not in FORMATS:
+            raise ValueError(f"Unsupported format '{fmt}' (expected one of {FORMATS})")
+        self.fmt = fmt
+        self.feature_order = list(feature_order)
+        self.chunk_rows = max(1, int(chunk_rows))
+        self.max_line_bytes = max_line_bytes
+        self.rows_seen = 0
+        # The first bad line (a ValueError); parsing stops there
+        self.error = None
+        self._tail = b""
+        self._rows = []
+        self._column_idx = None
+        self._delimiter = ","
+        # The first line may start with a byte-order mark (spreadsheet "UTF-8 CSV" exports)
+        self._encoding = "utf-8-sig"
+
+    def feed(self, data):
+        """Consume a block of bytes; return the list of full chunks now ready."""
+        if self.error is not None:
+            return []
+        lines = (self._tail + data).split(b"\n")
+        self._tail = lines.pop()
+        chunks = self._consume(lines)
+        if len(self._tail) > self.max_line_bytes and self.error is None:
+            self._fail(ValueError(f"Row {self.rows_seen + len(self._rows) + 1}: "
+                                  f"line longer than {self.max_line_bytes} bytes"), chunks)
+        return chunks
+
+    def close(self):
+        """Flush the trailing partial line and rows; return the last chunks."""
+        lines = [self._tail] if self._tail else []
+        self._tail = b""
+        chunks = self._consume(lines)
+        if self._rows:
+            chunks.append(self._take_chunk())
+        return chunks
+
+    def _fail(self, error, chunks):
+        # The rows before the bad line still go out as a (short) chunk
+        self.error = error
+        self._tail = b""
+        if self._rows:
+            chunks.append(self._take_chunk())
+
+    def _consume(self, lines):
+        chunks = []
+        for raw in lines:
+            try:
+                line = raw.decode(self._encoding).strip()
+                self._encoding = "utf-8"
+                if not line:
+                    continue
+                if self.fmt == "csv" and self._column_idx is None:
+                    self._read_header(line)
+                    continue
+                self._rows.append(self._parse_line(line))
+            except ValueError as e:
+                self._fail(e, chunks)
+                break
+            if len(self._rows) >= self.chunk_rows:
+                chunks.append(self._take_chunk())
+        return chunks
+
+    def _read_header(self, line):
+        # UCI exports use ';', most spreadsheet exports use ','
+        self._delimiter = ";" if line.count(";") > line.count(",") else ","
+        header = [h.strip().strip('"').replace(" ", "_") for h in line.split(self._delimiter)]
+        missing = [f for f in self.feature_order if f not in header]
+        if missing:
+            raise ValueError(f"CSV header is missing feature columns: {missing}")
+        self._column_idx = np.array([header.index(f) for f in self.feature_order])
+
+    def _parse_line(self, line):
+        row_no = self.rows_seen + len(self._rows) + 1
+        if self.fmt == "csv":
+            fields = next(csv.reader([line], delimiter=self._delimiter))
+            try:
+                # Empty cells become NaN, which the model treats as missing
+                return [float(fields[i]) if fields[i].strip() else np.nan for i in self._column_idx]
+            except (ValueError, IndexError):
+                raise ValueError(f"Row {row_no}: could not parse '{line[:80]}'")
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"Row {row_no}: invalid JSON ({e.msg})")
+        if not isinstance(record, dict):
+            raise ValueError(f"Row {row_no}: expected a JSON object, got '{line[:80]}'")
+        features = record.get("features", record)
+        try:
+            return [float(features[f]) for f in self.feature_order]
+        except KeyError as e:
+            raise ValueError(f"Row {row_no}: missing feature {e}")
+        except (AttributeError, TypeError, ValueError):
+            # `features` not an object, or a null / non-numeric value
+            raise ValueError(f"Row {row_no}: could not parse '{line[:80]}'")
+
+    def _take_chunk(self):
+        start = self.rows_seen
+        chunk = np.array(self._rows, dtype=np.float64)
+        self.rows_seen += len(self._rows)
+        self._rows = []
+        return start, chunk
+
+
+def format_header(fmt):
+    return "row,score,verdict\n" if fmt == "csv" else ""
+
+
+def format_results(fmt, start_row, predictions):
+    """Encode one chunk of predictions; rows are numbered from 1 across chunks."""
+    scores, verdicts, _ = advise(predictions)
+    rows = range(start_row + 1, start_row + len(scores) + 1)
+    if fmt == "csv":
+        out = io.StringIO()
+        for row, score, verdict in zip(rows, scores.tolist(), verdicts):
+            out.write(f"{row},{score},{verdict}\n")
+        return out.getvalue()
+    return "".join(
+        json.dumps({"row": row, "score": score, "verdict": verdict}) + "\n"
+        for row, score, verdict in zip(rows, scores.tolist(), verdicts)
+    )
+
+
+def format_error(fmt, message):
+    if fmt == "csv":
+        return f"error,,{message}\n"
+    return json.dumps({"error": message}) + "\n"
+
+
+def score_stream(blocks, model, feature_order, fmt, chunk_rows=DEFAULT_CHUNK_ROWS):
+    """Score an iterable of byte blocks, yielding encoded output as chunks complete."""
+    parser = RowParser(fmt, feature_order, chunk_rows)
+    yield format_header(fmt)
+    for block in blocks:
+        for start, chunk in parser.feed(block):
+            yield format_results(fmt, start, model.predict(chunk))
+        if parser.error is not None:
+            break
+    for start, chunk in parser.close():
+        yield format_results(fmt, start, model.predict(chunk))
+    if parser.error is not None:
+        yield format_error(fmt, str(parser.error))
@@ -0,0 +1,56 @@
+# Shared harness for the in-process server checks (test_backpressure.py,
+# test_explain.py, test_shadow.py, test_drift.py).
+#
+# server.py reads its WINE_* configuration once, at import time, and its
+# lifespan shuts the inference executor down for good. A check therefore
+# configures the environment through load_server() before the first import,
+# talks to the app through serving(), and runs in an interpreter of its own:
+# `python test_x.py`, or `pytest` (conftest.py starts one per check).
+import os
+import sys
+from contextlib import asynccontextmanager
+
+# No response cache, no reload polling, and the model in the backend directory
+SERVER_ENV = {"WINE_CACHE_SIZE": "0", "WINE_MODEL_CHECK_INTERVAL": "0", "WINE_MODEL_DIR": "."}
+
+
+def load_server(**env):
+    """Import server.py configured with SERVER_ENV plus `env`."""
+    settings = {**SERVER_ENV, **env}
+    if "server" in sys.modules:
+        stale = sorted(name for name, value in settings.items() if os.environ.get(name) != value)
+        if stale:
+            raise RuntimeError(f"server.py was already imported without {stale}; "
+                               "run each check in its own interpreter")
+        return sys.modules["server"]
+    os.environ.update(settings)
+    import server
+    return server
+
+
+@asynccontextmanager
+async def serving(server):
+    """Run the app's startup and shutdown around an in-process client."""
+    import httpx
+
+    async with server.lifespan(server.app):
+        transport = httpx.ASGITransport(app=server.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            yield client
+
+
+class Checks:
+    """Collects failed conditions so a check reports all of them before exiting."""
+
+    def __init__(self):
+        self.failed = False
+
+    def __call__(self, condition, message):
+        if not condition:
+            print(f"ERROR: {message}")
+            self.failed = True
+
+    def finish(self):
+        if self.failed:
+            sys.exit(1)
+        print("OK")
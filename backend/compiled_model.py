@@ -0,0 +1,287 @@
+# Flat-array ("compiled") form of the fitted HistGradientBoostingRegressor.
+#
+# All trees are packed into one struct-of-arrays node table, so scoring is a
+# handful of NumPy gathers per tree level instead of a trip through sklearn's
+# validation and binning machinery. Export with:
+#
+#   python compiled_model.py                      # -> best_model_wine_quality.npz
+#   python compiled_model.py --bundle DIR         # -> DIR/*.npy, memory-mappable
+#
+# A bundle directory holds one .npy file per node array plus meta.json. Loading it
+# with mmap lets every worker process share the same read-only pages.
+
+import json
+import os
+import shutil
+
+import numpy as np
+
+try:
+    import numba
+except ImportError:
+    numba = None
+
+# Rows scored per block in the vectorized evaluator; bounds the (rows x trees)
+# index matrices to a few MB however large the batch is.
+BLOCK_ROWS = 4096
+LINKS = ("identity", "log")
+NODE_ARRAYS = ("feature_idx", "threshold", "left", "right", "value", "missing_go_left", "roots")
+
+
+class CompiledModel:
+    """Struct-of-arrays tree ensemble scoring raw float64 feature matrices.
+
+    Node i of the ensemble splits on `feature_idx[i]` at `threshold[i]`; rows
+    with x <= threshold (or NaN when `missing_go_left[i]`) go to `left[i]`,
+    others to `right[i]`. Leaves point to themselves, so walking `max_depth`
+    levels always lands every row on a leaf without per-row branching.
+    `node_count` (training samples per node) is optional; only attributions
+    (treeshap.py) need it.
+    """
+
+    def __init__(self, feature_idx, threshold, left, right, value, missing_go_left,
+                 roots, baseline, max_depth, feature_names=None, link="identity", node_count=None):
+        if link not in LINKS:
+            raise ValueError(f"Unsupported link '{link}'")
+        self.feature_idx = feature_idx
+        self.threshold = threshold
+        self.left = left
+        self.right = right
+        self.value = value
+        self.missing_go_left = missing_go_left
+        self.roots = roots
+        self.baseline = float(baseline)
+        self.max_depth = int(max_depth)
+        self.feature_names = list(feature_names) if feature_names is not None else None
+        self.link = link
+        self.node_count = node_count
+
+    @property
+    def n_trees(self):
+        return len(self.roots)
+
+    @property
+    def n_nodes(self):
+        return len(self.feature_idx)
+
+    def leaf_indices(self, X):
+        """Global leaf index reached in every tree, shape (n_rows, n_trees)."""
+        X = np.asarray(X, dtype=np.float64)
+        rows = np.arange(X.shape[0])[:, None]
+        node = np.broadcast_to(self.roots, (X.shape[0], self.n_trees))
+        for _ in range(self.max_depth):
+            x = X[rows, self.feature_idx[node]]
+            go_left = (x <= self.threshold[node]) | (np.isnan(x) & self.missing_go_left[node])
+            node = np.where(go_left, self.left[node], self.right[node])
+        return node
+
+    def raw_predict(self, X):
+        X = np.ascontiguousarray(X, dtype=np.float64)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        if numba is not None:
+            return _raw_predict_numba(
+                X, self.feature_idx, self.threshold, self.left, self.right,
+                self.value, self.missing_go_left, self.roots, self.baseline,
+            )
+        out = np.empty(X.shape[0], dtype=np.float64)
+        for start in range(0, X.shape[0], BLOCK_ROWS):
+            block = X[start:start + BLOCK_ROWS]
+            out[start:start + BLOCK_ROWS] = self.baseline + self.value[self.leaf_indices(block)].sum(axis=1)
+        return out
+
+    def predict(self, X):
+        raw = self.raw_predict(X)
+        return self.apply_link(raw)
+
+    def apply_link(self, raw):
+        return np.exp(raw) if self.link == "log" else raw
+
+    def partial_regions(self, base_row, columns):
+        """Collapse every tree onto `columns` with all other features fixed at `base_row`.
+
+        Walks all trees level by level: splits on a fixed feature follow the
+        base row, splits on a swept column follow both children and narrow
+        that column's interval. Returns (value, lo, hi) for every reachable
+        leaf, where the leaf is reached exactly when lo < x <= hi on each
+        swept column (x finite); `lo`/`hi` have shape (n_leaves, len(columns)).
+        """
+        base = np.asarray(base_row, dtype=np.float64).ravel()
+        columns = np.asarray(columns, dtype=np.int64)
+        node = np.asarray(self.roots, dtype=np.int64)
+        lo = np.full((len(node), len(columns)), -np.inf)
+        hi = np.full((len(node), len(columns)), np.inf)
+        values, los, his = [], [], []
+        while len(node):
+            leaf = self.left[node] == node
+            values.append(self.value[node[leaf]])
+            los.append(lo[leaf])
+            his.append(hi[leaf])
+            node, lo, hi = node[~leaf], lo[~leaf], hi[~leaf]
+            feature = self.feature_idx[node]
+            threshold = self.threshold[node]
+            slot = np.full(len(node), -1)
+            for s, column in enumerate(columns):
+                slot[feature == column] = s
+
+            fixed = slot < 0
+            x = base[feature[fixed]]
+            go_left = (x <= threshold[fixed]) | (np.isnan(x) & self.missing_go_left[node[fixed]])
+            fixed_next = np.where(go_left, self.left[node[fixed]], self.right[node[fixed]])
+
+            swept = ~fixed
+            rows = np.arange(swept.sum())
+            s, t = slot[swept], threshold[swept]
+            left_hi = hi[swept].copy()
+            left_hi[rows, s] = np.minimum(left_hi[rows, s], t)
+            right_lo = lo[swept].copy()
+            right_lo[rows, s] = np.maximum(right_lo[rows, s], t)
+            node = np.concatenate([fixed_next, self.left[node[swept]], self.right[node[swept]]])
+            lo = np.concatenate([lo[fixed], lo[swept], right_lo])
+            hi = np.concatenate([hi[fixed], left_hi, hi[swept]])
+            # Drop branches whose interval is already empty
+            alive = (lo < hi).all(axis=1)
+            node, lo, hi = node[alive], lo[alive], hi[alive]
+        return np.concatenate(values), np.concatenate(los), np.concatenate(his)
+
+    def save(self, path):
+        arrays = {name: getattr(self, name) for name in NODE_ARRAYS}
+        if self.node_count is not None:
+            arrays["node_count"] = self.node_count
+        np.savez(path, **arrays, meta=np.array(json.dumps(self._meta())))
+
+    @classmethod
+    def load(cls, path, mmap_mode=None):
+        with np.load(path, mmap_mode=mmap_mode) as data:
+            arrays = {name: data[name] for name in NODE_ARRAYS}
+            if "node_count" in data:
+                arrays["node_count"] = data["node_count"]
+            meta = json.loads(str(data["meta"]))
+        return cls(**arrays, **meta)
+
+    def _meta(self):
+        return {
+            "baseline": self.baseline,
+            "max_depth": self.max_depth,
+            "feature_names": self.feature_names,
+            "link": self.link,
+        }
+
+    def export_bundle(self, directory):
+        """Write a memory-mappable bundle; the directory appears atomically."""
+        if os.path.isdir(directory):
+            return directory
+        tmp_dir = f"{directory}.{os.getpid()}.tmp"
+        os.makedirs(tmp_dir, exist_ok=True)
+        try:
+            for name in NODE_ARRAYS:
+                np.save(os.path.join(tmp_dir, f"{name}.npy"), np.ascontiguousarray(getattr(self, name)))
+            if self.node_count is not None:
+                np.save(os.path.join(tmp_dir, "node_count.npy"), np.ascontiguousarray(self.node_count))
+            with open(os.path.join(tmp_dir, "meta.json"), "w") as f:
+                json.dump(self._meta(), f)
+            os.rename(tmp_dir, directory)
+        except OSError:
+            # Another process published the same bundle first
+            if not os.path.isdir(directory):
+                raise
+        finally:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+        return directory
+
+    @classmethod
+    def load_bundle(cls, directory, mmap=True):
+        """Map a bundle read-only; the pages are shared by every process mapping it."""
+        mmap_mode = "r" if mmap else None
+        arrays = {name: np.load(os.path.join(directory, f"{name}.npy"), mmap_mode=mmap_mode) for name in NODE_ARRAYS}
+        count_path = os.path.join(directory, "node_count.npy")
+        if os.path.exists(count_path):
+            arrays["node_count"] = np.load(count_path, mmap_mode=mmap_mode)
+        with open(os.path.join(directory, "meta.json"), "r") as f:
+            meta = json.load(f)
+        return cls(**arrays, **meta)
+
+
+if numba is not None:
+    @numba.njit(cache=True, nogil=True)
+    def _raw_predict_numba(X, feature_idx, threshold, left, right, value, missing_go_left, roots, baseline):
+        out = np.empty(X.shape[0], dtype=np.float64)
+        for r in range(X.shape[0]):
+            total = baseline
+            for root in roots:
+                node = root
+                while left[node] != node:
+                    x = X[r, feature_idx[node]]
+                    if x <= threshold[node] or (np.isnan(x) and missing_go_left[node]):
+                        node = left[node]
+                    else:
+                        node = right[node]
+                total += value[node]
+            out[r] = total
+        return out
+
+
+def compile_pipeline(pipeline, feature_names=None):
+    """Flatten a fitted (Pipeline of a) HistGradientBoostingRegressor."""
+    estimator = pipeline
+    if hasattr(pipeline, "steps"):
+        if len(pipeline.steps) != 1:
+            raise ValueError("Only pipelines without preprocessing steps can be compiled")
+        estimator = pipeline.steps[-1][1]
+    if not hasattr(estimator, "_predictors"):
+        raise ValueError(f"Cannot compile {type(estimator).__name__}; expected a fitted HistGradientBoostingRegressor")
+    if getattr(estimator, "_preprocessor", None) is not None:
+        raise ValueError("Categorical features are not supported by the compiled evaluator")
+    link_name = type(estimator._loss.link).__name__
+    link = {"IdentityLink": "identity", "LogLink": "log"}.get(link_name)
+    if link is None or estimator._baseline_prediction.size != 1:
+        raise ValueError(f"Unsupported loss for compilation ({link_name})")
+    if feature_names is None and hasattr(estimator, "feature_names_in_"):
+        feature_names = list(estimator.feature_names_in_)
+
+    trees = [predictors[0].nodes for predictors in estimator._predictors]
+    if any(nodes["is_categorical"].any() for nodes in trees):
+        raise ValueError("Categorical splits are not supported by the compiled evaluator")
+
+    offsets = np.cumsum([0] + [len(nodes) for nodes in trees])
+    nodes = np.concatenate(trees)
+    offset = np.repeat(offsets[:-1], [len(t) for t in trees])
+    is_leaf = nodes["is_leaf"].astype(bool)
+    self_idx = np.arange(len(nodes), dtype=np.int32)
+
+    return CompiledModel(
+        feature_idx=np.where(is_leaf, 0, nodes["feature_idx"]).astype(np.int32),
+        threshold=np.where(is_leaf, np.inf, nodes["num_threshold"]).astype(np.float64),
+        left=np.where(is_leaf, self_idx, nodes["left"] + offset).astype(np.int32),
+        right=np.where(is_leaf, self_idx, nodes["right"] + offset).astype(np.int32),
+        value=np.where(is_leaf, nodes["value"], 0.0).astype(np.float64),
+        missing_go_left=nodes["missing_go_to_left"].astype(bool),
+        roots=offsets[:-1].astype(np.int32),
+        baseline=float(estimator._baseline_prediction.ravel()[0]),
+        max_depth=int(nodes["depth"].max()),
+        feature_names=feature_names,
+        link=link,
+        node_count=nodes["count"].astype(np.uint32),
+    )
+
+
+if __name__ == "__main__":
+    import argparse
+
+    import joblib
+
+    parser = argparse.ArgumentParser(description="Export the fitted model to flat arrays.")
+    parser.add_argument("model", nargs="?", default="best_model_wine_quality.joblib")
+    parser.add_argument("-o", "--output", help="output .npz (default: next to the model)")
+    parser.add_argument("--bundle", help="write a memory-mappable .npy bundle directory instead")
+    args = parser.parse_args()
+
+    with open("feature_names.json", "r") as f:
+        feature_names = json.load(f)
+    compiled = compile_pipeline(joblib.load(args.model), feature_names)
+    if args.bundle:
+        out_path = compiled.export_bundle(args.bundle)
+    else:
+        out_path = args.output or args.model.rsplit(".", 1)[0] + ".npz"
+        compiled.save(out_path)
+    print(f"Compiled {compiled.n_trees} trees / {compiled.n_nodes} nodes to {out_path}")
@@ -0,0 +1,71 @@
+# pytest runs every test_*.py check script here as a test of its own, each in
+# a fresh interpreter. The checks are scripts: they do their work at import
+# time, and server.py freezes its WINE_* configuration (and, after a lifespan,
+# a shut-down executor) into module globals, so importing several of them into
+# one pytest process would make each see the first one's server.
+#
+#   pytest                           # from backend/, after train_model.py
+#   pytest test_explain.py -k wqm
+#
+# A check passes when `python test_x.py` exits 0; a failure shows its output.
+import os
+import socket
+import subprocess
+import sys
+
+import pytest
+
+# Extra runs of a check under another configuration
+VARIANTS = {
+    "test_explain.py": [{"WINE_MODEL_MODE": "wqm"}],
+}
+# Checks that talk to `uvicorn server:app` on this address rather than starting their own
+LIVE_SERVER_CHECKS = {"test_predict.py": ("127.0.0.1", 8000)}
+CHECK_TIMEOUT = float(os.environ.get("WINE_CHECK_TIMEOUT", "600"))
+OUTPUT_TAIL = 4000
+
+
+class CheckFailed(Exception):
+    pass
+
+
+def pytest_pycollect_makemodule(module_path, parent):
+    # Collect the script without importing it into this process
+    return CheckScript.from_parent(parent, path=module_path)
+
+
+class CheckScript(pytest.File):
+    def collect(self):
+        yield CheckRun.from_parent(self, name=self.path.stem, env={})
+        for env in VARIANTS.get(self.path.name, []):
+            label = ",".join(f"{name}={value}" for name, value in env.items())
+            yield CheckRun.from_parent(self, name=f"{self.path.stem}[{label}]", env=env)
+
+
+class CheckRun(pytest.Item):
+    def __init__(self, *, env, **kwargs):
+        super().__init__(**kwargs)
+        self.env = env
+
+    def runtest(self):
+        address = LIVE_SERVER_CHECKS.get(self.path.name)
+        if address is not None:
+            try:
+                socket.create_connection(address, timeout=1).close()
+            except OSError:
+                pytest.skip(f"needs a server on {address[0]}:{address[1]}")
+        result = subprocess.run([sys.executable, self.path.name], cwd=self.path.parent,
+                                env={**os.environ, **self.env}, capture_output=True, text=True,
+                                timeout=CHECK_TIMEOUT)
+        if result.returncode != 0:
+            raise CheckFailed(result)
+
+    def repr_failure(self, excinfo):
+        if isinstance(excinfo.value, CheckFailed):
+            result = excinfo.value.args[0]
+            return (f"python {self.path.name} exited with {result.returncode}\n"
+                    f"{result.stdout[-OUTPUT_TAIL:]}{result.stderr[-OUTPUT_TAIL:]}")
+        return super().repr_failure(excinfo)
+
+    def reportinfo(self):
+        return self.path, None, f"python {self.path.name}"
@@ -0,0 +1,310 @@
+# Input-drift monitoring: streaming per-feature statistics of /predict inputs
+# compared with the training data.
+#
+# train_model.py saves a reference profile (drift_profile.json) next to the
+# model: per feature, the training mean/std/range, quantile bin edges and the
+# training count in each bin. The server keeps the same statistics over live
+# requests in constant memory:
+#
+#   - mean and variance, merged batch by batch with Welford/Chan updates
+#   - counts in the training bins (so no raw values are ever kept)
+#   - values below the training minimum, above the maximum, and missing
+#
+# and scores each feature with the population stability index
+# PSI = sum((live - train) * ln(live / train)) over bin shares, plus a binned
+# Kolmogorov-Smirnov distance (largest gap between the two binned CDFs).
+# Requests only append their row to a bounded deque; a background thread
+# folds the rows into the statistics in batches.
+#
+#   python drift.py               # profile the cached dataset, time submit and flush
+
+import json
+import os
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+PROFILE_FILE = "drift_profile.json"
+PROFILE_VERSION = 1
+# Quantile bins per feature in the reference profile (fewer for discrete features)
+DRIFT_BINS = 10
+# Rule-of-thumb PSI bands: below 0.1 stable, 0.1-0.25 moderate, above significant
+PSI_MODERATE = 0.1
+PSI_SIGNIFICANT = 0.25
+# Bin shares are floored at this before taking logs, so an empty bin doesn't make PSI infinite
+PSI_EPSILON = 1e-4
+
+
+def build_profile(X, feature_names, n_bins=DRIFT_BINS, meta=None):
+    """Reference profile of a training matrix (rows x features in `feature_names` order)."""
+    X = np.asarray(X, dtype=np.float64)
+    features = []
+    for j, name in enumerate(feature_names):
+        column = X[:, j]
+        values = column[~np.isnan(column)]
+        edges = np.unique(np.quantile(values, np.linspace(0.0, 1.0, n_bins + 1)[1:-1])) if len(values) else []
+        edges = np.asarray(edges, dtype=np.float64)
+        counts = np.bincount(np.searchsorted(edges, values, side="left"), minlength=len(edges) + 1)
+        features.append({
+            "name": name,
+            "mean": float(values.mean()) if len(values) else 0.0,
+            "std": float(values.std()) if len(values) else 0.0,
+            "min": float(values.min()) if len(values) else 0.0,
+            "max": float(values.max()) if len(values) else 0.0,
+            "missing": int(len(column) - len(values)),
+            # Bin i holds edges[i - 1] < x <= edges[i], like the trees' splits
+            "edges": edges.tolist(),
+            "counts": counts.tolist(),
+        })
+    return {**(meta or {}), "version": PROFILE_VERSION, "n_rows": len(X), "features": features}
+
+
+def load_profile(path):
+    with open(path, "r") as f:
+        profile = json.load(f)
+    if profile.get("version") != PROFILE_VERSION:
+        raise ValueError(f"Unsupported drift profile version {profile.get('version')}")
+    return profile
+
+
+def psi(live_counts, reference_counts):
+    """Population stability index between two histograms over the same bins."""
+    live = np.maximum(live_counts / max(live_counts.sum(), 1), PSI_EPSILON)
+    reference = np.maximum(reference_counts / max(reference_counts.sum(), 1), PSI_EPSILON)
+    return float(((live - reference) * np.log(live / reference)).sum())
+
+
+def binned_ks(live_counts, reference_counts):
+    """Largest gap between the binned CDFs (a lower bound on the KS statistic)."""
+    live = np.cumsum(live_counts) / max(live_counts.sum(), 1)
+    reference = np.cumsum(reference_counts) / max(reference_counts.sum(), 1)
+    return float(np.abs(live - reference).max())
+
+
+def severity(score):
+    if score >= PSI_SIGNIFICANT:
+        return "significant"
+    return "moderate" if score >= PSI_MODERATE else "stable"
+
+
+class DriftMonitor:
+    """Streaming input statistics against a reference profile, in constant memory.
+
+    `submit(rows)` appends a reference to the request's (already allocated)
+    row or matrix to a bounded deque and returns: no lock, no arithmetic on
+    the request path. `flush()` (the background thread, and every `report()`)
+    stacks whatever is pending and merges it into the running statistics with
+    one vectorized pass per feature. State is O(features x bins) however many
+    rows arrive; if the deque fills up before a flush, the oldest entries are
+    dropped and counted.
+    """
+
+    def __init__(self, max_pending=10000, min_rows=100, flush_interval=1.0):
+        self.min_rows = min_rows
+        self.flush_interval = flush_interval
+        self._pending = deque(maxlen=max(1, int(max_pending)))
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self.profile = None
+        self.profile_path = None
+        self.last_error = None
+        self.dropped = 0
+        self._reset_state(0)
+
+    def _reset_state(self, n_features):
+        self.rows = 0
+        self.flushes = 0
+        self.started_at = time.time()
+        self._count = np.zeros(n_features, dtype=np.int64)
+        self._mean = np.zeros(n_features)
+        self._m2 = np.zeros(n_features)
+        self._missing = np.zeros(n_features, dtype=np.int64)
+        self._below = np.zeros(n_features, dtype=np.int64)
+        self._above = np.zeros(n_features, dtype=np.int64)
+        self._hist = [np.zeros(len(f["counts"]), dtype=np.int64) for f in (self.profile or {}).get("features", [])]
+
+    @property
+    def enabled(self):
+        return self.profile is not None
+
+    def load(self, path, feature_order):
+        """Use the profile at `path`, reordered to the served `feature_order`; restarts the statistics.
+
+        Without a usable profile (older models, mismatched features) monitoring is off.
+        """
+        profile = None
+        try:
+            profile = load_profile(path)
+            by_name = {f["name"]: f for f in profile["features"]}
+            missing = [name for name in feature_order if name not in by_name]
+            if missing:
+                raise ValueError(f"profile has no statistics for {missing}")
+            profile = {**profile, "features": [by_name[name] for name in feature_order]}
+            self.last_error = None
+        except FileNotFoundError:
+            self.last_error = f"{path} not found; retrain to create it"
+            profile = None
+        except (ValueError, KeyError, json.JSONDecodeError) as e:
+            self.last_error = f"Unusable drift profile {path}: {e}"
+            profile = None
+        with self._lock:
+            self._pending.clear()
+            self.profile = profile
+            self.profile_path = path
+            self._edges = [np.asarray(f["edges"], dtype=np.float64) for f in profile["features"]] if profile else []
+            self._reference_min = np.array([f["min"] for f in profile["features"]]) if profile else None
+            self._reference_max = np.array([f["max"] for f in profile["features"]]) if profile else None
+            self._reset_state(len(feature_order) if profile else 0)
+        if self.last_error:
+            print(f"Drift monitoring off: {self.last_error}")
+        return profile is not None
+
+    def submit(self, rows):
+        """Queue a row (or a matrix of rows) in the served feature order. Called on the request path."""
+        if self.profile is None:
+            return
+        if len(self._pending) == self._pending.maxlen:
+            self.dropped += 1
+        self._pending.append(rows)
+
+    def flush(self):
+        """Merge everything pending into the running statistics. Returns the rows merged."""
+        with self._lock:
+            if not self._pending or self.profile is None:
+                return 0
+            items = []
+            while self._pending:
+                try:
+                    items.append(self._pending.popleft())
+                except IndexError:
+                    break
+            X = np.vstack([np.asarray(item, dtype=np.float64).reshape(-1, len(self._edges)) for item in items])
+            self._update(X)
+            self.flushes += 1
+            return len(X)
+
+    def _update(self, X):
+        missing = np.isnan(X)
+        n_b = (~missing).sum(axis=0)
+        filled = np.where(missing, 0.0, X)
+        mean_b = filled.sum(axis=0) / np.maximum(n_b, 1)
+        m2_b = (np.where(missing, 0.0, X - mean_b) ** 2).sum(axis=0)
+        # Chan et al.'s pairwise update: merge the batch's (n, mean, M2) into the running ones
+        n = self._count + n_b
+        delta = mean_b - self._mean
+        self._mean = self._mean + np.where(n > 0, delta * n_b / np.maximum(n, 1), 0.0)
+        self._m2 = self._m2 + m2_b + np.where(n > 0, delta ** 2 * self._count * n_b / np.maximum(n, 1), 0.0)
+        self._count = n
+        self._missing += missing.sum(axis=0)
+        with np.errstate(invalid="ignore"):
+            self._below += (X < self._reference_min).sum(axis=0)
+            self._above += (X > self._reference_max).sum(axis=0)
+        for j, edges in enumerate(self._edges):
+            values = X[~missing[:, j], j]
+            self._hist[j] += np.bincount(np.searchsorted(edges, values, side="left"), minlength=len(edges) + 1)
+        self.rows += len(X)
+
+    def report(self):
+        """Per-feature live statistics and drift scores against the reference profile."""
+        self.flush()
+        with self._lock:
+            if self.profile is None:
+                return {"enabled": False, "error": self.last_error}
+            features = {}
+            for j, reference in enumerate(self.profile["features"]):
+                n = int(self._count[j])
+                std = float(np.sqrt(self._m2[j] / n)) if n else None
+                entry = {
+                    "rows": n,
+                    "mean": float(self._mean[j]) if n else None,
+                    "std": std,
+                    "reference_mean": reference["mean"],
+                    "reference_std": reference["std"],
+                    "mean_shift_std": ((float(self._mean[j]) - reference["mean"]) / reference["std"]
+                                       if n and reference["std"] > 0 else None),
+                    "missing": int(self._missing[j]),
+                    "below_range": int(self._below[j]),
+                    "above_range": int(self._above[j]),
+                    "out_of_range_share": float((self._below[j] + self._above[j]) / n) if n else None,
+                    "histogram": self._hist[j].tolist(),
+                }
+                if n >= self.min_rows:
+                    reference_counts = np.asarray(reference["counts"], dtype=np.float64)
+                    entry["psi"] = psi(self._hist[j].astype(np.float64), reference_counts)
+                    entry["ks"] = binned_ks(self._hist[j].astype(np.float64), reference_counts)
+                    entry["status"] = severity(entry["psi"])
+                else:
+                    entry.update(psi=None, ks=None, status="insufficient data")
+                features[reference["name"]] = entry
+            scored = {name: f["psi"] for name, f in features.items() if f["psi"] is not None}
+            worst = max(scored.values()) if scored else None
+            return {
+                "enabled": True,
+                "profile": self.profile_path,
+                "reference_rows": self.profile["n_rows"],
+                "dataset_hash": self.profile.get("dataset_hash"),
+                "rows": self.rows,
+                "since": self.started_at,
+                "pending": len(self._pending),
+                "dropped": self.dropped,
+                "flushes": self.flushes,
+                "min_rows": self.min_rows,
+                "max_psi": worst,
+                "status": severity(worst) if worst is not None else "insufficient data",
+                "drifted_features": sorted((name for name, score in scored.items() if score >= PSI_MODERATE),
+                                           key=lambda name: -scored[name]),
+                "features": features,
+            }
+
+    def _run(self):
+        while not self._stop.wait(self.flush_interval):
+            self.flush()
+
+    def start(self):
+        if self._thread is None and self.flush_interval > 0:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="drift-monitor", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.flush_interval + 5)
+            self._thread = None
+
+
+def main():
+    import tempfile
+
+    from wine_data import load_wine_data
+
+    X_frame, _ = load_wine_data()[:2]
+    names = list(X_frame.columns)
+    X = X_frame.to_numpy(dtype=np.float64)
+    profile = build_profile(X, names)
+    print(f"Profiled {len(X)} rows: " + ", ".join(f"{f['name']} {len(f['counts'])} bins" for f in profile["features"]))
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, PROFILE_FILE)
+        with open(path, "w") as f:
+            json.dump(profile, f)
+        monitor = DriftMonitor(max_pending=len(X) + 1)
+        monitor.load(path, names)
+        rows = list(X)
+        t0 = time.perf_counter()
+        for row in rows:
+            monitor.submit(row)
+        submit_us = (time.perf_counter() - t0) / len(rows) * 1e6
+        t0 = time.perf_counter()
+        monitor.flush()
+        flush_ms = (time.perf_counter() - t0) * 1000
+        report = monitor.report()
+    print(f"submit: {submit_us:.2f} us/row; flush of {len(rows)} rows: {flush_ms:.1f} ms")
+    print(f"training data against its own profile: max PSI {report['max_psi']:.2e} ({report['status']})")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,63 +1,251 @@
+# EDA plots for the report and the dashboard, rendered in parallel and only
+# when something changed.
+#
+# Every plot is a job (output PNG, render function, parameters). Jobs run in a
+# process pool on the headless Agg backend; each worker memory-maps the cached
+# dataset itself, so nothing large is pickled. eda_manifest.json records, per
+# PNG, a key over the dataset hash, the plot's parameters and the plotting
+# library versions; a plot whose key is unchanged (and whose file is still the
+# one that was written) is skipped.
+#
+#   python eda_plots.py                 # render what is missing or stale
+#   python eda_plots.py --force         # re-render everything
+#   python eda_plots.py --bench         # cold vs warm timing report (in a temp directory)
 
-import pandas as pd
-import seaborn as sns
-import matplotlib.pyplot as plt
-from ucimlrepo import fetch_ucirepo
+import hashlib
+import json
 import os
+import time
+from concurrent.futures import ProcessPoolExecutor
 
-# Set style
-sns.set_theme(style="whitegrid")
-plt.rcParams.update({'figure.max_open_warning': 0})
+from wine_data import TARGET, ensure_cached, load_wine_frame
 
-def fetch_data():
-    """Fetch wine quality dataset."""
-    print("Fetching data for EDA...")
-    wine_quality = fetch_ucirepo(id=186)
-    df = wine_quality.data.features.copy()
-    df['quality'] = wine_quality.data.targets
-    return df
+MANIFEST_PATH = "eda_manifest.json"
+# Render processes (default: one per core)
+WORKERS = int(os.environ.get("WINE_EDA_WORKERS", "0")) or os.cpu_count() or 1
+# Bump when a render function changes in a way its parameters don't capture
+PLOT_VERSION = 1
 
-def plot_histograms(df):
+# Set per process by _init_worker
+_df = None
+
+
+def plot_histograms(df, path, bins=20, figsize=(15, 10), color="#800020"):
     """Plot histograms for all features."""
-    print("Generating histograms...")
-    df.hist(bins=20, figsize=(15, 10), color='#800020', grid=False)
+    import matplotlib.pyplot as plt
+    df.hist(bins=bins, figsize=figsize, color=color, grid=False)
     plt.tight_layout()
-    plt.savefig('eda_histograms.png')
-    plt.close()
-    print("Saved eda_histograms.png")
+    plt.savefig(path)
+    plt.close("all")
+
 
-def plot_correlation_matrix(df):
+def plot_correlation_matrix(df, path, cmap="RdBu_r", figsize=(12, 10)):
     """Plot correlation matrix heatmap."""
-    print("Generating correlation matrix...")
-    plt.figure(figsize=(12, 10))
-    corr = df.corr()
-    mask = correlation_matrix = corr # Just for naming
-    sns.heatmap(corr, annot=True, cmap='RdBu_r', fmt=".2f", center=0,
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+    plt.figure(figsize=figsize)
+    sns.heatmap(df.corr(), annot=True, cmap=cmap, fmt=".2f", center=0,
                 square=True, linewidths=.5, cbar_kws={"shrink": .5})
     plt.title("Correlation Matrix", fontsize=16)
     plt.tight_layout()
-    plt.savefig('eda_correlation.png')
-    plt.close()
-    print("Saved eda_correlation.png")
+    plt.savefig(path)
+    plt.close("all")
 
-def plot_quality_distribution(df):
+
+def plot_quality_distribution(df, path, palette="Reds_r", figsize=(8, 6)):
     """Plot quality score distribution."""
-    print("Generating quality distribution...")
-    plt.figure(figsize=(8, 6))
-    sns.countplot(x='quality', data=df, palette="Reds_r", hue='quality', legend=False)
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+    plt.figure(figsize=figsize)
+    sns.countplot(x=TARGET, data=df, palette=palette, hue=TARGET, legend=False)
     plt.title("Wine Quality Distribution", fontsize=16)
     plt.xlabel("Quality Score")
     plt.ylabel("Count")
-    plt.savefig('eda_quality_dist.png')
-    plt.close()
-    print("Saved eda_quality_dist.png")
+    plt.savefig(path)
+    plt.close("all")
+
+
+def plot_feature_by_quality(df, path, feature, palette="Reds", figsize=(8, 5)):
+    """Box plot of one feature per quality score."""
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+    plt.figure(figsize=figsize)
+    sns.boxplot(x=TARGET, y=feature, data=df, palette=palette, hue=TARGET, legend=False, fliersize=2)
+    plt.title(f"{feature.replace('_', ' ').title()} by Quality", fontsize=14)
+    plt.xlabel("Quality Score")
+    plt.tight_layout()
+    plt.savefig(path)
+    plt.close("all")
+
+
+RENDERERS = {
+    "histograms": plot_histograms,
+    "correlation": plot_correlation_matrix,
+    "quality_distribution": plot_quality_distribution,
+    "feature_by_quality": plot_feature_by_quality,
+}
+
+
+def plot_jobs(columns):
+    """(output file, renderer name, params) for every plot, in report order."""
+    jobs = [
+        ("eda_histograms.png", "histograms", {}),
+        ("eda_correlation.png", "correlation", {}),
+        ("eda_quality_dist.png", "quality_distribution", {}),
+    ]
+    jobs += [(f"eda_feature_{column}.png", "feature_by_quality", {"feature": column})
+             for column in columns if column != TARGET]
+    return jobs
+
+
+def _library_versions():
+    from importlib.metadata import PackageNotFoundError, version
+    versions = {}
+    for name in ("matplotlib", "seaborn", "pandas"):
+        try:
+            versions[name] = version(name)
+        except PackageNotFoundError:
+            versions[name] = None
+    return versions
+
+
+def plot_key(dataset_hash, renderer, params, versions):
+    payload = json.dumps([dataset_hash, renderer, params, PLOT_VERSION, versions], sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:16]
+
+
+def _file_hash(path):
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()[:16]
+
+
+def read_manifest(path=MANIFEST_PATH):
+    try:
+        with open(path, "r") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+def is_fresh(entry, key, path):
+    """Unchanged inputs and the file on disk is still the one that was rendered."""
+    if entry is None or entry.get("key") != key or not os.path.exists(path):
+        return False
+    return entry.get("sha256") == _file_hash(path)
+
+
+def _init_worker():
+    # Headless backend before pyplot is imported; every worker loads the frame once
+    global _df
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+    sns.set_theme(style="whitegrid")
+    plt.rcParams.update({'figure.max_open_warning': 0})
+    _df = load_wine_frame()[0]
+
+
+def _render(output, renderer, params):
+    """Render one plot to a temp file, then rename it into place. Runs in a worker."""
+    t0 = time.perf_counter()
+    tmp_path = f"{output}.{os.getpid()}.tmp.png"
+    try:
+        RENDERERS[renderer](_df, tmp_path, **params)
+        os.replace(tmp_path, output)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return output, time.perf_counter() - t0
+
+
+def generate(output_dir=".", force=False, workers=WORKERS, manifest_path=None):
+    """Render every missing or stale plot into `output_dir`; returns a timing summary."""
+    t0 = time.perf_counter()
+    meta = ensure_cached()
+    versions = _library_versions()
+    manifest_path = manifest_path or os.path.join(output_dir, MANIFEST_PATH)
+    manifest = read_manifest(manifest_path)
+
+    todo, skipped = [], []
+    for output, renderer, params in plot_jobs(meta["columns"] + [TARGET]):
+        path = os.path.join(output_dir, output)
+        key = plot_key(meta["hash"], renderer, params, versions)
+        if not force and is_fresh(manifest.get(output), key, path):
+            skipped.append(output)
+        else:
+            todo.append((output, path, renderer, params, key))
+
+    timings = {}
+    if todo:
+        n_workers = max(1, min(workers, len(todo)))
+        print(f"Rendering {len(todo)} plot(s) with {n_workers} process(es); {len(skipped)} up to date")
+        with ProcessPoolExecutor(max_workers=n_workers, initializer=_init_worker) as pool:
+            futures = {pool.submit(_render, path, renderer, params): (output, renderer, params, key)
+                       for output, path, renderer, params, key in todo}
+            for future, (output, renderer, params, key) in futures.items():
+                path, seconds = future.result()
+                timings[output] = seconds
+                manifest[output] = {
+                    "key": key,
+                    "renderer": renderer,
+                    "params": params,
+                    "dataset_hash": meta["hash"],
+                    "sha256": _file_hash(path),
+                    "render_seconds": round(seconds, 3),
+                    "created": time.time(),
+                }
+                print(f"Saved {output} ({seconds:.2f} s)")
+        tmp_manifest = f"{manifest_path}.{os.getpid()}.tmp"
+        with open(tmp_manifest, "w") as f:
+            json.dump(manifest, f, indent=2, sort_keys=True)
+        os.replace(tmp_manifest, manifest_path)
+    else:
+        print(f"All {len(skipped)} EDA plots are up to date (dataset {meta['hash']})")
+
+    return {
+        "rendered": len(todo),
+        "skipped": len(skipped),
+        "workers": max(1, min(workers, len(todo))) if todo else 0,
+        "render_seconds": round(sum(timings.values()), 3),
+        "wall_seconds": round(time.perf_counter() - t0, 3),
+    }
+
+
+def bench(workers=WORKERS):
+    """Cold (empty directory) and warm (nothing changed) runs, plus a serial cold run."""
+    import shutil
+    import tempfile
+
+    report = {}
+    directory = tempfile.mkdtemp(prefix="eda_bench_")
+    try:
+        report["cold"] = generate(directory, workers=workers)
+        report["warm"] = generate(directory, workers=workers)
+        if workers > 1:
+            report["cold_serial"] = generate(directory, force=True, workers=1)
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+    return report
+
 
 if __name__ == "__main__":
+    import argparse
+    import sys
+
+    parser = argparse.ArgumentParser(description="Render the EDA plots.")
+    parser.add_argument("--output-dir", default=".")
+    parser.add_argument("--force", action="store_true", help="re-render even up-to-date plots")
+    parser.add_argument("--workers", type=int, default=WORKERS)
+    parser.add_argument("--bench", action="store_true", help="print a cold vs warm timing report")
+    args = parser.parse_args()
+
     try:
-        df = fetch_data()
-        plot_histograms(df)
-        plot_correlation_matrix(df)
-        plot_quality_distribution(df)
-        print("EDA plots generated successfully.")
+        if args.bench:
+            print(json.dumps(bench(args.workers), indent=2))
+        else:
+            summary = generate(args.output_dir, args.force, args.workers)
+            print(f"EDA plots generated successfully: {json.dumps(summary)}")
     except Exception as e:
         print(f"Error generating EDA plots: {e}")
+        sys.exit(1)
@@ -3,12 +3,13 @@ import json
 import os
 from datetime import datetime
 
-def generate_report():
+def generate_report(directory="."):
+    """Write Wine_Quality_Report.md from the metrics, features and plots in `directory`."""
     print("Generating report...")
     
     # Load Metrics
     try:
-        with open("metrics.json", "r") as f:
+        with open(os.path.join(directory, "metrics.json"), "r") as f:
             metrics = json.load(f)
     except FileNotFoundError:
         print("Error: metrics.json not found. Run train_model.py first.")
@@ -16,7 +17,7 @@ def generate_report():
 
     # Load Feature Names
     try:
-        with open("feature_names.json", "r") as f:
+        with open(os.path.join(directory, "feature_names.json"), "r") as f:
             features = json.load(f)
     except FileNotFoundError:
         features = ["Unknown"]
@@ -28,7 +29,7 @@ def generate_report():
         "Quality Distribution": "eda_quality_dist.png"
     }
     
-    existing_plots = {name: path for name, path in plots.items() if os.path.exists(path)}
+    existing_plots = {name: path for name, path in plots.items() if os.path.exists(os.path.join(directory, path))}
 
     # Generate Markdown Content
     report_content = f"""# Wine Quality Prediction Project Report
@@ -60,10 +61,20 @@ The model utilized the following {len(features)} input features:
     report_content += "\n---\n*Report generated by VinoVeritas Automation System*"
 
     # Write to file
-    with open("Wine_Quality_Report.md", "w", encoding="utf-8") as f:
+    # Written aside and renamed, so readers never see a partial report
+    report_path = os.path.join(directory, "Wine_Quality_Report.md")
+    tmp_path = f"{report_path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
         f.write(report_content)
+    os.replace(tmp_path, report_path)
     
     print("Report generated: Wine_Quality_Report.md")
 
 if __name__ == "__main__":
+    from model_registry import ModelRegistry
+
     generate_report()
+    # The server reads the report and plots from the registry version it serves
+    version = ModelRegistry().attach()
+    if version:
+        print(f"Attached the report and EDA plots to registry version {version}")
@@ -0,0 +1,115 @@
+import asyncio
+import math
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+class OverloadedError(Exception):
+    """Raised when every inference slot is busy and the wait queue is full."""
+
+    def __init__(self, message, retry_after=1):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class InferenceExecutor:
+    """Runs model work on a fixed number of dedicated threads with a bounded wait queue.
+
+    At most `slots` calls compute at once and at most `max_queue` more wait
+    for a slot; anything beyond that is rejected immediately with
+    `OverloadedError` instead of piling up, so latency under a spike stays
+    bounded by the queue length. Inference never uses Starlette's shared
+    threadpool, so sync endpoints such as /features and /metrics can't get
+    stuck behind it. Time spent waiting for a slot and time spent computing
+    are recorded as separate histograms.
+    """
+
+    def __init__(self, slots=None, max_queue=64, metrics=None):
+        self.slots = max(1, int(slots or os.cpu_count() or 1))
+        self.max_queue = max(0, int(max_queue))
+        self.metrics = metrics
+        self._executor = ThreadPoolExecutor(max_workers=self.slots, thread_name_prefix="inference")
+        # Admitted calls (computing + waiting), released when the work itself is done
+        self._pending = 0
+        self._lock = threading.Lock()
+        # Smoothed compute time per call, for the Retry-After estimate
+        self._compute_ewma = 0.0
+        # Counters for /metrics/inference
+        self.admitted = 0
+        self.rejected = 0
+        self.failed = 0
+        self.max_depth = 0
+
+    @property
+    def queue_depth(self):
+        return max(0, self._pending - self.slots)
+
+    @property
+    def busy(self):
+        return min(self._pending, self.slots)
+
+    def retry_after(self):
+        """Whole seconds until the current backlog should have drained (at least 1)."""
+        backlog = self._pending + 1
+        return max(1, math.ceil(backlog * self._compute_ewma / self.slots))
+
+    async def run(self, fn, *args, endpoint="other", shed=True):
+        """Await `fn(*args)` on an inference slot.
+
+        With `shed=False` the call waits for a slot even past `max_queue`
+        (used once a streaming response has started and can't be refused).
+        """
+        with self._lock:
+            if shed and self._pending >= self.slots + self.max_queue:
+                self.rejected += 1
+                raise OverloadedError("Inference queue is full", self.retry_after())
+            self._pending += 1
+        self.admitted += 1
+        self.max_depth = max(self.max_depth, self.queue_depth)
+        submitted = time.perf_counter()
+
+        def call():
+            started = time.perf_counter()
+            result = fn(*args)
+            return result, started, time.perf_counter()
+
+        future = self._executor.submit(call)
+        # A cancelled request drops a queued call, but one already computing
+        # keeps its slot until it actually finishes
+        future.add_done_callback(self._release)
+        try:
+            result, started, finished = await asyncio.wrap_future(future)
+        except Exception:
+            self.failed += 1
+            raise
+        compute = finished - started
+        self._compute_ewma = compute if not self._compute_ewma else 0.9 * self._compute_ewma + 0.1 * compute
+        if self.metrics is not None and self.metrics.enabled:
+            labels = (("endpoint", endpoint),)
+            self.metrics.histogram("wine_inference_queue_seconds", labels,
+                                   help="Time waiting for an inference slot").observe(started - submitted)
+            self.metrics.histogram("wine_inference_compute_seconds", labels,
+                                   help="Time computing on an inference slot").observe(compute)
+        return result
+
+    def _release(self, future):
+        with self._lock:
+            self._pending -= 1
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self):
+        return {
+            "slots": self.slots,
+            "max_queue": self.max_queue,
+            "busy": self.busy,
+            "queue_depth": self.queue_depth,
+            "max_queue_depth": self.max_depth,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "failed": self.failed,
+            "mean_compute_ms": self._compute_ewma * 1000.0,
+        }
@@ -0,0 +1,87 @@
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from compiled_model import CompiledModel
+from wqm_format import load_wqm
+
+# Workers are started from a clean server process rather than forked from a uvicorn worker
+# that already runs threads (model watcher, executors), whose locks a fork would copy held
+MP_CONTEXT = multiprocessing.get_context(
+    "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn")
+
+# Per-worker-process state: the bundle currently mapped and its model
+_worker_bundle = None
+_worker_model = None
+
+
+def _worker_model_for(bundle_dir):
+    global _worker_bundle, _worker_model
+    if bundle_dir != _worker_bundle:
+        # Read-only mmap: every worker shares the same page-cache pages
+        if bundle_dir.endswith(".wqm"):
+            _worker_model = load_wqm(bundle_dir)[0]
+        else:
+            _worker_model = CompiledModel.load_bundle(bundle_dir, mmap=True)
+        _worker_bundle = bundle_dir
+    return _worker_model
+
+
+def _worker_init(bundle_dir):
+    if bundle_dir is not None:
+        _worker_model_for(bundle_dir)
+
+
+def _worker_predict(bundle_dir, X):
+    return _worker_model_for(bundle_dir).predict(X)
+
+
+class PooledModel:
+    """Drop-in `.predict(X)` that runs on the inference process pool."""
+
+    def __init__(self, pool, bundle_dir, feature_names=None):
+        self.pool = pool
+        self.bundle_dir = bundle_dir
+        self.feature_names = feature_names
+
+    def predict(self, X):
+        return self.pool.predict(self.bundle_dir, X)
+
+
+class InferencePool:
+    """Process pool whose workers score from a shared memory-mapped model bundle
+    (a bundle directory or a versioned .wqm file).
+
+    Workers receive the bundle path with each task and re-map only when it
+    changes, so a hot-reloaded model is picked up without restarting the pool.
+    """
+
+    def __init__(self, workers=None):
+        self.workers = workers or os.cpu_count() or 1
+        self._executor = None
+
+    def start(self, bundle_dir=None):
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=MP_CONTEXT,
+                initializer=_worker_init,
+                initargs=(bundle_dir,),
+            )
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+
+    def wrap(self, compiled, bundle_dir):
+        self.start(bundle_dir)
+        return PooledModel(self, bundle_dir, compiled.feature_names)
+
+    def predict(self, bundle_dir, X):
+        return self._executor.submit(_worker_predict, bundle_dir, X).result()
+
+    def worker_pids(self):
+        if self._executor is None:
+            return []
+        return [p.pid for p in self._executor._processes.values()]
@@ -0,0 +1,291 @@
+# Filesystem model registry: immutable versions plus atomically switched aliases.
+#
+#   model_registry/
+#     versions/<version>/   the model (.joblib, and .wqm when present), feature_names.json,
+#                           metrics.json, drift_profile.json and meta.json; never modified once written.
+#                           The report and EDA plots of the model are attached afterwards
+#     production -> versions/<version>   what server.py serves by default
+#     candidate  -> versions/<version>   shadow-score with WINE_SHADOW_DIR=model_registry/candidate
+#     history.jsonl                      every alias change, oldest first
+#     labelled_samples.csv               rows added by train_model.py --incremental, oldest first
+#
+# train_model.py registers every model it trains, but a new version only goes
+# live when it is promoted. Promotion and rollback replace an alias symlink
+# with a single rename, so a server hot-reloading from the alias sees the old
+# version or the new one,
+# never a mix of one version's model and another's feature order. Version ids
+# are the content hash of the .joblib; the .wqm exported from it records the
+# same id, so ModelHolder reports it in every mode.
+#
+#   python model_registry.py register [DIR]     # add DIR's artifacts (default: the backend directory)
+#   python model_registry.py adopt [DIR]        # register and promote DIR's model if there is no production yet
+#   python model_registry.py attach [DIR]       # copy DIR's report and EDA plots to its model's version
+#   python model_registry.py list
+#   python model_registry.py promote VERSION
+#   python model_registry.py rollback           # back to the production version before the current one
+#   python model_registry.py shadow VERSION     # or --off
+
+import hashlib
+import json
+import os
+import shutil
+import time
+from fnmatch import fnmatch
+
+REGISTRY_DIR = os.environ.get("WINE_REGISTRY_DIR", "model_registry")
+MODEL_FILE = "best_model_wine_quality.joblib"
+WQM_FILE = "best_model_wine_quality.wqm"
+# Copied with every version; the .wqm and the drift profile are optional
+VERSION_FILES = (MODEL_FILE, "feature_names.json", "metrics.json")
+OPTIONAL_FILES = (WQM_FILE, "drift_profile.json")
+# Attached to a version once generate_report.py or pipeline.py has built them for its model
+REPORT_FILE = "Wine_Quality_Report.md"
+EDA_PATTERN = "eda_*.png"
+# Labelled samples collected after the base dataset, with the train/holdout side each was split to
+SAMPLES_FILE = "labelled_samples.csv"
+PRODUCTION = "production"
+CANDIDATE = "candidate"
+ALIASES = (PRODUCTION, CANDIDATE)
+
+
+def _stale_wqm(path, version):
+    """True when the .wqm at `path` was exported from a model other than `version`."""
+    if not os.path.exists(path):
+        return False
+    from wqm_format import read_wqm
+
+    # Files exported before the .wqm recorded its model are taken as they are
+    model_version = read_wqm(path, verify=False)[1].get("model_version")
+    return model_version is not None and model_version != version
+
+
+class RegistryError(Exception):
+    """Unknown version, missing artifacts or nothing to roll back to."""
+
+
+class ModelRegistry:
+    def __init__(self, root=REGISTRY_DIR):
+        self.root = root
+        self.versions_dir = os.path.join(root, "versions")
+        self.history_path = os.path.join(root, "history.jsonl")
+
+    def version_dir(self, version):
+        return os.path.join(self.versions_dir, version)
+
+    def register(self, source_dir=".", meta=None):
+        """Copy a model with its features and metrics in as a new version; returns the version id.
+
+        Registering the same model bytes again is a no-op returning the same id.
+        """
+        missing = [name for name in VERSION_FILES if not os.path.exists(os.path.join(source_dir, name))]
+        if missing:
+            raise RegistryError(f"{source_dir} is missing {missing}")
+        with open(os.path.join(source_dir, MODEL_FILE), "rb") as f:
+            version = hashlib.sha256(f.read()).hexdigest()[:12]
+        final = self.version_dir(version)
+        if os.path.isdir(final):
+            return version
+
+        os.makedirs(self.versions_dir, exist_ok=True)
+        tmp_dir = os.path.join(self.versions_dir, f".{version}.{os.getpid()}.tmp")
+        os.makedirs(tmp_dir)
+        try:
+            for name in VERSION_FILES + OPTIONAL_FILES:
+                if name == WQM_FILE and _stale_wqm(os.path.join(source_dir, name), version):
+                    print(f"Not copying {name}: it was exported from another model; re-export it")
+                    continue
+                if os.path.exists(os.path.join(source_dir, name)):
+                    shutil.copy2(os.path.join(source_dir, name), os.path.join(tmp_dir, name))
+            with open(os.path.join(tmp_dir, "metrics.json"), "r") as f:
+                metrics = json.load(f)
+            with open(os.path.join(tmp_dir, "meta.json"), "w") as f:
+                json.dump({**(meta or {}), "version": version, "metrics": metrics,
+                           "registered_at": time.time(), "source": os.path.abspath(source_dir)}, f, indent=2)
+            # The directory appears complete or not at all
+            os.rename(tmp_dir, final)
+        except OSError:
+            if not os.path.isdir(final):
+                raise
+        finally:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+        return version
+
+    def attach(self, source_dir=".", version=None):
+        """Copy `source_dir`'s report and EDA plots into a version (default: its model's).
+
+        Each file is replaced with a rename, so a server reading them from an
+        alias sees the old copy or the new one. Returns the version, or None
+        when that model is not registered.
+        """
+        if version is None:
+            if not os.path.exists(os.path.join(source_dir, MODEL_FILE)):
+                return None
+            with open(os.path.join(source_dir, MODEL_FILE), "rb") as f:
+                version = hashlib.sha256(f.read()).hexdigest()[:12]
+        target = self.version_dir(version)
+        if not os.path.isdir(target):
+            return None
+        for name in sorted(os.listdir(source_dir)):
+            if name == REPORT_FILE or fnmatch(name, EDA_PATTERN):
+                tmp_path = os.path.join(target, f".{name}.{os.getpid()}.tmp")
+                shutil.copy2(os.path.join(source_dir, name), tmp_path)
+                os.replace(tmp_path, os.path.join(target, name))
+        return version
+
+    def versions(self):
+        """meta.json of every version, oldest first."""
+        if not os.path.isdir(self.versions_dir):
+            return []
+        metas = []
+        for name in os.listdir(self.versions_dir):
+            path = os.path.join(self.versions_dir, name, "meta.json")
+            if not name.startswith(".") and os.path.exists(path):
+                with open(path, "r") as f:
+                    metas.append(json.load(f))
+        return sorted(metas, key=lambda meta: meta["registered_at"])
+
+    def alias(self, name):
+        """Version an alias points at, or None."""
+        try:
+            return os.path.basename(os.readlink(os.path.join(self.root, name)))
+        except (FileNotFoundError, OSError):
+            return None
+
+    def history(self):
+        try:
+            with open(self.history_path, "r") as f:
+                return [json.loads(line) for line in f if line.strip()]
+        except FileNotFoundError:
+            return []
+
+    def labelled_samples(self):
+        """Every stored labelled sample as a DataFrame (None before the first)."""
+        path = os.path.join(self.root, SAMPLES_FILE)
+        if not os.path.exists(path):
+            return None
+        import pandas as pd
+        return pd.read_csv(path)
+
+    def add_labelled_samples(self, frame):
+        """Append rows to the labelled-sample store; returns the number of rows now stored."""
+        import pandas as pd
+        existing = self.labelled_samples()
+        combined = frame if existing is None else pd.concat([existing, frame], ignore_index=True)
+        os.makedirs(self.root, exist_ok=True)
+        path = os.path.join(self.root, SAMPLES_FILE)
+        tmp_path = os.path.join(self.root, f".{SAMPLES_FILE}.{os.getpid()}.tmp")
+        combined.to_csv(tmp_path, index=False)
+        os.replace(tmp_path, path)
+        return len(combined)
+
+    def _set_alias(self, name, version, action):
+        if name not in ALIASES:
+            raise RegistryError(f"Unknown alias '{name}'")
+        if version is not None and not os.path.isdir(self.version_dir(version)):
+            raise RegistryError(f"Unknown version '{version}'")
+        previous = self.alias(name)
+        path = os.path.join(self.root, name)
+        if version is None:
+            if os.path.lexists(path):
+                os.remove(path)
+        else:
+            tmp_link = os.path.join(self.root, f".{name}.{os.getpid()}.tmp")
+            os.symlink(os.path.join("versions", version), tmp_link)
+            # rename() over the old link is the single atomic switch
+            os.replace(tmp_link, path)
+        with open(self.history_path, "a") as f:
+            f.write(json.dumps({"alias": name, "action": action, "version": version,
+                                "previous": previous, "at": time.time()}) + "\n")
+        return previous
+
+    def promote(self, version):
+        """Serve `version` in production; returns the version it replaced."""
+        return self._set_alias(PRODUCTION, version, "promote")
+
+    def rollback(self):
+        """Return production to the version promoted before the current one."""
+        stack = []
+        for entry in self.history():
+            if entry["alias"] != PRODUCTION:
+                continue
+            if entry["action"] == "promote":
+                stack.append(entry["version"])
+            elif entry["action"] == "rollback" and stack:
+                stack.pop()
+        if len(stack) < 2:
+            raise RegistryError("No earlier production version to roll back to")
+        self._set_alias(PRODUCTION, stack[-2], "rollback")
+        return stack[-2]
+
+    def adopt(self, source_dir="."):
+        """Register and promote `source_dir`'s model if nothing is in production yet.
+
+        For a checkout (or an earlier train_model.py run) whose model predates the
+        registry; pipeline.py calls it once per run. Returns the production version.
+        """
+        if self.alias(PRODUCTION) is None:
+            version = self.register(source_dir, meta={"adopted": True})
+            self.promote(version)
+            print(f"Adopted {os.path.join(source_dir, MODEL_FILE)} as production version {version}")
+        return self.alias(PRODUCTION)
+
+    def set_candidate(self, version):
+        """Shadow-score `version` against production (None stops shadowing)."""
+        return self._set_alias(CANDIDATE, version, "shadow" if version else "unshadow")
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Manage registered model versions.")
+    parser.add_argument("--root", default=REGISTRY_DIR)
+    commands = parser.add_subparsers(dest="command", required=True)
+    register = commands.add_parser("register", help="add a trained model as a new version")
+    register.add_argument("source", nargs="?", default=".")
+    adopt = commands.add_parser("adopt", help="register and promote a model if nothing is in production")
+    adopt.add_argument("source", nargs="?", default=".")
+    attach = commands.add_parser("attach", help="add a model's report and EDA plots to its version")
+    attach.add_argument("source", nargs="?", default=".")
+    commands.add_parser("list", help="versions, aliases and metrics")
+    promote = commands.add_parser("promote", help="serve a version in production")
+    promote.add_argument("version")
+    commands.add_parser("rollback", help="back to the previous production version")
+    shadow = commands.add_parser("shadow", help="shadow-score a candidate version")
+    shadow.add_argument("version", nargs="?")
+    shadow.add_argument("--off", action="store_true")
+    args = parser.parse_args()
+
+    registry = ModelRegistry(args.root)
+    try:
+        if args.command == "register":
+            print(f"Registered version {registry.register(args.source)}")
+        elif args.command == "adopt":
+            print(f"Production: {registry.adopt(args.source)}")
+        elif args.command == "attach":
+            version = registry.attach(args.source)
+            print(f"Attached the report and plots to {version}" if version else
+                  f"{os.path.join(args.source, MODEL_FILE)} is not registered")
+        elif args.command == "list":
+            aliases = {registry.alias(name): name for name in ALIASES}
+            for meta in registry.versions():
+                metrics = meta.get("metrics", {})
+                print(f"{meta['version']}  {time.strftime('%Y-%m-%d %H:%M', time.localtime(meta['registered_at']))}"
+                      f"  mae={metrics.get('mae', float('nan')):.4f}  r2={metrics.get('r2', float('nan')):.4f}"
+                      f"  {aliases.get(meta['version'], '')}")
+        elif args.command == "promote":
+            previous = registry.promote(args.version)
+            print(f"Production: {previous or '(none)'} -> {args.version}")
+        elif args.command == "rollback":
+            print(f"Production rolled back to {registry.rollback()}")
+        elif args.command == "shadow":
+            if args.off == (args.version is not None):
+                parser.error("give a version or --off")
+            registry.set_candidate(None if args.off else args.version)
+            print("Shadow scoring off" if args.off else f"Shadow candidate: {args.version}")
+    except RegistryError as e:
+        print(f"Error: {e}")
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
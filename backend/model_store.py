@@ -0,0 +1,395 @@
+import hashlib
+import io
+import json
+import os
+import shutil
+import threading
+import time
+import warnings
+from dataclasses import dataclass
+
+from compiled_model import CompiledModel, compile_pipeline
+from treeshap import TreeExplainer
+from wqm_format import load_wqm
+
+# "sklearn" serves the unpickled Pipeline, "compiled" its flat-array form,
+# "wqm" the flat-array form memory-mapped from a .wqm artifact (no unpickling)
+MODEL_MODES = ("sklearn", "compiled", "wqm")
+# Bundles of the versions loaded most recently (by any process) that are never pruned; other
+# uvicorn workers sharing bundle_root may still be serving one of them
+KEEP_BUNDLES = 3
+
+
+@dataclass(frozen=True)
+class LoadedModel:
+    """An immutable snapshot of the served model and its feature order."""
+    model: object
+    feature_order: list
+    version: str
+    loaded_at: float
+    mtime: float
+    mode: str = "sklearn"
+    bundle_dir: str = None
+    # The flat-array model (or pipeline) attributions are computed from; None if they are off
+    explain_source: object = None
+
+
+class _IgnoreFeatureNameWarning:
+    """Ignores sklearn's "X does not have valid feature names" while an array predict runs.
+
+    warnings.catch_warnings() saves and restores the process-wide filter list, so
+    one context per call would undo another thread's; a single one is held
+    while any predict is in flight.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._active = 0
+        self._context = None
+
+    def __enter__(self):
+        with self._lock:
+            if self._active == 0:
+                self._context = warnings.catch_warnings()
+                self._context.__enter__()
+                warnings.filterwarnings("ignore", message="X does not have valid feature names")
+            self._active += 1
+
+    def __exit__(self, *exc):
+        with self._lock:
+            self._active -= 1
+            if self._active == 0:
+                self._context.__exit__(None, None, None)
+                self._context = None
+        return False
+
+
+_ignore_feature_names = _IgnoreFeatureNameWarning()
+
+
+class ArrayPipeline:
+    """The served sklearn pipeline, predicting from float64 rows in feature_names.json order.
+
+    It was fitted on a DataFrame, so sklearn's feature-name check would warn on
+    every array; the warning is silenced for these calls only.
+    """
+
+    def __init__(self, pipeline):
+        self.pipeline = pipeline
+
+    def predict(self, X):
+        with _ignore_feature_names:
+            return self.pipeline.predict(X)
+
+
+def _joblib():
+    # Deferred: joblib (and sklearn, when unpickling) are only needed outside wqm mode
+    import joblib
+    return joblib
+
+
+def _file_signature(path):
+    """Cheap change detector: (mtime, size, inode) of a file, or None if missing.
+
+    The inode catches a symlink switched to a different copy (model_registry.py
+    aliases) whose mtime and size happen to match.
+    """
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+
+class ModelHolder:
+    """Loads the model once and swaps in a new one when the artifact changes.
+
+    Requests read `holder.current`, which is replaced in a single assignment
+    only after the new model is fully loaded, so an in-flight request always
+    sees either the old or the new snapshot, never a partial one.
+
+    In compiled mode with a `bundle_root`, each version is exported once to
+    `bundle_root/<version>/` and memory-mapped from there, so every process
+    serving that version (uvicorn workers, an `InferencePool`) shares one
+    read-only copy and only the first one pays for unpickling.
+
+    In wqm mode `model_path` is a .wqm artifact: it is mapped in place, and
+    with a pool each version is hard-linked to `bundle_root/<version>.wqm` so
+    workers keep mapping the version they were handed across reloads.
+
+    With `explain`, `explainer_for(snapshot)` builds a TreeExplainer the first
+    time a version is asked for attributions and keeps it for that version, so
+    loads (and servers that never explain) don't pay for its tables.
+    """
+
+    def __init__(self, model_path, features_path, check_interval=2.0, mode="sklearn",
+                 bundle_root=None, pool=None, explain=False):
+        if mode not in MODEL_MODES:
+            raise ValueError(f"Unknown model mode '{mode}' (expected one of {MODEL_MODES})")
+        self.model_path = model_path
+        self.features_path = features_path
+        self.check_interval = check_interval
+        self.mode = mode
+        self.bundle_root = bundle_root
+        self.pool = pool
+        self.explain = explain
+        self.current = None
+        self.last_error = None
+        self.reloads = 0
+        self.reload_errors = 0
+        self._signature = None
+        self._prune_pending = False
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._listeners = []
+        self._explainers = {}
+        self._explain_lock = threading.Lock()
+
+    def add_reload_listener(self, callback):
+        """Call `callback(snapshot)` whenever a new model version is published."""
+        self._listeners.append(callback)
+
+    def load(self):
+        """Load the artifact from disk and publish it. Returns the snapshot."""
+        with self._lock:
+            signature = _file_signature(self.model_path)
+            if signature is None:
+                raise FileNotFoundError(self.model_path)
+            model_path, features_path = self._resolve_paths()
+
+            if self.mode == "wqm":
+                # The artifact carries the version of the .joblib it was exported
+                # from (the registry's id); older files only their own checksum
+                model, meta = load_wqm(model_path)
+                version = meta.get("model_version") or meta["checksum"][:12]
+            else:
+                with open(model_path, "rb") as f:
+                    payload = f.read()
+                # Version by content so identical retrains keep the same id
+                version = hashlib.sha256(payload).hexdigest()[:12]
+            if self.current is not None and self.current.version == version:
+                self._signature = signature
+                return self.current
+
+            feature_order = None
+            if os.path.exists(features_path):
+                with open(features_path, "r") as f:
+                    feature_order = json.load(f)
+            bundle_dir = None
+            compiled = pipeline = None
+            if self.mode == "wqm":
+                feature_order = feature_order or model.feature_names
+                compiled = model
+                if self.pool is not None and self.bundle_root is not None:
+                    bundle_dir = self._link_version(model_path, version)
+                    model = self.pool.wrap(model, bundle_dir)
+            elif self.mode == "compiled" and self.bundle_root is not None:
+                bundle_dir = os.path.join(self.bundle_root, version)
+                if not os.path.isdir(bundle_dir):
+                    os.makedirs(self.bundle_root, exist_ok=True)
+                    compile_pipeline(_joblib().load(io.BytesIO(payload)), feature_order).export_bundle(bundle_dir)
+                model = compiled = CompiledModel.load_bundle(bundle_dir, mmap=True)
+                if self.pool is not None:
+                    model = self.pool.wrap(model, bundle_dir)
+            elif self.mode == "compiled":
+                model = compiled = compile_pipeline(_joblib().load(io.BytesIO(payload)), feature_order)
+            else:
+                pipeline = _joblib().load(io.BytesIO(payload))
+                model = ArrayPipeline(pipeline)
+
+            snapshot = LoadedModel(
+                model=model,
+                feature_order=feature_order,
+                version=version,
+                loaded_at=time.time(),
+                mtime=signature[0] / 1e9,
+                mode=self.mode,
+                bundle_dir=bundle_dir,
+                explain_source=(compiled if compiled is not None else pipeline) if self.explain else None,
+            )
+            self.current = snapshot
+            self._signature = signature
+            self.last_error = None
+            self.reloads += 1
+            for callback in self._listeners:
+                callback(snapshot)
+            print(f"Loaded model version {version} ({self.mode}) from {self.model_path}")
+            if bundle_dir is not None:
+                # Old bundles are pruned on a later check, never by the load that publishes one
+                self._mark_used(version)
+                self._prune_pending = True
+            return snapshot
+
+    def explainer_for(self, snapshot):
+        """TreeExplainer for `snapshot`, built on first use (None if attributions are off or unsupported)."""
+        if snapshot.explain_source is None:
+            return None
+        with self._explain_lock:
+            if snapshot.version not in self._explainers:
+                # Only the latest version's tables are kept
+                self._explainers = {snapshot.version: self._build_explainer(snapshot.explain_source,
+                                                                            snapshot.feature_order)}
+            return self._explainers[snapshot.version]
+
+    def _build_explainer(self, model, feature_order):
+        try:
+            if not isinstance(model, CompiledModel):
+                # The attributions walk the flat node table; sklearn mode still serves the pipeline
+                model = compile_pipeline(model, feature_order)
+            return TreeExplainer(model)
+        except ValueError as e:
+            # Older artifacts (no node counts) and uncompilable models still serve predictions
+            print(f"Explanations disabled for this model: {e}")
+            return None
+
+    def _resolve_paths(self):
+        """Model and feature paths through any directory symlink, resolved together.
+
+        pipeline.py publishes by switching an artifacts/current symlink; reading
+        both files through the resolved directory keeps a load from pairing one
+        generation's model with another's feature order.
+        """
+        model_path = os.path.realpath(self.model_path)
+        if os.path.dirname(os.path.abspath(self.features_path)) == os.path.dirname(os.path.abspath(self.model_path)):
+            return model_path, os.path.join(os.path.dirname(model_path), os.path.basename(self.features_path))
+        return model_path, self.features_path
+
+    def _link_version(self, model_path, version):
+        os.makedirs(self.bundle_root, exist_ok=True)
+        path = os.path.join(self.bundle_root, f"{version}.wqm")
+        if not os.path.exists(path):
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            try:
+                os.link(model_path, tmp_path)
+            except OSError:
+                shutil.copyfile(model_path, tmp_path)
+            os.replace(tmp_path, path)
+        return path
+
+    def _mark_used(self, version):
+        # bundle_root/<version>.used: its mtime is when a process last loaded the version
+        path = os.path.join(self.bundle_root, f"{version}.used")
+        with open(path, "a"):
+            pass
+        os.utime(path)
+
+    def _prune_bundles(self):
+        """Remove bundles of all but the KEEP_BUNDLES most recently loaded versions.
+
+        bundle_root is shared by every uvicorn worker, and a worker that has not
+        reloaded yet still hands its version's path to the pool, so only versions
+        that many loads behind (and never this process's own) are removed.
+        Processes still mapping a removed bundle keep valid pages.
+        """
+        self._prune_pending = False
+        versions = {}
+        for name in os.listdir(self.bundle_root):
+            # Skips bundles another process is still writing
+            if not name.endswith(".tmp") and not name.startswith("."):
+                versions.setdefault(name.split(".")[0], []).append(name)
+
+        def last_used(version):
+            try:
+                return os.stat(os.path.join(self.bundle_root, f"{version}.used")).st_mtime
+            except FileNotFoundError:
+                return 0.0
+
+        ranked = sorted(versions, key=last_used, reverse=True)
+        for version in ranked[KEEP_BUNDLES:]:
+            if self.current is not None and version == self.current.version:
+                continue
+            for name in versions[version]:
+                path = os.path.join(self.bundle_root, name)
+                if os.path.isdir(path):
+                    shutil.rmtree(path, ignore_errors=True)
+                else:
+                    try:
+                        os.remove(path)
+                    except FileNotFoundError:
+                        pass
+
+    def maybe_reload(self):
+        """Reload if the artifact changed on disk since the last load."""
+        signature = _file_signature(self.model_path)
+        if signature is None or signature == self._signature:
+            if self._prune_pending:
+                self._prune_bundles()
+            return False
+        try:
+            previous = self.current
+            return self.load() is not previous
+        except Exception as e:
+            # Keep serving the previous model; retry on the next check
+            self.last_error = str(e)
+            self.reload_errors += 1
+            print(f"Model reload failed, keeping current version: {e}")
+            return False
+
+    def _watch(self):
+        while not self._stop.wait(self.check_interval):
+            self.maybe_reload()
+
+    def start_watching(self):
+        if self._thread is None and self.check_interval > 0:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._watch, name="model-watcher", daemon=True)
+            self._thread.start()
+
+    def stop_watching(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.check_interval + 1)
+            self._thread = None
+
+
+def _atomic_replace(path, write):
+    """Write via a temp file in the same directory, then rename over `path`."""
+    directory = os.path.dirname(os.path.abspath(path))
+    tmp_path = os.path.join(directory, f".{os.path.basename(path)}.{os.getpid()}.tmp")
+    try:
+        write(tmp_path)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def dump_model_atomic(model, path):
+    """joblib.dump that never exposes a half-written artifact to the watcher."""
+    _atomic_replace(path, lambda tmp: _joblib().dump(model, tmp))
+
+
+def write_json_atomic(obj, path):
+    def write(tmp):
+        with open(tmp, "w") as f:
+            json.dump(obj, f)
+    _atomic_replace(path, write)
+
+
+def save_versioned_model(model, path, versions_dir=None, meta=None):
+    """Keep an immutable copy in `versions_dir`, then atomically publish it at `path`.
+
+    `versions_dir` defaults to WINE_MODEL_VERSIONS_DIR, else model_versions/.
+
+    The version is the same content hash ModelHolder reports for the published
+    file. `meta` (plus the version) is written next to the copy as JSON.
+    """
+    buffer = io.BytesIO()
+    _joblib().dump(model, buffer)
+    payload = buffer.getvalue()
+    version = hashlib.sha256(payload).hexdigest()[:12]
+    versions_dir = versions_dir or os.environ.get("WINE_MODEL_VERSIONS_DIR", "model_versions")
+    os.makedirs(versions_dir, exist_ok=True)
+    stem = os.path.splitext(os.path.basename(path))[0]
+    versioned = os.path.join(versions_dir, f"{stem}-{version}.joblib")
+
+    def write(tmp):
+        with open(tmp, "wb") as f:
+            f.write(payload)
+    _atomic_replace(versioned, write)
+    write_json_atomic({**(meta or {}), "version": version, "saved_at": time.time()},
+                      os.path.join(versions_dir, f"{stem}-{version}.json"))
+    _atomic_replace(path, write)
+    return version
+
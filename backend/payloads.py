@@ -0,0 +1,140 @@
+# Request payloads for /predict, validated against the served feature order.
+#
+# Three equivalent ways to send one wine:
+#
+#   {"features": {"fixed_acidity": 7.4, ...}}   every feature, by name
+#   {"values": [7.4, 0.7, ...]}                   positional, feature_names.json order
+#   Content-Type: application/x-wine-f64          packed little-endian float64 in
+#                                                 the same order (8 bytes per feature)
+#
+# The JSON schema is generated from the feature order: every feature is a
+# required number (strings are not coerced) and unknown keys are rejected, so
+# a missing feature is a 422 instead of a silent 0. Binary bodies are wrapped with np.frombuffer, so
+# nothing is copied between the socket buffer and the model.
+from functools import lru_cache
+from typing import List, Optional
+
+import numpy as np
+from pydantic import BaseModel, ConfigDict, Field, StrictFloat, ValidationError, create_model, model_validator
+
+BINARY_CONTENT_TYPE = "application/x-wine-f64"
+BINARY_CONTENT_TYPES = (BINARY_CONTENT_TYPE, "application/octet-stream")
+_F64 = np.dtype("<f8")
+
+# The request model depends on the served feature order, so /predict parses its
+# own body; this documents the accepted bodies in the OpenAPI schema.
+OPENAPI_REQUEST_BODY = {
+    "requestBody": {
+        "required": True,
+        "content": {
+            "application/json": {"schema": {
+                "type": "object",
+                "description": "Exactly one of `features` (every feature by name) or `values` "
+                               "(floats in /features order).",
+                "properties": {
+                    "features": {"type": "object", "additionalProperties": {"type": "number"}},
+                    "values": {"type": "array", "items": {"type": "number"}},
+                },
+            }},
+            BINARY_CONTENT_TYPE: {"schema": {
+                "type": "string", "format": "binary",
+                "description": "Little-endian float64 values in /features order.",
+            }},
+        },
+    }
+}
+
+
+class PayloadError(ValueError):
+    """Rejected request body; `errors` is a list of pydantic-style error dicts."""
+
+    def __init__(self, errors):
+        super().__init__(errors[0]["msg"] if errors else "invalid payload")
+        self.errors = errors
+
+
+class FeatureSchema:
+    """Strict request model for one feature order (cached per order)."""
+
+    def __init__(self, feature_order):
+        self.feature_order = list(feature_order)
+        n = len(self.feature_order)
+        # Positional field names keep arbitrary column names valid; the alias
+        # is what clients send. Declared in feature order, so the validated
+        # model's values come out ready to use as a row.
+        fields = {
+            f"f{i}": (StrictFloat, Field(alias=name))
+            for i, name in enumerate(self.feature_order)
+        }
+        self.features_model = create_model(
+            "WineFeatures", __config__=ConfigDict(extra="forbid", allow_inf_nan=True), **fields
+        )
+
+        class PredictionPayload(BaseModel):
+            model_config = ConfigDict(extra="forbid")
+            features: Optional[self.features_model] = None
+            values: Optional[List[StrictFloat]] = Field(default=None, min_length=n, max_length=n)
+
+            @model_validator(mode="after")
+            def exactly_one(self):
+                if (self.features is None) == (self.values is None):
+                    raise ValueError("send exactly one of `features` or `values`")
+                return self
+
+        self.request_model = PredictionPayload
+
+    def parse_json(self, body):
+        """JSON body -> (1, n_features) float64 row in feature order."""
+        try:
+            payload = self.request_model.model_validate_json(body)
+        except ValidationError as e:
+            raise PayloadError(e.errors(include_url=False, include_context=False, include_input=False))
+        return self._row(payload)
+
+    def parse_row(self, features=None, values=None):
+        """Already-decoded `features` or `values` (e.g. nested in another body) -> (1, n_features) row."""
+        given = {key: v for key, v in (("features", features), ("values", values)) if v is not None}
+        try:
+            payload = self.request_model.model_validate(given)
+        except ValidationError as e:
+            raise PayloadError(e.errors(include_url=False, include_context=False, include_input=False))
+        return self._row(payload)
+
+    def _row(self, payload):
+        if payload.values is not None:
+            return np.array([payload.values], dtype=np.float64)
+        return np.array([tuple(payload.features.__dict__.values())], dtype=np.float64)
+
+    def parse_binary(self, body):
+        """Packed little-endian float64 body -> zero-copy (1, n_features) view."""
+        n = len(self.feature_order)
+        if len(body) != n * _F64.itemsize:
+            raise PayloadError([{
+                "type": "binary_length",
+                "loc": ["body"],
+                "msg": f"expected {n * _F64.itemsize} bytes ({n} float64 values), got {len(body)}",
+            }])
+        return np.frombuffer(body, dtype=_F64).reshape(1, n)
+
+    def parse(self, body, content_type):
+        if is_binary(content_type):
+            return self.parse_binary(body)
+        return self.parse_json(body)
+
+
+@lru_cache(maxsize=8)
+def _schema(feature_order):
+    return FeatureSchema(feature_order)
+
+
+def schema_for(feature_order):
+    return _schema(tuple(feature_order))
+
+
+def is_binary(content_type):
+    return (content_type or "").split(";")[0].strip().lower() in BINARY_CONTENT_TYPES
+
+
+def pack_row(values):
+    """Client helper: encode one row (feature order) as a binary /predict body."""
+    return np.asarray(values, dtype=_F64).tobytes()
@@ -0,0 +1,334 @@
+# Artifact pipeline: train -> metrics -> EDA -> report, with stage caching.
+#
+# Each stage declares its code, the stages it reads from and the files it
+# writes. A stage's key hashes the dataset, its code, its parameters and the
+# exact bytes of its dependencies' outputs; when the key matches the
+# published run, its outputs are hard-linked forward instead of rebuilt.
+# Independent stages (training and EDA) run concurrently.
+#
+# A run builds a complete new generation under artifacts/.<id>.tmp/, renames
+# it to artifacts/<id>/ and then swaps the artifacts/current symlink in one
+# rename. A server started with WINE_ARTIFACT_DIR=artifacts/current
+# therefore sees either the old set or the new set, never a mix. Each
+# generation's pipeline.json records which dataset, stage keys and model
+# version every artifact came from.
+#
+#   python pipeline.py                                  # rebuild stale stages and publish
+#   python pipeline.py --train-args "--search halving"  # arguments passed to train_model.py
+#   python pipeline.py --force eda                      # rebuild a stage even if it is fresh
+#   python pipeline.py --status                         # provenance of the published generation
+
+import hashlib
+import json
+import os
+import shutil
+import subprocess
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from fnmatch import fnmatch
+
+from wine_data import TARGET, ensure_cached
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+ARTIFACT_ROOT = os.environ.get("WINE_ARTIFACT_ROOT", os.path.join(BACKEND_DIR, "artifacts"))
+CURRENT = "current"
+MANIFEST = "pipeline.json"
+# Published generations kept besides the current one (for a manual rollback)
+KEEP_GENERATIONS = 3
+MODEL_FILE = "best_model_wine_quality.joblib"
+REGISTRY_ROOT = os.environ.get("WINE_REGISTRY_DIR", os.path.join(BACKEND_DIR, "model_registry"))
+
+
+@dataclass(frozen=True)
+class Stage:
+    """One step of the pipeline; `run(ctx, work_dir, **params)` writes `outputs(ctx)` into work_dir.
+
+    `reads` (fnmatch patterns) narrows which dependency outputs the stage
+    sees and is keyed on; by default it reads all of them. With
+    `incremental`, the work directory starts with the stage's previous
+    outputs, for stages that keep their own finer-grained cache.
+    """
+    name: str
+    code: tuple
+    outputs: object
+    run: object
+    deps: tuple = ()
+    params: dict = field(default_factory=dict)
+    reads: tuple = ()
+    incremental: bool = False
+
+    def inputs(self, results):
+        """{file: sha256} of the dependency outputs this stage reads."""
+        return {name: digest for dep in self.deps for name, digest in results[dep]["outputs"].items()
+                if not self.reads or any(fnmatch(name, pattern) for pattern in self.reads)}
+
+
+def _sha256(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def _link_or_copy(src, dst):
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copy2(src, dst)
+
+
+def _run_script(args, work_dir, log_path, env=None):
+    with open(log_path, "w") as log:
+        result = subprocess.run([sys.executable, *args], cwd=work_dir, stdout=log, stderr=subprocess.STDOUT,
+                                env={**os.environ, **(env or {})})
+    if result.returncode != 0:
+        with open(log_path, "r") as f:
+            tail = f.read()[-2000:]
+        raise RuntimeError(f"{os.path.basename(args[0])} exited with {result.returncode}:\n{tail}")
+
+
+def run_train(ctx, work_dir, train_args=()):
+    _run_script(
+        [os.path.join(BACKEND_DIR, "train_model.py"), *train_args,
+         "--checkpoint", os.path.join(BACKEND_DIR, "search_checkpoint.jsonl")],
+        work_dir, os.path.join(work_dir, "train.log"),
+        # Version history stays in one place across generations
+        env={"WINE_MODEL_VERSIONS_DIR": os.path.join(BACKEND_DIR, "model_versions"),
+             "WINE_REGISTRY_DIR": REGISTRY_ROOT},
+    )
+
+
+def run_eda(ctx, work_dir):
+    _run_script([os.path.join(BACKEND_DIR, "eda_plots.py"), "--output-dir", work_dir],
+                work_dir, os.path.join(work_dir, "eda.log"))
+
+
+def run_report(ctx, work_dir):
+    from generate_report import generate_report
+    generate_report(work_dir)
+
+
+def eda_outputs(ctx):
+    from eda_plots import MANIFEST_PATH, plot_jobs
+    return [output for output, _, _ in plot_jobs(ctx["dataset"]["columns"] + [TARGET])] + [MANIFEST_PATH]
+
+
+def default_stages(train_args=()):
+    return [
+        Stage("train", ("train_model.py", "search.py", "bin_cache.py", "compiled_model.py", "wqm_format.py",
+                        "model_store.py", "wine_data.py", "model_registry.py", "drift.py"),
+              lambda ctx: [MODEL_FILE, "best_model_wine_quality.wqm", "metrics.json", "feature_names.json",
+                           "drift_profile.json", "training_report.json"],
+              run_train, params={"train_args": list(train_args)}),
+        Stage("eda", ("eda_plots.py", "wine_data.py"), eda_outputs, run_eda, incremental=True),
+        Stage("report", ("generate_report.py",),
+              lambda ctx: ["Wine_Quality_Report.md"],
+              run_report, deps=("train", "eda"), reads=("metrics.json", "feature_names.json", "eda_*.png")),
+    ]
+
+
+def read_manifest(root=ARTIFACT_ROOT):
+    """pipeline.json of the published generation, or None before the first run."""
+    try:
+        with open(os.path.join(root, CURRENT, MANIFEST), "r") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+class Pipeline:
+    """Runs stale stages into a new generation and publishes it atomically."""
+
+    def __init__(self, stages, root=ARTIFACT_ROOT, force=()):
+        self.stages = {stage.name: stage for stage in stages}
+        self.root = root
+        self.force = set(force)
+        self.previous = read_manifest(root) or {"stages": {}}
+        self.current_dir = os.path.join(root, CURRENT)
+        self._code_hashes = {}
+
+    def _code_hash(self, name):
+        if name not in self._code_hashes:
+            self._code_hashes[name] = _sha256(os.path.join(BACKEND_DIR, name))
+        return self._code_hashes[name]
+
+    def stage_key(self, stage, ctx, results):
+        inputs = {
+            "dataset": ctx["dataset"]["hash"],
+            "code": {name: self._code_hash(name) for name in stage.code},
+            "params": stage.params,
+            "inputs": stage.inputs(results),
+        }
+        return hashlib.sha256(json.dumps(inputs, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+
+    def is_fresh(self, stage, key, outputs):
+        previous = self.previous["stages"].get(stage.name)
+        if stage.name in self.force or previous is None or previous["key"] != key:
+            return False
+        if sorted(previous["outputs"]) != sorted(outputs):
+            return False
+        # Published files are only ever replaced by new generations, never edited in place
+        return all(os.path.exists(os.path.join(self.current_dir, name)) for name in outputs)
+
+    def plan(self, ctx):
+        """{stage: (key, fresh)} for stages whose inputs are all known without running anything."""
+        results, plan = {}, {}
+        for stage in self._ordered():
+            if any(dep not in results for dep in stage.deps):
+                continue
+            key = self.stage_key(stage, ctx, results)
+            outputs = stage.outputs(ctx)
+            fresh = self.is_fresh(stage, key, outputs)
+            plan[stage.name] = (key, fresh)
+            if fresh:
+                results[stage.name] = self.previous["stages"][stage.name]
+        return plan
+
+    def _ordered(self):
+        done, order = set(), []
+        while len(order) < len(self.stages):
+            ready = [s for s in self.stages.values() if s.name not in done and set(s.deps) <= done]
+            if not ready:
+                raise ValueError("The stage graph has a cycle or an unknown dependency")
+            for stage in ready:
+                done.add(stage.name)
+                order.append(stage)
+        return order
+
+    def _execute(self, stage, ctx, results, staging):
+        """Run (or carry forward) one stage; returns its manifest entry."""
+        t0 = time.perf_counter()
+        key = self.stage_key(stage, ctx, results)
+        outputs = stage.outputs(ctx)
+        if self.is_fresh(stage, key, outputs):
+            for name in outputs:
+                _link_or_copy(os.path.join(self.current_dir, name), os.path.join(staging, name))
+            entry = dict(self.previous["stages"][stage.name], ran=False)
+            print(f"[{stage.name}] up to date ({key})")
+            return entry
+
+        work_dir = os.path.join(staging, f".work-{stage.name}")
+        os.makedirs(work_dir)
+        # Stages with their own caches (eda_plots.py's manifest) only redo what changed;
+        # they replace files by rename, so the published links are never written through
+        previous = self.previous["stages"].get(stage.name)
+        seed = stage.incremental and stage.name not in self.force
+        for name in (previous or {}).get("outputs", {}) if seed else ():
+            if os.path.exists(os.path.join(self.current_dir, name)):
+                _link_or_copy(os.path.join(self.current_dir, name), os.path.join(work_dir, name))
+        for name in stage.inputs(results):
+            _link_or_copy(os.path.join(staging, name), os.path.join(work_dir, name))
+        print(f"[{stage.name}] running ({key})")
+        stage.run(ctx, work_dir, **stage.params)
+        missing = [name for name in outputs if not os.path.exists(os.path.join(work_dir, name))]
+        if missing:
+            raise RuntimeError(f"Stage '{stage.name}' did not write {missing}")
+        hashes = {}
+        for name in outputs:
+            os.replace(os.path.join(work_dir, name), os.path.join(staging, name))
+            hashes[name] = _sha256(os.path.join(staging, name))
+        log = os.path.join(work_dir, f"{stage.name}.log")
+        if os.path.exists(log):
+            os.replace(log, os.path.join(staging, f"{stage.name}.log"))
+        shutil.rmtree(work_dir)
+        seconds = time.perf_counter() - t0
+        print(f"[{stage.name}] done in {seconds:.1f} s")
+        return {"key": key, "outputs": hashes, "ran": True, "seconds": round(seconds, 3), "finished": time.time()}
+
+    def run(self, ctx):
+        """Returns the new manifest, or the current one if every stage was fresh."""
+        t0 = time.perf_counter()
+        plan = self.plan(ctx)
+        if len(plan) == len(self.stages) and all(fresh for _, fresh in plan.values()):
+            print(f"All stages up to date; {os.path.join(self.root, CURRENT)} unchanged "
+                  f"({(time.perf_counter() - t0) * 1000:.0f} ms)")
+            return self.previous
+
+        generation = time.strftime("%Y%m%d-%H%M%S") + f"-{os.getpid()}"
+        staging = os.path.join(self.root, f".{generation}.tmp")
+        os.makedirs(staging)
+        results = {}
+        try:
+            with ThreadPoolExecutor(max_workers=len(self.stages)) as executor:
+                running = {}
+                while len(results) < len(self.stages):
+                    for stage in self._ordered():
+                        if (stage.name not in results and stage.name not in running.values()
+                                and all(dep in results for dep in stage.deps)):
+                            running[executor.submit(self._execute, stage, ctx, results, staging)] = stage.name
+                    done, _ = wait(running, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        results[running.pop(future)] = future.result()
+            manifest = self._manifest(generation, ctx, results)
+            with open(os.path.join(staging, MANIFEST), "w") as f:
+                json.dump(manifest, f, indent=2)
+            self._publish(staging, generation)
+        finally:
+            shutil.rmtree(staging, ignore_errors=True)
+        print(f"Published generation {generation} in {time.perf_counter() - t0:.1f} s")
+        return manifest
+
+    def _manifest(self, generation, ctx, results):
+        artifacts = {name: {"stage": stage, "sha256": digest}
+                     for stage, entry in results.items() for name, digest in entry["outputs"].items()}
+        model = artifacts.get(MODEL_FILE)
+        return {
+            "generation": generation,
+            "created": time.time(),
+            "dataset_hash": ctx["dataset"]["hash"],
+            "dataset_source": ctx["dataset"]["source"],
+            # Same id ModelHolder reports for this model
+            "model_version": model["sha256"][:12] if model else None,
+            "stages": results,
+            "artifacts": artifacts,
+        }
+
+    def _publish(self, staging, generation):
+        final = os.path.join(self.root, generation)
+        os.rename(staging, final)
+        link = os.path.join(self.root, f".{CURRENT}.{os.getpid()}.tmp")
+        os.symlink(generation, link)
+        # rename() over the old symlink is the single atomic switch
+        os.replace(link, os.path.join(self.root, CURRENT))
+        self._prune(keep=generation)
+
+    def _prune(self, keep):
+        generations = sorted(name for name in os.listdir(self.root)
+                             if not name.startswith(".") and name != CURRENT and name != keep)
+        for name in generations[:-KEEP_GENERATIONS] if KEEP_GENERATIONS else generations:
+            shutil.rmtree(os.path.join(self.root, name), ignore_errors=True)
+
+
+if __name__ == "__main__":
+    import argparse
+    import shlex
+
+    parser = argparse.ArgumentParser(description="Build and publish the model, EDA and report artifacts.")
+    parser.add_argument("--train-args", default="", help="arguments passed to train_model.py")
+    parser.add_argument("--force", nargs="*", metavar="STAGE",
+                        help="rebuild these stages (all if none are named)")
+    parser.add_argument("--root", default=ARTIFACT_ROOT)
+    parser.add_argument("--status", action="store_true", help="print the published generation's provenance")
+    args = parser.parse_args()
+
+    if args.status:
+        print(json.dumps(read_manifest(args.root), indent=2))
+        sys.exit(0)
+    stages = default_stages(shlex.split(args.train_args))
+    force = [stage.name for stage in stages] if args.force == [] else (args.force or [])
+    os.makedirs(args.root, exist_ok=True)
+    try:
+        Pipeline(stages, args.root, force).run({"dataset": ensure_cached()})
+    except Exception as e:
+        print(f"Pipeline failed, {os.path.join(args.root, CURRENT)} left unchanged: {e}")
+        sys.exit(1)
+    # train_model.py promotes the first version it registers; this covers a cached train
+    # stage and an empty registry. The server never writes to the registry itself
+    from model_registry import ModelRegistry
+    registry = ModelRegistry(REGISTRY_ROOT)
+    registry.adopt(os.path.join(args.root, CURRENT))
+    # The server reads the report and EDA plots from the version it serves
+    registry.attach(os.path.join(args.root, CURRENT))
@@ -0,0 +1,91 @@
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+
+class PredictionCache:
+    """Bounded LRU cache of raw predictions keyed on the feature vector.
+
+    Keys are (model version, bytes of the float64 row in feature_names.json
+    order), optionally rounded to `decimals` places so near-identical slider
+    values share an entry. Including the version means a reloaded model can
+    never be answered from the old one's entries; `clear()` is also wired to
+    model reloads to free them straight away.
+    """
+
+    def __init__(self, max_entries=10000, decimals=None):
+        self.max_entries = max_entries
+        self.decimals = decimals
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @property
+    def enabled(self):
+        return self.max_entries > 0
+
+    def _canonical(self, X):
+        X = np.asarray(X, dtype=np.float64)
+        if self.decimals is not None:
+            X = np.round(X, self.decimals)
+        # + 0.0 folds -0.0 into 0.0 so both hash the same
+        return np.ascontiguousarray(X + 0.0)
+
+    def get_many(self, version, X):
+        """Look up every row of X. Returns (predictions, miss_mask); misses are NaN."""
+        rows = self._canonical(X)
+        keys = [(version, row.tobytes()) for row in rows]
+        predictions = np.full(len(keys), np.nan)
+        miss = np.ones(len(keys), dtype=bool)
+        with self._lock:
+            for i, key in enumerate(keys):
+                value = self._entries.get(key)
+                if value is not None:
+                    self._entries.move_to_end(key)
+                    predictions[i] = value
+                    miss[i] = False
+            hits = int(len(keys) - miss.sum())
+            self.hits += hits
+            self.misses += len(keys) - hits
+        return predictions, miss
+
+    def put_many(self, version, X, predictions):
+        rows = self._canonical(X)
+        with self._lock:
+            for row, prediction in zip(rows, predictions):
+                key = (version, row.tobytes())
+                self._entries[key] = float(prediction)
+                self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def get(self, version, row):
+        predictions, miss = self.get_many(version, np.reshape(row, (1, -1)))
+        return None if miss[0] else predictions[0]
+
+    def put(self, version, row, prediction):
+        self.put_many(version, np.reshape(row, (1, -1)), [prediction])
+
+    def clear(self, *_):
+        with self._lock:
+            self._entries.clear()
+            self.invalidations += 1
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "max_entries": self.max_entries,
+            "decimals": self.decimals,
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
@@ -0,0 +1,84 @@
+# Bulk-score a CSV/NDJSON lab export in fixed-size chunks.
+#
+#   python score_file.py export.csv -o scores.csv
+#   python score_file.py export.ndjson --url http://localhost:8000   # stream through the API
+#
+# Memory stays flat regardless of file size: the file is read in blocks and
+# only one chunk of rows is parsed and scored at a time.
+
+import argparse
+import codecs
+import json
+import sys
+import urllib.request
+
+import joblib
+
+import bulk_scoring
+from model_store import ArrayPipeline
+
+BLOCK_SIZE = 1 << 16
+
+
+def read_blocks(f, block_size=BLOCK_SIZE):
+    while True:
+        block = f.read(block_size)
+        if not block:
+            return
+        yield block
+
+
+def score_locally(f, out, fmt, chunk_rows, model_path, features_path):
+    # Scored from float64 rows, as the server does
+    model = ArrayPipeline(joblib.load(model_path))
+    with open(features_path, "r") as fh:
+        feature_order = json.load(fh)
+    for text in bulk_scoring.score_stream(read_blocks(f), model, feature_order, fmt, chunk_rows):
+        out.write(text)
+
+
+def score_remotely(f, out, fmt, chunk_rows, url):
+    content_type = "text/csv" if fmt == "csv" else "application/x-ndjson"
+    # An iterable body is sent with chunked transfer encoding, so the upload
+    # streams too and results start coming back before it finishes.
+    req = urllib.request.Request(
+        f"{url.rstrip('/')}/predict/stream?format={fmt}&chunk_rows={chunk_rows}",
+        data=read_blocks(f),
+        headers={"Content-Type": content_type},
+    )
+    # A multi-byte character can be split across two network blocks
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    with urllib.request.urlopen(req) as response:
+        for block in read_blocks(response):
+            out.write(decoder.decode(block))
+    out.write(decoder.decode(b"", final=True))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Score a CSV/NDJSON file of wine samples.")
+    parser.add_argument("input", help="CSV (with header) or NDJSON file, '-' for stdin")
+    parser.add_argument("-o", "--output", default="-", help="output file (default: stdout)")
+    parser.add_argument("--format", choices=bulk_scoring.FORMATS, help="input format (default: from extension)")
+    parser.add_argument("--chunk-rows", type=int, default=bulk_scoring.DEFAULT_CHUNK_ROWS)
+    parser.add_argument("--url", help="score through a running API server instead of locally")
+    parser.add_argument("--model", default="best_model_wine_quality.joblib")
+    parser.add_argument("--features", default="feature_names.json")
+    args = parser.parse_args()
+
+    fmt = args.format or bulk_scoring.detect_format(filename=args.input)
+    f = sys.stdin.buffer if args.input == "-" else open(args.input, "rb")
+    out = sys.stdout if args.output == "-" else open(args.output, "w", encoding="utf-8")
+    try:
+        if args.url:
+            score_remotely(f, out, fmt, args.chunk_rows, args.url)
+        else:
+            score_locally(f, out, fmt, args.chunk_rows, args.model, args.features)
+    finally:
+        if f is not sys.stdin.buffer:
+            f.close()
+        if out is not sys.stdout:
+            out.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,377 @@
+# Hyperparameter searches with an on-disk checkpoint, per-fit profiling and an
+# optional time/memory budget.
+#
+# randomized_search() evaluates sampled candidates like RandomizedSearchCV (same
+# sampler, same unshuffled K folds, so the same scores). successive_halving_search()
+# evaluates them in rungs: every rung trains the surviving candidates with
+# `factor` times more resource (boosting iterations or training rows) and keeps
+# the best 1/`factor`.
+#
+# Each finished (candidate, fold, resource) fit is appended to a JSONL checkpoint
+# together with its fit/predict time, peak RSS and boosting iterations used, so an
+# interrupted search re-run with the same settings skips straight past the work
+# already done. With a Budget, no new candidates are launched once the wall-clock
+# or memory limit is spent; the best candidate evaluated so far is returned.
+
+import hashlib
+import json
+import math
+import os
+import resource as _resource
+import time
+
+import numpy as np
+from joblib import Parallel, delayed, effective_n_jobs
+from sklearn.base import clone
+from sklearn.model_selection import KFold, ParameterSampler
+
+RESOURCES = ("max_iter", "n_samples")
+
+
+def _jsonable(value):
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+
+def params_key(params):
+    """Stable id for a parameter dict (used in checkpoint keys)."""
+    text = json.dumps({k: _jsonable(v) for k, v in sorted(params.items())}, sort_keys=True)
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()[:16]
+
+
+def _reset_peak_rss():
+    # Linux: writing 5 to clear_refs resets VmHWM, giving a per-fit peak
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        pass
+
+
+def peak_rss_mb():
+    """Peak resident memory of this process in MB (since the last reset on Linux)."""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return _resource.getrusage(_resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class Budget:
+    """Wall-clock (seconds) and/or peak-RSS (MB) limit for launching new candidates."""
+
+    def __init__(self, seconds=None, memory_mb=None):
+        self.seconds = seconds
+        self.memory_mb = memory_mb
+        self.start = time.perf_counter()
+        self.reason = None
+
+    def elapsed(self):
+        return time.perf_counter() - self.start
+
+    def exceeded(self, peak_mb=0.0):
+        if self.reason is None:
+            if self.seconds is not None and self.elapsed() >= self.seconds:
+                self.reason = f"time budget of {self.seconds:g}s spent"
+            elif self.memory_mb is not None and max(peak_mb, peak_rss_mb()) >= self.memory_mb:
+                self.reason = f"memory budget of {self.memory_mb:g} MB reached"
+        return self.reason is not None
+
+
+class Checkpoint:
+    """Append-only JSONL record of finished fits, keyed by (run, candidate, fold, resource)."""
+
+    def __init__(self, path):
+        self.path = path
+        self.results = {}
+        if path and os.path.exists(path):
+            with open(path, "r") as f:
+                lines = f.readlines()
+            if lines and not lines[-1].endswith("\n"):
+                # A torn last line from an interrupted write: cut it off, or the
+                # next record would be appended to it and lost as well
+                lines.pop()
+                with open(path, "r+") as f:
+                    f.truncate(sum(len(line.encode("utf-8")) for line in lines))
+            for line in lines:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                self.results[record["key"]] = record
+        self.resumed = len(self.results)
+
+    def get(self, key):
+        return self.results.get(key)
+
+    def add(self, record):
+        self.results[record["key"]] = record
+        if self.path:
+            with open(self.path, "a") as f:
+                f.write(json.dumps(record) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+
+
+def _fit_and_score(estimator, params, X, y, train_idx, test_idx, scorer, resource, amount,
+                   random_state, iter_param):
+    estimator = clone(estimator).set_params(**params)
+    if resource == "max_iter":
+        estimator.set_params(**{iter_param: int(amount)})
+    elif resource == "n_samples" and amount < len(train_idx):
+        # Sub-sample the training fold (deterministically per fold/amount)
+        rng = np.random.RandomState(random_state)
+        train_idx = rng.choice(train_idx, size=int(amount), replace=False)
+    X_train, y_train = _take(X, train_idx), y[train_idx]
+    X_test, y_test = _take(X, test_idx), y[test_idx]
+    _reset_peak_rss()
+    t0 = time.perf_counter()
+    estimator.fit(X_train, y_train)
+    fit_time = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    test_score = scorer(estimator, X_test, y_test)
+    score_time = time.perf_counter() - t0
+    train_score = scorer(estimator, X_train, y_train)
+    model = estimator.steps[-1][1] if hasattr(estimator, "steps") else estimator
+    n_iter = getattr(model, "n_iter_", None) or getattr(model, "n_estimators_", None)
+    return {
+        "test_score": float(test_score),
+        "train_score": float(train_score),
+        "fit_time": fit_time,
+        "score_time": score_time,
+        "peak_rss_mb": peak_rss_mb(),
+        "n_iter": None if n_iter is None else int(n_iter),
+    }
+
+
+def _take(X, idx):
+    return X.iloc[idx] if hasattr(X, "iloc") else X[idx]
+
+
+def _schedule(n_candidates, factor, min_resource, max_resource):
+    """[(n_candidates, resource)] per rung, ending at max_resource."""
+    n_rungs = max(1, int(math.floor(math.log(n_candidates, factor))) + 1)
+    rungs = []
+    for i in range(n_rungs):
+        amount = max_resource / factor ** (n_rungs - 1 - i)
+        rungs.append((max(1, int(math.ceil(n_candidates / factor ** i))), max(min_resource, int(round(amount)))))
+    return rungs
+
+
+class _Runner:
+    """Evaluates (candidate, fold) fits for one search, through the checkpoint."""
+
+    def __init__(self, estimator, candidates, X, y, scorer, cv, resource, iter_param,
+                 checkpoint_path, n_jobs, random_state, data_hash, budget, verbose):
+        self.estimator = estimator
+        self.candidates = candidates
+        self.X, self.y, self.scorer = X, y, scorer
+        self.folds = list(KFold(n_splits=cv).split(X, y))
+        self.resource = resource
+        self.iter_param = iter_param
+        self.n_jobs = n_jobs
+        self.random_state = random_state
+        self.budget = budget or Budget()
+        self.checkpoint = Checkpoint(checkpoint_path)
+        if verbose and self.checkpoint.resumed:
+            print(f"Resuming from {checkpoint_path}: {self.checkpoint.resumed} fits already done")
+        # Everything that changes a fit's outcome goes into its checkpoint key
+        self.run_id = params_key({
+            "data": data_hash, "cv": cv, "resource": resource, "random_state": random_state,
+            "estimator": repr(clone(estimator).get_params(deep=True)),
+        })
+        self.records = []
+        self.completed = 0
+        self.peak_mb = 0.0
+
+    def key(self, c, f, amount):
+        return f"{self.run_id}:{params_key(self.candidates[c])}:{f}:{self.resource}={amount}"
+
+    def evaluate(self, parallel, alive, amount):
+        """Fold results per candidate; stops launching candidates once the budget is spent."""
+        # Launch whole candidates, enough of them at a time to keep every worker busy
+        group = max(1, math.ceil(effective_n_jobs(self.n_jobs) / len(self.folds)))
+        done = {}
+        for start in range(0, len(alive), group):
+            # Always finish at least one candidate, so there is something to refit
+            if self.completed and self.budget.exceeded(self.peak_mb):
+                break
+            chunk = alive[start:start + group]
+            tasks = [(c, f) for c in chunk for f in range(len(self.folds))
+                     if self.checkpoint.get(self.key(c, f, amount)) is None]
+            results = parallel(
+                delayed(_fit_and_score)(self.estimator, self.candidates[c], self.X, self.y,
+                                        *self.folds[f], self.scorer, self.resource, amount,
+                                        self.random_state + f, self.iter_param)
+                for c, f in tasks
+            )
+            fresh = set()
+            for (c, f), result in zip(tasks, results):
+                record = {"key": self.key(c, f, amount), "candidate": c, "fold": f,
+                          "resource": amount, **result}
+                self.checkpoint.add(record)
+                fresh.add(record["key"])
+            for c in chunk:
+                fold_results = [self.checkpoint.get(self.key(c, f, amount)) for f in range(len(self.folds))]
+                done[c] = fold_results
+                self.completed += 1
+                for r in fold_results:
+                    self.peak_mb = max(self.peak_mb, r.get("peak_rss_mb") or 0.0)
+                    self.records.append({
+                        "candidate": c,
+                        "params": {k: _jsonable(v) for k, v in self.candidates[c].items()},
+                        "from_checkpoint": r["key"] not in fresh,
+                        **{k: v for k, v in r.items() if k != "key"},
+                    })
+        return done
+
+
+def _mean_score(fold_results):
+    return float(np.mean([r["test_score"] for r in fold_results]))
+
+
+def _finish(runner, evaluations, best, best_params, history, resource):
+    return {
+        "best_params_": best_params,
+        "best_score_": _mean_score(evaluations[best][1]),
+        "cv_results_": _cv_results(runner.candidates, evaluations, resource),
+        "rungs": history,
+        "fits": runner.records,
+        "stopped": runner.budget.reason,
+    }
+
+
+def randomized_search(estimator, param_distributions, X, y, scorer, n_iter=30, cv=4,
+                      checkpoint_path=None, n_jobs=-1, random_state=42, data_hash="",
+                      budget=None, verbose=1):
+    """RandomizedSearchCV equivalent; returns best_params_, best_score_, cv_results_ and fits."""
+    candidates = list(ParameterSampler(param_distributions, n_iter=n_iter, random_state=random_state))
+    runner = _Runner(estimator, candidates, X, y, scorer, cv, None, None, checkpoint_path,
+                     n_jobs, random_state, data_hash, budget, verbose)
+    with Parallel(n_jobs=n_jobs) as parallel:
+        done = runner.evaluate(parallel, list(range(len(candidates))), 0)
+    if verbose:
+        print(f"Evaluated {len(done)}/{len(candidates)} candidates x {cv} folds"
+              + (f" (stopped: {runner.budget.reason})" if runner.budget.reason else ""))
+    evaluations = {c: (0, folds) for c, folds in done.items()}
+    # Ties go to the earlier candidate, as in RandomizedSearchCV
+    best = max(evaluations, key=lambda c: (_mean_score(evaluations[c][1]), -c))
+    return _finish(runner, evaluations, best, dict(candidates[best]), [], None)
+
+
+def successive_halving_search(estimator, param_distributions, X, y, scorer, cv=4,
+                              n_candidates=81, factor=3, resource="max_iter",
+                              min_resource=None, max_resource=None,
+                              checkpoint_path=None, n_jobs=-1, random_state=42,
+                              data_hash="", iter_param="model__max_iter", budget=None, verbose=1):
+    """Run the search; returns a dict with best_params_, best_score_, cv_results_, rungs and fits.
+
+    With resource="max_iter" the number of boosting rounds (`iter_param`) is the
+    budget and is dropped from `param_distributions`; with "n_samples" each fold's
+    training rows are sub-sampled instead. If `budget` runs out, the best candidate
+    of the highest rung reached is returned with the full `max_resource` rounds
+    (early stopping still applies), so the refit is never left under-trained.
+    """
+    if resource not in RESOURCES:
+        raise ValueError(f"resource must be one of {RESOURCES}")
+    distributions = dict(param_distributions)
+    if resource == "max_iter":
+        # The budget decides the number of boosting rounds
+        distributions.pop(iter_param, None)
+        max_resource = max_resource or 1200
+        min_resource = min_resource or 10
+    else:
+        max_resource = max_resource or int(len(y) * (cv - 1) / cv)
+        min_resource = min_resource or 200
+
+    candidates = list(ParameterSampler(distributions, n_iter=n_candidates, random_state=random_state))
+    runner = _Runner(estimator, candidates, X, y, scorer, cv, resource, iter_param, checkpoint_path,
+                     n_jobs, random_state, data_hash, budget, verbose)
+
+    rungs = _schedule(len(candidates), factor, min_resource, max_resource)
+    alive = list(range(len(candidates)))
+    history = []
+    evaluations = {}  # candidate -> (resource, [fold results])
+    best, best_amount = None, None
+    with Parallel(n_jobs=n_jobs) as parallel:
+        for rung, (n_keep, amount) in enumerate(rungs):
+            if best is not None and runner.budget.exceeded(runner.peak_mb):
+                break
+            alive = alive[:n_keep]
+            t0 = time.perf_counter()
+            if verbose:
+                cached = sum(runner.checkpoint.get(runner.key(c, f, amount)) is not None
+                             for c in alive for f in range(cv))
+                print(f"Rung {rung}: {len(alive)} candidates x {cv} folds at {resource}={amount} "
+                      f"({len(alive) * cv - cached} fits to run, {cached} from checkpoint)")
+            done = runner.evaluate(parallel, alive, amount)
+            if not done:
+                break
+            means = {c: _mean_score(folds) for c, folds in done.items()}
+            for c, folds in done.items():
+                evaluations[c] = (amount, folds)
+            # Higher is better (scorers are negated losses)
+            alive = sorted(means, key=lambda c: means[c], reverse=True)
+            best, best_amount = alive[0], amount
+            history.append({
+                "rung": rung,
+                "resource": amount,
+                "n_candidates": len(means),
+                "best_score": means[best],
+                "wall_s": time.perf_counter() - t0,
+            })
+            if verbose:
+                print(f"  best mean score {means[best]:.4f} ({history[-1]['wall_s']:.1f}s)")
+    if verbose and runner.budget.reason:
+        print(f"Search stopped early: {runner.budget.reason}")
+
+    best_params = dict(candidates[best])
+    if resource == "max_iter":
+        # A rung cut short by the budget only chose the candidate; its small round count isn't a setting
+        best_params[iter_param] = int(max_resource if runner.budget.reason else best_amount)
+    return _finish(runner, evaluations, best, best_params, history, resource)
+
+
+def _cv_results(candidates, evaluations, resource):
+    """cv_results_-style dict: each candidate at the largest resource it reached."""
+    order = sorted(evaluations)
+    folds = [evaluations[c][1] for c in order]
+    means = np.array([_mean_score(f) for f in folds])
+    amounts = np.array([evaluations[c][0] for c in order])
+    # Rank by resource reached first, then by score, like HalvingRandomSearchCV
+    ranking = sorted(range(len(order)), key=lambda i: (-amounts[i], -means[i]))
+    ranks = np.empty(len(order), dtype=int)
+    ranks[ranking] = np.arange(1, len(order) + 1)
+
+    def mean_of(field):
+        return np.array([np.mean([r[field] or 0 for r in f]) for f in folds])
+
+    results = {
+        "params": [candidates[c] for c in order],
+        "mean_test_score": means,
+        "std_test_score": np.array([np.std([r["test_score"] for r in f]) for f in folds]),
+        "mean_train_score": mean_of("train_score"),
+        "mean_fit_time": mean_of("fit_time"),
+        "mean_score_time": mean_of("score_time"),
+        "mean_n_iter": mean_of("n_iter"),
+        "max_peak_rss_mb": np.array([max(r.get("peak_rss_mb") or 0.0 for r in f) for f in folds]),
+        "rank_test_score": ranks,
+    }
+    if resource is not None:
+        results[f"param_{resource}_budget"] = amounts
+    return results
+
+
+def cv_results_to_json(cv_results):
+    """cv_results_ as plain JSON-serializable lists."""
+    out = {}
+    for name, values in cv_results.items():
+        if name == "params":
+            out[name] = [{k: _jsonable(v) for k, v in p.items()} for p in values]
+        else:
+            out[name] = [_jsonable(v) for v in np.asarray(values).tolist()]
+    return out
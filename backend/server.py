@@ -1,15 +1,192 @@
 
-from fastapi import FastAPI, HTTPException
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse, JSONResponse
-from pydantic import BaseModel
-import joblib
-import pandas as pd
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from pydantic import BaseModel, Field
+from typing import List, Optional
+import numpy as np
 import json
+import math
 import os
-import uvicorn
+import re
+import time
 
-app = FastAPI(title="Wine Quality API", description="Backend for Wine Quality Prediction")
+from advisor import advise
+from artifact_cache import ArtifactCache
+from batching import MicroBatcher, QueueFullError
+from drift import PROFILE_FILE, DriftMonitor
+from inference_executor import InferenceExecutor, OverloadedError
+import bulk_scoring
+import payloads
+import sweep
+from instrumentation import RuntimeMetrics, TimingMiddleware
+from model_registry import PRODUCTION, REGISTRY_DIR
+from model_store import ModelHolder
+from prediction_cache import PredictionCache
+from shadow import ShadowScorer
+
+# "sklearn" (default), "compiled" to serve from the flat-array tree evaluator, or
+# "wqm" to memory-map that evaluator from best_model_wine_quality.wqm (fastest cold start)
+MODEL_MODE = os.environ.get("WINE_MODEL_MODE", "sklearn")
+
+# Load Model and Artifacts. The model is served from the registry's production alias
+# (model_registry.py), so a retrain only goes live once it is promoted. WINE_MODEL_DIR opts
+# out, e.g. "." for whatever train_model.py last wrote in place or artifacts/current for the
+# generation pipeline.py last published (which switches all artifacts at once)
+MODEL_DIR = os.environ.get("WINE_MODEL_DIR") or os.path.join(REGISTRY_DIR, PRODUCTION)
+# The report and EDA plots come from the same directory as the model (a registry version has
+# them attached by generate_report.py or pipeline.py), unless WINE_ARTIFACT_DIR says otherwise
+ARTIFACT_DIR = os.environ.get("WINE_ARTIFACT_DIR") or MODEL_DIR
+MODEL_FILE = "best_model_wine_quality.wqm" if MODEL_MODE == "wqm" else "best_model_wine_quality.joblib"
+MODEL_PATH = os.path.join(MODEL_DIR, MODEL_FILE)
+FEATURES_PATH = os.path.join(MODEL_DIR, "feature_names.json")
+METRICS_PATH = os.path.join(MODEL_DIR, "metrics.json")
+REPORT_PATH = os.path.join(ARTIFACT_DIR, "Wine_Quality_Report.md")
+EDA_FEATURE_IMAGE = re.compile(r"eda_feature_\w+\.png")
+# Seconds between checks for a retrained model on disk (0 disables hot-reload)
+MODEL_CHECK_INTERVAL = float(os.environ.get("WINE_MODEL_CHECK_INTERVAL", "2.0"))
+# Compiled models are exported here once per version and memory-mapped by every process
+BUNDLE_ROOT = "model_bundles"
+# Processes in the inference pool (0 = predict in the server process); implies compiled
+# mode unless serving a .wqm artifact
+INFERENCE_WORKERS = int(os.environ.get("WINE_INFERENCE_WORKERS", "0"))
+# Upper bound on rows accepted by /predict/batch in one request
+MAX_BATCH_ROWS = int(os.environ.get("WINE_MAX_BATCH_ROWS", "100000"))
+# Micro-batching of concurrent /predict calls: collect rows for up to
+# WINE_BATCH_WINDOW_MS (0 disables coalescing) or WINE_BATCH_MAX_ROWS rows
+BATCH_WINDOW_MS = float(os.environ.get("WINE_BATCH_WINDOW_MS", "0"))
+BATCH_MAX_ROWS = int(os.environ.get("WINE_BATCH_MAX_ROWS", "64"))
+BATCH_MAX_QUEUE = int(os.environ.get("WINE_BATCH_MAX_QUEUE", "10000"))
+# Dedicated inference threads (default: one per core) and how many requests may
+# wait for one; beyond that /predict* answers 503 with Retry-After
+INFERENCE_SLOTS = int(os.environ.get("WINE_INFERENCE_SLOTS", "0")) or None
+INFERENCE_QUEUE = int(os.environ.get("WINE_INFERENCE_QUEUE", "64"))
+# LRU prediction cache size (0 disables) and optional rounding of inputs for the key
+CACHE_SIZE = int(os.environ.get("WINE_CACHE_SIZE", "10000"))
+CACHE_DECIMALS = os.environ.get("WINE_CACHE_DECIMALS")
+# Per-feature attributions (?explain=true): a TreeExplainer is built the first time a model
+# version is asked for them (set to 0 to disable), and /predict/batch explains at most
+# WINE_MAX_EXPLAIN_ROWS rows at once. Without an explainer, responses just omit "explanation"
+EXPLAIN = os.environ.get("WINE_EXPLAIN", "1") != "0"
+MAX_EXPLAIN_ROWS = int(os.environ.get("WINE_MAX_EXPLAIN_ROWS", "1000"))
+# Shadow scoring: a candidate model directory (e.g. model_registry/candidate) scored on
+# a sample of live /predict rows in the background while the server is idle
+SHADOW_DIR = os.environ.get("WINE_SHADOW_DIR", "")
+SHADOW_SAMPLE = float(os.environ.get("WINE_SHADOW_SAMPLE", "1.0"))
+SHADOW_MAX_PENDING = int(os.environ.get("WINE_SHADOW_MAX_PENDING", "4096"))
+# Input-drift monitoring of /predict rows against the model's drift_profile.json (0 disables);
+# scores need WINE_DRIFT_MIN_ROWS rows, and at most WINE_DRIFT_MAX_PENDING rows wait for a flush
+DRIFT = os.environ.get("WINE_DRIFT", "1") != "0"
+DRIFT_MIN_ROWS = int(os.environ.get("WINE_DRIFT_MIN_ROWS", "100"))
+DRIFT_MAX_PENDING = int(os.environ.get("WINE_DRIFT_MAX_PENDING", "10000"))
+# Per-stage request timing for /metrics/runtime (set to 0 to switch off)
+INSTRUMENTATION = os.environ.get("WINE_INSTRUMENTATION", "1") != "0"
+
+runtime_metrics = RuntimeMetrics(enabled=INSTRUMENTATION)
+
+# Only imported when enabled: the startup path pulls in nothing inference doesn't use
+# (pandas, joblib and sklearn stay unloaded in wqm mode; see test_import_time.py)
+inference_pool = None
+if INFERENCE_WORKERS > 0:
+    from inference_pool import InferencePool
+    inference_pool = InferencePool(INFERENCE_WORKERS)
+model_holder = ModelHolder(
+    MODEL_PATH, FEATURES_PATH,
+    check_interval=MODEL_CHECK_INTERVAL,
+    mode="compiled" if inference_pool is not None and MODEL_MODE != "wqm" else MODEL_MODE,
+    bundle_root=BUNDLE_ROOT,
+    pool=inference_pool,
+    explain=EXPLAIN,
+)
+inference_executor = InferenceExecutor(INFERENCE_SLOTS, INFERENCE_QUEUE, metrics=runtime_metrics)
+batcher = MicroBatcher(window_ms=BATCH_WINDOW_MS, max_batch=BATCH_MAX_ROWS, max_queue=BATCH_MAX_QUEUE,
+                       metrics=runtime_metrics, executor=inference_executor)
+prediction_cache = PredictionCache(
+    max_entries=CACHE_SIZE,
+    decimals=int(CACHE_DECIMALS) if CACHE_DECIMALS else None,
+)
+model_holder.add_reload_listener(prediction_cache.clear)
+drift_monitor = None
+if DRIFT:
+    drift_monitor = DriftMonitor(max_pending=DRIFT_MAX_PENDING, min_rows=DRIFT_MIN_ROWS)
+    # Each model version is compared with the profile of its own training data, from the same directory
+    model_holder.add_reload_listener(lambda snapshot: drift_monitor.load(
+        os.path.join(os.path.dirname(os.path.realpath(MODEL_PATH)), PROFILE_FILE), snapshot.feature_order))
+shadow_scorer = None
+if SHADOW_DIR:
+    # Its own holder (no pool, no explainer), hot-reloaded when the candidate alias moves
+    shadow_scorer = ShadowScorer(
+        ModelHolder(os.path.join(SHADOW_DIR, MODEL_FILE), os.path.join(SHADOW_DIR, "feature_names.json"),
+                    check_interval=MODEL_CHECK_INTERVAL, mode=MODEL_MODE),
+        is_idle=lambda: inference_executor.busy == 0 and inference_executor.queue_depth == 0,
+        max_pending=SHADOW_MAX_PENDING,
+        sample_rate=SHADOW_SAMPLE,
+    )
+# /features, /metrics, /report and /eda/* bodies, revalidated by ETag
+artifact_cache = ArtifactCache()
+
+def collect_runtime_counters():
+    cache = prediction_cache.stats()
+    batching = batcher.stats()
+    return [
+        ("wine_cache_hits_total", "counter", "Prediction cache hits", cache["hits"]),
+        ("wine_cache_misses_total", "counter", "Prediction cache misses", cache["misses"]),
+        ("wine_cache_evictions_total", "counter", "Prediction cache LRU evictions", cache["evictions"]),
+        ("wine_cache_entries", "gauge", "Entries currently cached", cache["entries"]),
+        ("wine_model_reloads_total", "counter", "Model versions loaded since startup", model_holder.reloads),
+        ("wine_model_reload_errors_total", "counter", "Failed model reload attempts", model_holder.reload_errors),
+        ("wine_batcher_queue_depth", "gauge", "Rows waiting in the micro-batching queue", batching["queue_depth"]),
+        ("wine_batcher_batches_total", "counter", "Coalesced predict calls", batching["batches"]),
+        ("wine_batcher_rejected_total", "counter", "Requests rejected by a full queue", batching["rejected"]),
+        ("wine_inference_busy_slots", "gauge", "Inference slots computing", inference_executor.busy),
+        ("wine_inference_queue_depth", "gauge", "Requests waiting for an inference slot",
+         inference_executor.queue_depth),
+        ("wine_inference_rejected_total", "counter", "Requests shed with 503 by a full inference queue",
+         inference_executor.rejected),
+    ]
+
+runtime_metrics.add_collector(collect_runtime_counters)
+
+@asynccontextmanager
+async def lifespan(app):
+    # Load once at startup; the server still starts (and /ready reports 503) before training.
+    # Startup never writes to the registry: every uvicorn worker runs this
+    try:
+        model_holder.load()
+    except FileNotFoundError:
+        print(f"Model artifact {MODEL_PATH} not found; waiting for train_model.py to create it"
+              + ("" if os.environ.get("WINE_MODEL_DIR") else
+                 " (or 'python model_registry.py adopt' to register an existing model)") + ".")
+    except Exception as e:
+        model_holder.last_error = str(e)
+        print(f"Failed to load model: {e}")
+    model_holder.start_watching()
+    if BATCH_WINDOW_MS > 0:
+        batcher.start()
+    if drift_monitor is not None:
+        drift_monitor.start()
+    if shadow_scorer is not None:
+        try:
+            shadow_scorer.holder.load()
+        except Exception as e:
+            shadow_scorer.holder.last_error = str(e)
+            print(f"Shadow candidate not loaded from {SHADOW_DIR}: {e}")
+        shadow_scorer.holder.start_watching()
+        shadow_scorer.start()
+    yield
+    if shadow_scorer is not None:
+        shadow_scorer.stop()
+        shadow_scorer.holder.stop_watching()
+    if drift_monitor is not None:
+        drift_monitor.stop()
+    await batcher.stop()
+    model_holder.stop_watching()
+    if inference_pool is not None:
+        inference_pool.shutdown()
+    inference_executor.shutdown()
+
+app = FastAPI(title="Wine Quality API", description="Backend for Wine Quality Prediction", lifespan=lifespan)
 
 # CORS Configuration
 # CORS Configuration
@@ -23,100 +200,414 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# Added last so it wraps everything, CORS included
+app.add_middleware(TimingMiddleware, metrics=runtime_metrics)
 
-# Load Model and Artifacts
-MODEL_PATH = "best_model_wine_quality.joblib"
-FEATURES_PATH = "feature_names.json"
-METRICS_PATH = "metrics.json"
+class BatchPredictionRequest(BaseModel):
+    # One inner list per wine, values in `columns` order
+    rows: List[List[float]]
+    # Defaults to the order in feature_names.json
+    columns: Optional[List[str]] = None
+    # Add per-feature contributions for every row (at most WINE_MAX_EXPLAIN_ROWS rows)
+    explain: bool = False
 
-class PredictionRequest(BaseModel):
-    features: dict
+class SweepAxis(BaseModel):
+    feature: str
+    # Either explicit values or `num` evenly spaced points from start to stop
+    values: Optional[List[float]] = None
+    start: Optional[float] = None
+    stop: Optional[float] = None
+    num: int = Field(sweep.DEFAULT_POINTS, ge=1, le=MAX_BATCH_ROWS)
+
+class SweepRequest(BaseModel):
+    # The base wine, as in a /predict body
+    features: Optional[dict] = None
+    values: Optional[List[float]] = None
+    grid: List[SweepAxis] = Field(min_length=1, max_length=sweep.MAX_AXES)
 
 @app.get("/")
 def read_root():
     return {"message": "Welcome to the Wine Quality Prediction API"}
 
+@app.get("/ready")
+def get_ready():
+    snapshot = model_holder.current
+    if snapshot is None:
+        return JSONResponse(status_code=503, content={
+            "ready": False,
+            "error": model_holder.last_error or "Model not loaded. Please train the model first.",
+        })
+    return {
+        "ready": True,
+        "model_version": snapshot.version,
+        "model_mode": snapshot.mode,
+        "model_path": MODEL_PATH,
+        "loaded_at": snapshot.loaded_at,
+        "model_mtime": snapshot.mtime,
+        "last_reload_error": model_holder.last_error,
+    }
+
+def render_json(wrap=None):
+    """File bytes -> compact JSON body, optionally wrapped as {wrap: value}."""
+    def render(raw):
+        value = json.loads(raw)
+        return json.dumps({wrap: value} if wrap else value, separators=(",", ":")).encode("utf-8")
+    return render
+
+def render_report(raw):
+    return json.dumps({"content": raw.decode("utf-8")}, separators=(",", ":")).encode("utf-8")
+
 @app.get("/features")
-def get_features():
-    if not os.path.exists(FEATURES_PATH):
+def get_features(request: Request):
+    timer = runtime_metrics.timer("/features")
+    artifact = artifact_cache.get(FEATURES_PATH, "application/json", render_json("features"))
+    if artifact is None:
         # Fallback if file not found (e.g. before training)
         return {"features": []}
-    with open(FEATURES_PATH, "r") as f:
-        features = json.load(f)
-    return {"features": features}
+    timer.mark("load")
+    return artifact_cache.response(request, artifact)
 
 @app.get("/metrics")
-def get_metrics():
-    if not os.path.exists(METRICS_PATH):
+def get_metrics(request: Request):
+    timer = runtime_metrics.timer("/metrics")
+    artifact = artifact_cache.get(METRICS_PATH, "application/json", render_json())
+    if artifact is None:
         return {"error": "Metrics not found"}
-    with open(METRICS_PATH, "r") as f:
-        metrics = json.load(f)
-    return metrics
+    timer.mark("load")
+    return artifact_cache.response(request, artifact)
+
+@app.get("/metrics/runtime")
+def get_runtime_metrics():
+    # Prometheus text format: stage histograms plus cache/batching/reload counters
+    return PlainTextResponse(runtime_metrics.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/metrics/batching")
+def get_batching_metrics():
+    return batcher.stats()
+
+@app.get("/metrics/cache")
+def get_cache_metrics():
+    return prediction_cache.stats()
+
+@app.get("/metrics/artifacts")
+def get_artifact_metrics():
+    return artifact_cache.stats()
+
+@app.get("/metrics/shadow")
+def get_shadow_metrics():
+    if shadow_scorer is None:
+        return {"enabled": False}
+    return {"enabled": True, "primary_version": getattr(model_holder.current, "version", None),
+            **shadow_scorer.stats()}
+
+@app.get("/metrics/drift")
+def get_drift_metrics():
+    if drift_monitor is None:
+        return {"enabled": False}
+    return drift_monitor.report()
+
+@app.get("/metrics/inference")
+def get_inference_metrics():
+    return inference_executor.stats()
 
-@app.post("/predict")
-def predict_quality(request: PredictionRequest):
-    if not os.path.exists(MODEL_PATH):
+def overloaded(retry_after):
+    return HTTPException(status_code=503, detail="Server is busy; retry shortly.",
+                         headers={"Retry-After": str(retry_after)})
+
+@app.post("/predict", openapi_extra=payloads.OPENAPI_REQUEST_BODY)
+async def predict_quality(request: Request, explain: bool = False):
+    timer = runtime_metrics.timer("/predict")
+    # Take one snapshot so a concurrent reload can't mix model and feature order
+    snapshot = model_holder.current
+    if snapshot is None:
         raise HTTPException(status_code=503, detail="Model not loaded. Please train the model first.")
-    
+    if snapshot.feature_order is None:
+        raise HTTPException(status_code=503, detail="feature_names.json not found.")
+
+    # Validated against a schema generated from the served feature order; the
+    # row comes out in that order (binary bodies without a copy)
+    body = await request.body()
+    timer.mark("parse")
     try:
-        model = joblib.load(MODEL_PATH)
-        # Convert input dict to DataFrame
-        # Ensure correct order if feature_names is available
-        if os.path.exists(FEATURES_PATH):
-             with open(FEATURES_PATH, "r") as f:
-                feature_order = json.load(f)
-             # Create DF ensuring column order
-             data = {k: [v] for k, v in request.features.items()}
-             df = pd.DataFrame(data)
-             # Fill missing cols with 0 or handle error? 
-             # For now assume frontend sends all needed keys or we reindex
-             df = df.reindex(columns=feature_order, fill_value=0)
-        else:
-             # Just use what is sent
-             df = pd.DataFrame([request.features])
-
-        prediction = model.predict(df)[0]
-        score = round(float(prediction), 1)
-
-        # Advisor Logic
-        if score >= 7.5:
-            verdict = "Exceptional Vintage"
-            advice = "This wine shows outstanding complexity and balance. A truly superior choice suitable for aging."
-        elif score >= 6.0:
-            verdict = "Fine Table Wine"
-            advice = "A solid, enjoyable wine with good character. Perfect for daily consumption or casual dining."
+        X = payloads.schema_for(snapshot.feature_order).parse(body, request.headers.get("content-type"))
+    except payloads.PayloadError as e:
+        raise HTTPException(status_code=422, detail=e.errors)
+    if drift_monitor is not None:
+        # A deque append; the statistics are updated in batches by the monitor's thread
+        drift_monitor.submit(X)
+    timer.mark("build")
+
+    try:
+        model = snapshot.model
+        use_cache = prediction_cache.enabled
+        prediction = prediction_cache.get(snapshot.version, X[0]) if use_cache else None
+        timer.mark("cache")
+        primary_seconds = None
+        if prediction is None:
+            t0 = time.perf_counter()
+            if batcher.running:
+                # Coalesced with other in-flight requests into one predict call
+                prediction = await batcher.submit(snapshot, X[0])
+            else:
+                prediction = (await inference_executor.run(model.predict, X, endpoint="/predict"))[0]
+            if use_cache:
+                prediction_cache.put(snapshot.version, X[0], prediction)
+            primary_seconds = time.perf_counter() - t0
+            timer.mark("predict")
+        if shadow_scorer is not None:
+            # A deque append; the candidate scores it later, off the request path
+            shadow_scorer.submit(snapshot, X[0], prediction, primary_seconds)
+        # Advisor Logic, the same rounding and tiers as /predict/batch
+        scores, verdicts, advice = advise([prediction])
+        timer.mark("verdict")
+
+        content = {
+            "score": float(scores[0]),
+            "verdict": verdicts[0],
+            "advice": advice[0]
+        }
+        if explain and snapshot.explain_source is not None:
+            # Not cached or coalesced: one precomputed-table lookup on an inference slot
+            # (the first request for a version also builds the tables)
+            explained = await inference_executor.run(explain_rows, snapshot, X, endpoint="/predict")
+            if explained is not None:
+                content["explanation"] = explanation(snapshot, explained[0][0], explained[1])
+            timer.mark("explain")
+        response = JSONResponse(content)
+        timer.mark("serialize")
+        return response
+    except OverloadedError as e:
+        raise overloaded(e.retry_after)
+    except QueueFullError:
+        raise overloaded(1)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+def explain_rows(snapshot, X):
+    """(contributions, base_value) for X, or None if this model can't be explained."""
+    explainer = model_holder.explainer_for(snapshot)
+    return explainer.explain(X) if explainer is not None else None
+
+def explanation(snapshot, contributions, base_value):
+    """base_value + sum(contributions) is the model's raw output for the row."""
+    return {
+        "base_value": round(base_value, 6),
+        "contributions": dict(zip(snapshot.feature_order, np.round(contributions, 6).tolist())),
+    }
+
+@app.post("/predict/batch")
+async def predict_batch(request: BatchPredictionRequest):
+    timer = runtime_metrics.timer("/predict/batch")
+    timer.mark("parse")
+    snapshot = model_holder.current
+    if snapshot is None:
+        raise HTTPException(status_code=503, detail="Model not loaded. Please train the model first.")
+
+    feature_order = snapshot.feature_order or request.columns
+    if feature_order is None:
+        raise HTTPException(status_code=400, detail="Feature order unknown; pass `columns` with the rows.")
+    if len(request.rows) > MAX_BATCH_ROWS:
+        raise HTTPException(status_code=413, detail=f"Batch too large (max {MAX_BATCH_ROWS} rows).")
+    if request.explain and snapshot.explain_source is not None:
+        if len(request.rows) > MAX_EXPLAIN_ROWS:
+            raise HTTPException(status_code=413, detail=f"Too many rows to explain (max {MAX_EXPLAIN_ROWS}).")
+
+    # Everything after validation (matrix build through serialization) is
+    # CPU work, so it runs on an inference slot
+    try:
+        return await inference_executor.run(score_batch, snapshot, feature_order, request, timer,
+                                            endpoint="/predict/batch")
+    except OverloadedError as e:
+        raise overloaded(e.retry_after)
+
+def score_batch(snapshot, feature_order, request, timer):
+    timer.mark("queue")
+    if len(request.rows) == 0:
+        return {"model_version": snapshot.version, "count": 0, "scores": [], "verdicts": [], "advice": []}
+    columns = request.columns or feature_order
+    # Checked per row: numpy can't build a matrix from ragged rows
+    if any(len(row) != len(columns) for row in request.rows):
+        raise HTTPException(status_code=422, detail=f"Each row must have {len(columns)} values in order: {columns}")
+    # One contiguous float64 matrix for the whole batch
+    X = np.array(request.rows, dtype=np.float64, order="C")
+    if columns != feature_order:
+        missing = [c for c in feature_order if c not in columns]
+        if missing:
+            raise HTTPException(status_code=422, detail=f"Missing feature columns: {missing}")
+        X = np.ascontiguousarray(X[:, [columns.index(c) for c in feature_order]])
+    runtime_metrics.observe_size("wine_batch_rows", "/predict/batch", len(X), help="Rows per batch")
+    timer.mark("build")
+
+    try:
+        if prediction_cache.enabled:
+            # Only the rows not seen before go through the model
+            predictions, miss = prediction_cache.get_many(snapshot.version, X)
+            timer.mark("cache")
+            if miss.any():
+                predictions[miss] = snapshot.model.predict(X[miss])
+                prediction_cache.put_many(snapshot.version, X[miss], predictions[miss])
         else:
-            verdict = "Below Average"
-            advice = "This wine may have noticeable flaws or lacks balance. Might be best used for cooking or sangria."
+            predictions = snapshot.model.predict(X)
+        timer.mark("predict")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
 
-        return {
-            "score": score,
-            "verdict": verdict,
-            "advice": advice
+    scores, verdicts, advice = advise(predictions)
+    timer.mark("verdict")
+    content = {
+        "model_version": snapshot.version,
+        "count": len(scores),
+        "scores": scores.tolist(),
+        "verdicts": verdicts.tolist(),
+        "advice": advice.tolist(),
+    }
+    explained = explain_rows(snapshot, X) if request.explain else None
+    if explained is not None:
+        contributions, base_value = explained
+        # One row of contributions per wine, in `features` order
+        content["explanation"] = {
+            "features": feature_order,
+            "base_value": round(base_value, 6),
+            "contributions": np.round(contributions, 6).tolist(),
         }
+        timer.mark("explain")
+    response = JSONResponse(content)
+    timer.mark("serialize")
+    return response
+
+@app.post("/predict/sweep")
+async def predict_sweep(request: SweepRequest):
+    timer = runtime_metrics.timer("/predict/sweep")
+    timer.mark("parse")
+    snapshot = model_holder.current
+    if snapshot is None:
+        raise HTTPException(status_code=503, detail="Model not loaded. Please train the model first.")
+    if snapshot.feature_order is None:
+        raise HTTPException(status_code=503, detail="feature_names.json not found.")
+
+    try:
+        base = payloads.schema_for(snapshot.feature_order).parse_row(request.features, request.values)[0]
+    except payloads.PayloadError as e:
+        raise HTTPException(status_code=422, detail=e.errors)
+    # Size check first, so an oversized grid is never allocated; Python ints can't wrap around
+    sizes = [len(axis.values) if axis.values is not None else axis.num for axis in request.grid]
+    n_points = math.prod(sizes)
+    if max(sizes) > MAX_BATCH_ROWS or n_points > MAX_BATCH_ROWS:
+        raise HTTPException(status_code=413, detail=f"Grid too large ({n_points} points, max {MAX_BATCH_ROWS}).")
+    axes = []
+    for axis in request.grid:
+        if axis.feature not in snapshot.feature_order:
+            raise HTTPException(status_code=422, detail=f"Unknown feature '{axis.feature}'")
+        try:
+            grid = sweep.axis_grid(axis.start, axis.stop, axis.num, axis.values)
+        except ValueError as e:
+            raise HTTPException(status_code=422, detail=f"{axis.feature}: {e}")
+        axes.append((snapshot.feature_order.index(axis.feature), grid))
+    try:
+        sweep.check_axes(axes)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    runtime_metrics.observe_size("wine_batch_rows", "/predict/sweep", n_points, help="Rows per batch")
+    timer.mark("build")
+
+    try:
+        scores, base_score = await inference_executor.run(sweep.run_sweep, snapshot.model, base, axes,
+                                                          endpoint="/predict/sweep")
+    except OverloadedError as e:
+        raise overloaded(e.retry_after)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+    timer.mark("predict")
+
+    response = JSONResponse({
+        "model_version": snapshot.version,
+        "features": [axis.feature for axis in request.grid],
+        "grid": [grid.tolist() for _, grid in axes],
+        "base_score": round(base_score, 4),
+        # 1D curve, or rows for the first feature and columns for the second
+        "scores": np.round(scores, 4).tolist(),
+    })
+    timer.mark("serialize")
+    return response
+
+class UploadStreamingResponse(StreamingResponse):
+    """StreamingResponse that leaves `receive` to the handler.
+
+    The stock class listens for client disconnects on `receive` while it
+    streams, which would swallow the request body chunks that
+    /predict/stream is still reading.
+    """
+    async def __call__(self, scope, receive, send):
+        await self.stream_response(send)
+
+@app.post("/predict/stream")
+async def predict_stream(request: Request, format: Optional[str] = None,
+                         chunk_rows: int = bulk_scoring.DEFAULT_CHUNK_ROWS):
+    snapshot = model_holder.current
+    if snapshot is None:
+        raise HTTPException(status_code=503, detail="Model not loaded. Please train the model first.")
+    if snapshot.feature_order is None:
+        raise HTTPException(status_code=503, detail="feature_names.json not found.")
+    fmt = format or bulk_scoring.detect_format(request.headers.get("content-type"))
+    if fmt not in bulk_scoring.FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of {bulk_scoring.FORMATS}")
+    parser = bulk_scoring.RowParser(fmt, snapshot.feature_order, min(chunk_rows, MAX_BATCH_ROWS))
+
+    async def score_chunks(chunks):
+        for start, chunk in chunks:
+            timer = runtime_metrics.timer("/predict/stream")
+            runtime_metrics.observe_size("wine_batch_rows", "/predict/stream", len(chunk), help="Rows per batch")
+            # The response has started, so chunks wait for a slot rather than being shed
+            predictions = await inference_executor.run(snapshot.model.predict, chunk,
+                                                       endpoint="/predict/stream", shed=False)
+            timer.mark("predict")
+            out = bulk_scoring.format_results(fmt, start, predictions)
+            timer.mark("serialize")
+            yield out
+
+    async def results():
+        # Parse and score chunk by chunk as the body arrives; results go out
+        # before the upload finishes and only one chunk is held in memory.
+        # Parsing is CPU work too, so it runs on an inference slot rather than the event loop
+        yield bulk_scoring.format_header(fmt)
+        async for block in request.stream():
+            chunks = await inference_executor.run(parser.feed, block, endpoint="/predict/stream", shed=False)
+            async for out in score_chunks(chunks):
+                yield out
+            if parser.error is not None:
+                break
+        chunks = await inference_executor.run(parser.close, endpoint="/predict/stream", shed=False)
+        async for out in score_chunks(chunks):
+            yield out
+        if parser.error is not None:
+            # After the rows before the bad line
+            yield bulk_scoring.format_error(fmt, str(parser.error))
+
+    media_type = "text/csv" if fmt == "csv" else "application/x-ndjson"
+    return UploadStreamingResponse(results(), media_type=media_type)
 
 @app.get("/report")
-def get_report():
-    report_path = "Wine_Quality_Report.md"
-    if not os.path.exists(report_path):
+def get_report(request: Request):
+    timer = runtime_metrics.timer("/report")
+    artifact = artifact_cache.get(REPORT_PATH, "application/json", render_report)
+    if artifact is None:
         return {"content": "# Report not found\nPlease run `generate_report.py`."}
-    with open(report_path, "r", encoding="utf-8") as f:
-        content = f.read()
-    return {"content": content}
+    timer.mark("load")
+    return artifact_cache.response(request, artifact)
 
 @app.get("/eda/{image_name}")
-def get_eda_image(image_name: str):
-    # Security check: only allow known pngs
+def get_eda_image(image_name: str, request: Request):
+    # Security check: only allow known pngs (plus eda_plots.py's per-feature plots)
     allowed_images = ["eda_histograms.png", "eda_correlation.png", "eda_quality_dist.png"]
-    if image_name not in allowed_images:
+    if image_name not in allowed_images and not EDA_FEATURE_IMAGE.fullmatch(image_name):
         raise HTTPException(status_code=404, detail="Image not found")
-    
-    if not os.path.exists(image_name):
+
+    # PNGs are already compressed, so no gzip variant
+    artifact = artifact_cache.get(os.path.join(ARTIFACT_DIR, image_name), "image/png", compress=False)
+    if artifact is None:
         raise HTTPException(status_code=404, detail="Image file not generated yet")
-    
-    return FileResponse(image_name)
+    return artifact_cache.response(request, artifact)
 
 #if __name__ == "__main__":
+#  import uvicorn
 #  uvicorn.run("server:app", host="0.0.0.0", port=8000, reload=True)
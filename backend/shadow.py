@@ -0,0 +1,164 @@
+import random
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+from advisor import round_scores, verdict_tiers
+
+
+class ShadowScorer:
+    """Scores a candidate model on live /predict rows, off the request path.
+
+    The request handler only appends (snapshot, row, prediction, latency) to a
+    bounded deque; that append is the whole cost to the primary response. A
+    background thread drains the deque in small batches, and only while
+    `is_idle()` says no request is computing, then scores each batch with the
+    candidate and folds the differences into running statistics. When the
+    deque is full the oldest row is dropped (and counted) rather than blocking.
+
+    Candidate latency is timed on one single-row predict per batch so it is
+    comparable with the primary's single-row latency; the remaining rows are
+    scored in one call. Statistics restart whenever the candidate reloads.
+    """
+
+    def __init__(self, holder, is_idle=None, max_pending=4096, batch_rows=32, sample_rate=1.0,
+                 poll_interval=0.05):
+        self.holder = holder
+        self.is_idle = is_idle or (lambda: True)
+        self.batch_rows = max(1, int(batch_rows))
+        self.sample_rate = sample_rate
+        self.poll_interval = poll_interval
+        self._pending = deque(maxlen=max(1, int(max_pending)))
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self.submitted = 0
+        self.dropped = 0
+        self._reset()
+        holder.add_reload_listener(self._reset)
+
+    def _reset(self, *_):
+        with self._lock:
+            self.compared = 0
+            self.batches = 0
+            self.errors = 0
+            self.last_error = None
+            self._sum_diff = 0.0
+            self._sum_abs = 0.0
+            self._sum_sq = 0.0
+            self._max_abs = 0.0
+            self._tier_agree = 0
+            self._primary_seconds = 0.0
+            self._primary_timed = 0
+            self._candidate_seconds = 0.0
+            self._candidate_timed = 0
+
+    def submit(self, snapshot, row, prediction, primary_seconds=None):
+        """Queue one served row for comparison. Never blocks; called on the request path."""
+        if self.sample_rate < 1.0 and random.random() >= self.sample_rate:
+            return
+        if len(self._pending) == self._pending.maxlen:
+            self.dropped += 1
+        self.submitted += 1
+        self._pending.append((snapshot, row, prediction, primary_seconds))
+
+    def _take(self):
+        chunk = []
+        while self._pending and len(chunk) < self.batch_rows:
+            try:
+                chunk.append(self._pending.popleft())
+            except IndexError:
+                break
+        return chunk
+
+    def _score(self, candidate, chunk):
+        order = candidate.feature_order
+        rows = []
+        for snapshot, row, _, _ in chunk:
+            if snapshot.feature_order != order:
+                # A candidate trained on reordered columns still sees the same inputs
+                row = row[[snapshot.feature_order.index(name) for name in order]]
+            rows.append(row)
+        X = np.asarray(rows, dtype=np.float64)
+        t0 = time.perf_counter()
+        first = candidate.model.predict(X[:1])
+        single_seconds = time.perf_counter() - t0
+        shadow = np.concatenate([first, candidate.model.predict(X[1:])]) if len(X) > 1 else first
+
+        primary = np.array([prediction for _, _, prediction, _ in chunk], dtype=np.float64)
+        diff = np.asarray(shadow, dtype=np.float64) - primary
+        agree = int((verdict_tiers(round_scores(shadow)) == verdict_tiers(round_scores(primary))).sum())
+        timed = [seconds for _, _, _, seconds in chunk if seconds is not None]
+        with self._lock:
+            self.compared += len(chunk)
+            self.batches += 1
+            self._sum_diff += float(diff.sum())
+            self._sum_abs += float(np.abs(diff).sum())
+            self._sum_sq += float((diff * diff).sum())
+            self._max_abs = max(self._max_abs, float(np.abs(diff).max()))
+            self._tier_agree += agree
+            self._primary_seconds += sum(timed)
+            self._primary_timed += len(timed)
+            self._candidate_seconds += single_seconds
+            self._candidate_timed += 1
+
+    def drain(self):
+        """Score everything pending while the server is idle. Returns the rows compared."""
+        done = 0
+        while self._pending and self.is_idle():
+            candidate = self.holder.current
+            chunk = self._take()
+            if candidate is None or candidate.feature_order is None or not chunk:
+                continue
+            try:
+                self._score(candidate, chunk)
+                done += len(chunk)
+            except Exception as e:
+                with self._lock:
+                    self.errors += 1
+                    self.last_error = str(e)
+        return done
+
+    def _run(self):
+        while not self._stop.wait(self.poll_interval):
+            self.drain()
+
+    def start(self):
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="shadow-scorer", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.poll_interval + 5)
+            self._thread = None
+
+    def stats(self):
+        candidate = self.holder.current
+        with self._lock:
+            n = self.compared
+            return {
+                "candidate_version": candidate.version if candidate is not None else None,
+                "candidate_error": self.holder.last_error,
+                "compared": n,
+                "pending": len(self._pending),
+                "submitted": self.submitted,
+                "dropped": self.dropped,
+                "batches": self.batches,
+                "errors": self.errors,
+                "last_error": self.last_error,
+                # candidate - primary, in quality points
+                "mean_diff": self._sum_diff / n if n else None,
+                "mean_abs_diff": self._sum_abs / n if n else None,
+                "rmse": (self._sum_sq / n) ** 0.5 if n else None,
+                "max_abs_diff": self._max_abs if n else None,
+                "verdict_agreement": self._tier_agree / n if n else None,
+                "primary_latency_ms": (self._primary_seconds / self._primary_timed * 1000.0
+                                       if self._primary_timed else None),
+                "candidate_latency_ms": (self._candidate_seconds / self._candidate_timed * 1000.0
+                                         if self._candidate_timed else None),
+            }
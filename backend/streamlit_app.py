@@ -7,6 +7,11 @@ import json
 import os
 import matplotlib.pyplot as plt
 
+from compiled_model import CompiledModel, compile_pipeline
+from sweep import axis_grid, run_sweep
+from treeshap import TreeExplainer
+from wqm_format import WQM_PATH, load_wqm
+
 # ------------------------------------------------------------------------------
 # 1. Configuration & Styling
 # ------------------------------------------------------------------------------
@@ -62,7 +67,13 @@ st.markdown(f"""
 @st.cache_resource
 def load_resources():
     try:
-        model = joblib.load("best_model_wine_quality.joblib")
+        if os.path.exists(WQM_PATH):
+            # Memory-mapped compiled model: loads in milliseconds, no unpickling
+            model, meta = load_wqm(WQM_PATH)
+            if meta["metrics"]:
+                return model, meta["feature_names"], meta["metrics"]
+        else:
+            model = joblib.load("best_model_wine_quality.joblib")
         with open("feature_names.json", "r") as f:
             features = json.load(f)
         with open("metrics.json", "r") as f:
@@ -73,6 +84,16 @@ def load_resources():
 
 model, feature_names, metrics = load_resources()
 
+
+@st.cache_resource
+def load_explainer(_model):
+    # Path tables are built once per session; None if the model can't be explained
+    try:
+        compiled = _model if isinstance(_model, CompiledModel) else compile_pipeline(_model, feature_names)
+        return TreeExplainer(compiled)
+    except ValueError:
+        return None
+
 # ------------------------------------------------------------------------------
 # 3. Sidebar Inputs
 # ------------------------------------------------------------------------------
@@ -116,7 +137,7 @@ if model is None:
     st.info("The backend needs to generate the model and metadata artifacts.")
 else:
     # Tabs
-    tab1, tab2, tab3 = st.tabs(["🔮 Prediction", "📊 Data Insights", "ℹ️ Model Info"])
+    tab1, tab_sweep, tab2, tab3 = st.tabs(["🔮 Prediction", "📈 What-If", "📊 Data Insights", "ℹ️ Model Info"])
 
     with tab1:
         st.subheader("Sommelier's Assessment")
@@ -150,9 +171,66 @@ else:
             </div>
             """, unsafe_allow_html=True)
             
-            # Feature Breakdown (Mock attribution or simple display)
+            # Feature Breakdown: exact TreeSHAP contributions of each input to the score
             with st.expander("See Input Summary"):
                 st.dataframe(input_df)
+                explainer = load_explainer(model)
+                if explainer is not None:
+                    row = input_df[feature_names].to_numpy(dtype=np.float64)
+                    contributions, base_value = explainer.explain(row)
+                    breakdown = pd.DataFrame({
+                        "feature": feature_names,
+                        "value": row[0],
+                        "contribution": contributions[0],
+                    }).sort_values("contribution", key=np.abs, ascending=False)
+                    st.markdown(f"Average wine scores **{base_value:.2f}**; each property moves "
+                                f"this wine's score up or down by:")
+                    st.bar_chart(breakdown.set_index("feature")["contribution"])
+                    st.dataframe(breakdown.round(3), hide_index=True)
+
+    with tab_sweep:
+        st.subheader("What-If Sensitivity")
+        st.markdown("Move one or two properties while the rest stay at the sidebar values.")
+
+        swept = st.multiselect("Properties to vary", feature_names, max_selections=2,
+                               default=["alcohol"] if "alcohol" in feature_names else None)
+        points = st.slider("Points per property", min_value=5, max_value=200, value=100)
+        ranges = {}
+        for feature in swept:
+            current = input_data[feature]
+            low, high = st.slider(
+                f"{feature.replace('_', ' ').title()} range",
+                min_value=0.0, max_value=float(max(current * 3, 1.0)),
+                value=(float(current * 0.5), float(max(current * 1.5, 0.1))),
+            )
+            ranges[feature] = axis_grid(low, high, points)
+
+        if swept:
+            base = np.array([input_data[f] for f in feature_names], dtype=np.float64)
+            axes = [(feature_names.index(f), ranges[f]) for f in swept]
+            # The whole grid is scored at once, not one prediction per point
+            scores, base_score = run_sweep(model, base, axes)
+
+            fig, ax = plt.subplots(figsize=(8, 4.5))
+            if len(axes) == 1:
+                ax.plot(ranges[swept[0]], scores, color=PRIMARY_COLOR, linewidth=2)
+                ax.axvline(input_data[swept[0]], color=SECONDARY_COLOR, linestyle="--", label="Current sample")
+                ax.set_xlabel(swept[0].replace('_', ' ').title())
+                ax.set_ylabel("Predicted quality")
+                ax.legend()
+            else:
+                g1, g2 = ranges[swept[0]], ranges[swept[1]]
+                image = ax.imshow(scores, origin="lower", aspect="auto", cmap="RdYlGn",
+                                  extent=[g2[0], g2[-1], g1[0], g1[-1]])
+                ax.scatter([input_data[swept[1]]], [input_data[swept[0]]], color="black", marker="x",
+                           label="Current sample")
+                ax.set_xlabel(swept[1].replace('_', ' ').title())
+                ax.set_ylabel(swept[0].replace('_', ' ').title())
+                fig.colorbar(image, ax=ax, label="Predicted quality")
+                ax.legend()
+            st.pyplot(fig)
+            st.caption(f"Current sample scores {base_score:.2f}; range over the grid "
+                       f"{scores.min():.2f} to {scores.max():.2f}.")
 
     with tab2:
         st.subheader("Exploratory Analysis")
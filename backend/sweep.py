@@ -0,0 +1,142 @@
+# What-if sensitivity sweeps: hold one wine fixed, move one or two features
+# over a grid and score every point at once.
+#
+# Any model is scored with one vectorized predict over the full grid matrix.
+# A CompiledModel is instead collapsed onto the swept features first (every
+# split on a fixed feature is decided by the base row), leaving each tree as
+# a few axis-aligned boxes; summing the boxes with a difference table scores
+# the whole grid in O(leaves + points) with the same result.
+#
+#   python sweep.py                 # time a 100x100 alcohol x volatile_acidity surface
+
+import numpy as np
+
+MAX_AXES = 2
+DEFAULT_POINTS = 50
+
+
+def axis_grid(start=None, stop=None, num=DEFAULT_POINTS, values=None):
+    """Explicit `values`, or `num` evenly spaced points from `start` to `stop`."""
+    if values is not None:
+        grid = np.asarray(values, dtype=np.float64)
+        if grid.ndim != 1 or grid.size == 0 or not np.isfinite(grid).all():
+            raise ValueError("`values` must be a non-empty list of finite numbers")
+        return grid
+    if start is None or stop is None:
+        raise ValueError("give either `values` or both `start` and `stop`")
+    if num < 1:
+        raise ValueError("`num` must be at least 1")
+    if not (np.isfinite(start) and np.isfinite(stop)):
+        raise ValueError("`start` and `stop` must be finite")
+    return np.linspace(start, stop, num)
+
+
+def check_axes(axes):
+    if not 1 <= len(axes) <= MAX_AXES:
+        raise ValueError(f"sweep 1 to {MAX_AXES} features")
+    columns = [column for column, _ in axes]
+    if len(set(columns)) != len(columns):
+        raise ValueError("each swept feature may appear only once")
+
+
+def sweep_matrix(base_row, axes):
+    """Rows for every grid point (first axis slowest), then the base row itself.
+
+    `axes` is [(column index, grid)], one or two entries. The whole matrix is
+    one allocation: the base row is broadcast in, then each swept column is
+    overwritten with its repeated/tiled grid.
+    """
+    base_row = np.asarray(base_row, dtype=np.float64).ravel()
+    check_axes(axes)
+    columns = [column for column, _ in axes]
+    shape = tuple(len(grid) for _, grid in axes)
+    n_points = int(np.prod(shape))
+    X = np.empty((n_points + 1, len(base_row)), dtype=np.float64)
+    X[:] = base_row
+    if len(axes) == 1:
+        X[:n_points, columns[0]] = axes[0][1]
+    else:
+        (first, g1), (second, g2) = axes
+        X[:n_points, first] = np.repeat(g1, len(g2))
+        X[:n_points, second] = np.tile(g2, len(g1))
+    return X, shape
+
+
+def region_sweep(model, base_row, axes):
+    """Grid scores from `model.partial_regions` (CompiledModel only)."""
+    base_row = np.asarray(base_row, dtype=np.float64).ravel()
+    value, lo, hi = model.partial_regions(base_row, [column for column, _ in axes])
+    starts, ends, cells, sizes = [], [], [], []
+    for s, (_, grid) in enumerate(axes):
+        # Every lo/hi is a split threshold; the grid falls into the intervals between them
+        bounds = np.unique(np.concatenate([lo[:, s], hi[:, s]]))
+        bounds = bounds[np.isfinite(bounds)]
+        starts.append(np.where(np.isfinite(lo[:, s]), np.searchsorted(bounds, lo[:, s]) + 1, 0))
+        ends.append(np.where(np.isfinite(hi[:, s]), np.searchsorted(bounds, hi[:, s]), len(bounds)))
+        cells.append(np.searchsorted(bounds, grid))
+        sizes.append(len(bounds) + 2)
+    # Each leaf adds its value to a box of intervals; a difference table plus
+    # cumulative sums turns that into a per-interval total
+    table = np.zeros(sizes)
+    if len(axes) == 1:
+        np.add.at(table, starts[0], value)
+        np.add.at(table, ends[0] + 1, -value)
+        raw = np.cumsum(table)[cells[0]]
+    else:
+        (s1, s2), (e1, e2) = starts, ends
+        np.add.at(table, (s1, s2), value)
+        np.add.at(table, (e1 + 1, s2), -value)
+        np.add.at(table, (s1, e2 + 1), -value)
+        np.add.at(table, (e1 + 1, e2 + 1), value)
+        raw = np.cumsum(np.cumsum(table, axis=0), axis=1)[np.ix_(cells[0], cells[1])]
+    scores = model.apply_link(model.baseline + raw)
+    return scores, float(model.predict(base_row.reshape(1, -1))[0])
+
+
+def run_sweep(model, base_row, axes):
+    """(scores shaped like the grid, base score). Grid values must be finite."""
+    check_axes(axes)
+    if hasattr(model, "partial_regions"):
+        return region_sweep(model, base_row, axes)
+    X, shape = sweep_matrix(base_row, axes)
+    predictions = np.asarray(model.predict(X), dtype=np.float64)
+    return predictions[:-1].reshape(shape), float(predictions[-1])
+
+
+def main():
+    import json
+    import time
+
+    from wqm_format import WQM_PATH, load_wqm
+
+    model, meta = load_wqm(WQM_PATH)
+    features = meta["feature_names"]
+    base = np.array([7.4, 0.7, 0.0, 1.9, 0.076, 11.0, 34.0, 0.9978, 3.51, 0.56, 9.4])
+    axes = [(features.index("alcohol"), axis_grid(8, 15, 100)),
+            (features.index("volatile_acidity"), axis_grid(0.1, 1.5, 100))]
+
+    def timed(sweep, repeats):
+        times = []
+        for _ in range(repeats):
+            t0 = time.perf_counter()
+            result = sweep(model, base, axes)
+            times.append(time.perf_counter() - t0)
+        return result, float(np.median(times)) * 1000.0
+
+    (scores, base_score), region_ms = timed(region_sweep, 20)
+    X, shape = sweep_matrix(base, axes)
+    t0 = time.perf_counter()
+    full = model.predict(X)
+    matrix_ms = (time.perf_counter() - t0) * 1000.0
+    print(json.dumps({
+        "grid": list(scores.shape),
+        "base_score": round(base_score, 3),
+        "score_range": [round(float(scores.min()), 3), round(float(scores.max()), 3)],
+        "region_sweep_ms": round(region_ms, 2),
+        "full_matrix_predict_ms": round(matrix_ms, 2),
+        "max_abs_diff": float(np.abs(scores - full[:-1].reshape(shape)).max()),
+    }))
+
+
+if __name__ == "__main__":
+    main()
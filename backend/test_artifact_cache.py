@@ -0,0 +1,66 @@
+# Artifact cache check: /report and /eda/* carry a strong ETag, a matching
+# If-None-Match gets an empty 304, gzip is sent only to clients that accept it
+# (with its own ETag, and never for PNGs), and a rewritten file gets a new ETag.
+import asyncio
+import os
+import shutil
+import tempfile
+
+from check_harness import Checks, load_server, serving
+
+check = Checks()
+model_dir = tempfile.mkdtemp(prefix="wine_artifacts_")
+for name in ("best_model_wine_quality.joblib", "feature_names.json", "metrics.json",
+             "Wine_Quality_Report.md", "eda_histograms.png"):
+    shutil.copy(name, model_dir)
+server = load_server(WINE_MODEL_DIR=model_dir)
+IDENTITY = {"Accept-Encoding": "identity"}
+GZIP = {"Accept-Encoding": "gzip"}
+
+
+async def main():
+    async with serving(server) as client:
+        plain = await client.get("/report", headers=IDENTITY)
+        etag = plain.headers["etag"]
+        check(plain.status_code == 200 and "content-encoding" not in plain.headers and etag.startswith('"'),
+              f"/report without gzip: {plain.status_code} {dict(plain.headers)}")
+
+        zipped = await client.get("/report", headers=GZIP)
+        check(zipped.headers.get("content-encoding") == "gzip" and "Accept-Encoding" in zipped.headers["vary"]
+              and int(zipped.headers["content-length"]) < len(plain.content) and zipped.content == plain.content,
+              f"/report with gzip should be a smaller body that decodes to the same JSON: {dict(zipped.headers)}")
+        check(zipped.headers["etag"] not in (etag, None), "the gzip representation needs its own ETag")
+        print(f"/report: {len(plain.content)} bytes, {zipped.headers['content-length']} gzipped, ETag {etag}")
+
+        for headers, label in (({**IDENTITY, "If-None-Match": etag}, "its ETag"),
+                               ({**GZIP, "If-None-Match": zipped.headers["etag"]}, "the gzip ETag"),
+                               ({**IDENTITY, "If-None-Match": f'"stale", W/{etag}'}, "a list with the weak ETag")):
+            response = await client.get("/report", headers=headers)
+            check(response.status_code == 304 and response.content == b"" and response.headers["etag"],
+                  f"If-None-Match with {label}: {response.status_code}")
+        stale = await client.get("/report", headers={**IDENTITY, "If-None-Match": '"stale"'})
+        check(stale.status_code == 200 and stale.content == plain.content, "a stale ETag should get the body")
+
+        # A regenerated report is re-read: the old ETag no longer matches
+        with open(os.path.join(model_dir, "Wine_Quality_Report.md"), "a") as f:
+            f.write("\nRegenerated.\n")
+        changed = await client.get("/report", headers={**IDENTITY, "If-None-Match": etag})
+        check(changed.status_code == 200 and changed.headers["etag"] != etag
+              and "Regenerated." in changed.json()["content"], "a rewritten report should get a new ETag")
+
+        png = await client.get("/eda/eda_histograms.png", headers=GZIP)
+        check(png.status_code == 200 and "content-encoding" not in png.headers
+              and png.headers["content-type"] == "image/png", f"PNGs are not gzipped: {dict(png.headers)}")
+        revalidated = await client.get("/eda/eda_histograms.png", headers={"If-None-Match": png.headers["etag"]})
+        check(revalidated.status_code == 304, f"/eda If-None-Match: {revalidated.status_code}")
+
+        stats = (await client.get("/metrics/artifacts")).json()
+        check(stats["not_modified"] == 4, f"four 304s should be counted: {stats}")
+        print(f"Artifact cache: {stats}")
+
+
+try:
+    asyncio.run(main())
+finally:
+    shutil.rmtree(model_dir, ignore_errors=True)
+check.finish()
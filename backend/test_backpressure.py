@@ -0,0 +1,95 @@
+# Load-shedding check: with 1 inference slot and a queue of 2, a burst of slow
+# /predict calls must get 3 answers and fast 503s with Retry-After for the
+# rest, while /features keeps answering immediately.
+import asyncio
+import dataclasses
+import sys
+import time
+
+from check_harness import load_server, serving
+from inference_executor import InferenceExecutor, OverloadedError
+
+SLOW_SECONDS = 0.3
+BURST = 10
+
+
+class SlowModel:
+    def __init__(self, model):
+        self.model = model
+
+    def predict(self, X):
+        time.sleep(SLOW_SECONDS)
+        return self.model.predict(X)
+
+
+async def main():
+    server = load_server(WINE_INFERENCE_SLOTS="1", WINE_INFERENCE_QUEUE="2")
+    async with serving(server) as client:
+        snapshot = server.model_holder.current
+        if snapshot is None:
+            print("ERROR: no model loaded (run train_model.py first)")
+            sys.exit(1)
+        server.model_holder.current = dataclasses.replace(snapshot, model=SlowModel(snapshot.model))
+        body = {"values": [7.4, 0.7, 0.0, 1.9, 0.076, 11.0, 34.0, 0.9978, 3.51, 0.56, 9.4]}
+
+        async def timed(method, path, **kwargs):
+            t0 = time.perf_counter()
+            response = await client.request(method, path, **kwargs)
+            return response, time.perf_counter() - t0
+
+        predicts = [asyncio.create_task(timed("POST", "/predict", json=body)) for _ in range(BURST)]
+        await asyncio.sleep(0.05)
+        features, features_s = await timed("GET", "/features")
+        results = await asyncio.gather(*predicts)
+        stats = (await client.get("/metrics/inference")).json()
+
+    ok = [r for r, _ in results if r.status_code == 200]
+    shed = [(r, s) for r, s in results if r.status_code == 503]
+    print(f"{len(ok)} answered, {len(shed)} shed; /features took {features_s * 1000:.1f} ms")
+    print(f"slowest 503: {max((s for _, s in shed), default=0) * 1000:.1f} ms, "
+          f"Retry-After: {sorted({r.headers.get('retry-after') for r, _ in shed})}")
+    print(f"executor: {stats}")
+
+    failed = False
+    if len(ok) != 3 or len(shed) != BURST - 3:
+        print("ERROR: expected 1 computing + 2 queued answers and the rest shed")
+        failed = True
+    if any(r.headers.get("retry-after") is None for r, _ in shed):
+        print("ERROR: 503 without Retry-After")
+        failed = True
+    if any(s > SLOW_SECONDS for _, s in shed):
+        print("ERROR: shed requests should be rejected without waiting")
+        failed = True
+    if features.status_code != 200 or features_s > SLOW_SECONDS:
+        print("ERROR: /features was held up by inference")
+        failed = True
+    if failed:
+        sys.exit(1)
+    print("OK")
+
+
+async def check_cancelled_calls_keep_their_slot():
+    """A request cancelled mid-computation must not free its slot before the work ends."""
+    executor = InferenceExecutor(slots=1, max_queue=1)
+    running = asyncio.create_task(executor.run(time.sleep, SLOW_SECONDS))
+    await asyncio.sleep(0.05)
+    running.cancel()
+    await asyncio.sleep(0)
+    queued = asyncio.create_task(executor.run(time.sleep, 0))
+    await asyncio.sleep(0)
+    try:
+        await executor.run(time.sleep, 0)
+        admitted_past_bound = True
+    except OverloadedError:
+        admitted_past_bound = False
+    await queued
+    executor.shutdown()
+    print(f"after a cancelled call: {'admitted' if admitted_past_bound else 'shed'} past slots + queue")
+    if admitted_past_bound:
+        print("ERROR: a cancelled request released its slot while its call was still computing")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    asyncio.run(check_cancelled_calls_keep_their_slot())
+    asyncio.run(main())
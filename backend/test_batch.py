@@ -0,0 +1,48 @@
+# /predict/batch check: every row gets the same score and verdict /predict
+# gives it (half-way scores such as 7.45 included), and ragged or empty rows
+# are a 422 rather than a 500.
+import asyncio
+import dataclasses
+
+import numpy as np
+from check_harness import Checks, load_server, serving
+
+# Raw model outputs on and around the rounding and tier boundaries
+OUTPUTS = [7.45, 7.55, 7.449999, 5.95, 6.05, 6.25, 4.0]
+
+
+class FirstColumnModel:
+    """Predicts the first feature, so a test row picks its own raw output."""
+
+    def predict(self, X):
+        return np.asarray(X, dtype=np.float64)[:, 0]
+
+
+check = Checks()
+server = load_server()
+
+
+async def main():
+    async with serving(server) as client:
+        snapshot = server.model_holder.current
+        server.model_holder.current = dataclasses.replace(snapshot, model=FirstColumnModel())
+        width = len(snapshot.feature_order)
+        rows = [[output] + [0.0] * (width - 1) for output in OUTPUTS]
+
+        batch = (await client.post("/predict/batch", json={"rows": rows})).json()
+        for i, row in enumerate(rows):
+            single = (await client.post("/predict", json={"values": row})).json()
+            check(single["score"] == batch["scores"][i] and single["verdict"] == batch["verdicts"][i],
+                  f"raw output {OUTPUTS[i]}: /predict gives {single['score']} {single['verdict']}, "
+                  f"/predict/batch {batch['scores'][i]} {batch['verdicts'][i]}")
+        print(f"/predict and /predict/batch agree on {len(rows)} boundary scores: {batch['scores']}")
+
+        for bad in ([rows[0], rows[0][:-1]], [[]], [rows[0] + [1.0]]):
+            response = await client.post("/predict/batch", json={"rows": bad})
+            check(response.status_code == 422, f"rows of widths {[len(r) for r in bad]}: {response.status_code}")
+        empty = await client.post("/predict/batch", json={"rows": []})
+        check(empty.status_code == 200 and empty.json()["count"] == 0, "no rows should score nothing")
+
+
+asyncio.run(main())
+check.finish()
@@ -0,0 +1,76 @@
+# Micro-batching check: concurrent /predict requests are coalesced into one
+# predict call and each still gets its own row's score back, a full batch is
+# flushed at WINE_BATCH_MAX_ROWS without waiting for the window, and a lone
+# request is flushed once the window has passed.
+import asyncio
+import dataclasses
+import time
+
+import numpy as np
+from check_harness import Checks, load_server, serving
+
+WINDOW_MS = 300
+MAX_ROWS = 8
+
+check = Checks()
+server = load_server(WINE_BATCH_WINDOW_MS=str(WINDOW_MS), WINE_BATCH_MAX_ROWS=str(MAX_ROWS))
+
+
+class RecordingModel:
+    """Predicts the first feature and records the size of every predict call."""
+
+    def __init__(self):
+        self.calls = []
+
+    def predict(self, X):
+        X = np.asarray(X, dtype=np.float64)
+        self.calls.append(len(X))
+        return X[:, 0]
+
+
+async def predict_all(client, outputs, width):
+    """POST one row per output concurrently; (scores, seconds until the last answer)."""
+    t0 = time.perf_counter()
+    responses = await asyncio.gather(*(client.post("/predict", json={"values": [output] + [0.0] * (width - 1)})
+                                       for output in outputs))
+    elapsed = time.perf_counter() - t0
+    check(all(r.status_code == 200 for r in responses), f"statuses {[r.status_code for r in responses]}")
+    return [r.json()["score"] for r in responses], elapsed
+
+
+async def main():
+    async with serving(server) as client:
+        check(server.batcher.running, "WINE_BATCH_WINDOW_MS should start the batcher")
+        model = RecordingModel()
+        snapshot = server.model_holder.current
+        server.model_holder.current = dataclasses.replace(snapshot, model=model)
+        width = len(snapshot.feature_order)
+
+        # A full batch goes out at MAX_ROWS, well before the window closes
+        outputs = [round(3.0 + i / 10, 1) for i in range(MAX_ROWS)]
+        scores, elapsed = await predict_all(client, outputs, width)
+        check(scores == outputs, f"each request should get its own row's score: sent {outputs}, got {scores}")
+        check(model.calls == [MAX_ROWS], f"{MAX_ROWS} concurrent requests should be one predict call: {model.calls}")
+        check(elapsed < WINDOW_MS / 1000, f"a full batch should not wait for the window ({elapsed * 1000:.0f} ms)")
+        print(f"{MAX_ROWS} concurrent requests: one predict call, answered in {elapsed * 1000:.0f} ms")
+
+        # More rows than fit in one batch: split at MAX_ROWS, still no cross-talk after the scatter
+        model.calls.clear()
+        outputs = [round(3.0 + i / 10, 1) for i in range(3 * MAX_ROWS + 3)]
+        scores, _ = await predict_all(client, outputs, width)
+        check(scores == outputs, f"each request should get its own row's score: sent {outputs}, got {scores}")
+        check(sum(model.calls) == len(outputs) and max(model.calls) <= MAX_ROWS and len(model.calls) < len(outputs),
+              f"{len(outputs)} requests should be coalesced into batches of at most {MAX_ROWS}: {model.calls}")
+        print(f"{len(outputs)} concurrent requests in predict calls of {model.calls} rows")
+
+        # A lone request waits for the window, then goes out by itself
+        model.calls.clear()
+        scores, elapsed = await predict_all(client, [6.5], width)
+        check(scores == [6.5] and model.calls == [1], f"a lone request: scores {scores}, calls {model.calls}")
+        check(WINDOW_MS / 1000 <= elapsed < WINDOW_MS / 1000 + 1.0,
+              f"a lone request should be flushed after the {WINDOW_MS} ms window ({elapsed * 1000:.0f} ms)")
+        print(f"A lone request was answered after {elapsed * 1000:.0f} ms")
+
+
+asyncio.run(main())
+check.finish()
@@ -0,0 +1,127 @@
+# Bulk-scoring check: CSV and NDJSON uploads with a byte-order mark stream
+# back one result per row, in row order and equal to model.predict, and a bad
+# row, a non-object NDJSON line or an over-long line ends the output with an
+# error row naming it. Covers /predict/stream in-process, score_file.py
+# locally, and score_file.py --url against a uvicorn server.
+import asyncio
+import io
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+import urllib.request
+import warnings
+
+import joblib
+import numpy as np
+import bulk_scoring
+import score_file
+from advisor import advise
+from check_harness import Checks, load_server, serving
+from wine_data import load_wine_data
+
+# The rows before the bad one end on a partial chunk
+CHUNK_ROWS = 2
+GOOD_ROWS = 5
+BOM = "﻿".encode("utf-8")
+
+warnings.filterwarnings("ignore", message="X does not have valid feature names")
+check = Checks()
+with open("feature_names.json", "r") as f:
+    feature_names = json.load(f)
+X = load_wine_data()[0][feature_names].to_numpy(dtype=np.float64)[:GOOD_ROWS]
+model = joblib.load("best_model_wine_quality.joblib")
+scores, verdicts, _ = advise(model.predict(X))
+
+csv_body = BOM + ("\n".join([",".join(feature_names)] + [",".join(map(repr, row)) for row in X.tolist()]
+                            + ["not,a,number", ",".join(map(repr, X[0].tolist()))]) + "\n").encode("utf-8")
+ndjson_body = BOM + ("".join(json.dumps(dict(zip(feature_names, row))) + "\n" for row in X.tolist())
+                     + "[1, 2, 3]\n" + json.dumps(dict(zip(feature_names, X[0].tolist()))) + "\n").encode("utf-8")
+long_line_body = ("".join(json.dumps(dict(zip(feature_names, row))) + "\n" for row in X.tolist())
+                  + " " * (2 * bulk_scoring.MAX_LINE_BYTES)).encode("utf-8")
+CASES = {
+    # (format, body, error expected after the good rows)
+    "csv": ("csv", csv_body, f"Row {GOOD_ROWS + 1}: could not parse"),
+    "ndjson": ("ndjson", ndjson_body, f"Row {GOOD_ROWS + 1}: expected a JSON object"),
+    "long line": ("ndjson", long_line_body, f"Row {GOOD_ROWS + 1}: line longer than {bulk_scoring.MAX_LINE_BYTES} bytes"),
+}
+
+
+def check_output(name, fmt, text, error):
+    lines = text.splitlines()
+    if fmt == "csv":
+        check(lines[0] == "row,score,verdict", f"{name}: missing CSV header")
+        rows = [line.split(",", 2) for line in lines[1:]]
+        results = [(int(r), float(s), v) for r, s, v in rows if r != "error"]
+        errors = [v for r, _, v in rows if r == "error"]
+        last_is_error = rows[-1][0] == "error"
+    else:
+        records = [json.loads(line) for line in lines]
+        results = [(r["row"], r["score"], r["verdict"]) for r in records if "error" not in r]
+        errors = [r["error"] for r in records if "error" in r]
+        last_is_error = "error" in records[-1]
+    expected = list(zip(range(1, GOOD_ROWS + 1), scores.tolist(), verdicts.tolist()))
+    check(results == expected, f"{name}: expected rows {expected}, got {results}")
+    check(len(errors) == 1 and errors[0].startswith(error) and last_is_error,
+          f"{name}: expected one final error row starting '{error}', got {errors}")
+
+
+def blocks(body, size=7):
+    # Small blocks split the byte-order mark, multi-byte characters and lines
+    return [body[i:i + size] for i in range(0, len(body), size)]
+
+
+async def check_endpoint(server):
+    async with serving(server) as client:
+        for name, (fmt, body, error) in CASES.items():
+            async def upload():
+                for block in blocks(body):
+                    yield block
+            response = await client.post(f"/predict/stream?format={fmt}&chunk_rows={CHUNK_ROWS}", content=upload())
+            check(response.status_code == 200, f"/predict/stream {name}: {response.status_code}")
+            check_output(f"/predict/stream {name}", fmt, response.text, error)
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def check_score_file():
+    for name, (fmt, body, error) in CASES.items():
+        out = io.StringIO()
+        score_file.score_locally(io.BytesIO(body), out, fmt, CHUNK_ROWS,
+                                 "best_model_wine_quality.joblib", "feature_names.json")
+        check_output(f"score_file.py {name}", fmt, out.getvalue(), error)
+
+    port = free_port()
+    uvicorn = subprocess.Popen([sys.executable, "-m", "uvicorn", "server:app", "--port", str(port)],
+                               env={**os.environ, "WINE_MODEL_DIR": ".", "WINE_MODEL_CHECK_INTERVAL": "0"},
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    url = f"http://127.0.0.1:{port}"
+    try:
+        deadline = time.time() + 60
+        while True:
+            try:
+                urllib.request.urlopen(f"{url}/ready").close()
+                break
+            except OSError:
+                if time.time() > deadline or uvicorn.poll() is not None:
+                    raise RuntimeError("uvicorn did not become ready")
+                time.sleep(0.2)
+        for name, (fmt, body, error) in CASES.items():
+            out = io.StringIO()
+            score_file.score_remotely(io.BytesIO(body), out, fmt, CHUNK_ROWS, url)
+            check_output(f"score_file.py --url {name}", fmt, out.getvalue(), error)
+    finally:
+        uvicorn.terminate()
+        uvicorn.wait(timeout=10)
+
+
+asyncio.run(check_endpoint(load_server()))
+check_score_file()
+print(f"{len(CASES)} uploads each through /predict/stream, score_file.py and score_file.py --url")
+check.finish()
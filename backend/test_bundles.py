@@ -0,0 +1,63 @@
+# Shared bundle directory check: two ModelHolders in compiled mode (two
+# uvicorn workers) share bundle_root. A load never removes the bundle another
+# worker is still serving, pruning waits for a later check, and only versions
+# more than KEEP_BUNDLES loads behind are removed.
+import json
+import os
+import shutil
+import tempfile
+
+import joblib
+from sklearn.base import clone
+from check_harness import Checks
+from model_store import KEEP_BUNDLES, ModelHolder, dump_model_atomic
+from wine_data import load_wine_data
+
+check = Checks()
+work = tempfile.mkdtemp(prefix="wine_bundles_")
+bundle_root = os.path.join(work, "model_bundles")
+model_path = os.path.join(work, "best_model_wine_quality.joblib")
+shutil.copy("feature_names.json", work)
+features_path = os.path.join(work, "feature_names.json")
+
+with open("feature_names.json", "r") as f:
+    feature_names = json.load(f)
+X, y = load_wine_data()[:2]
+X = X[feature_names]
+base = joblib.load("best_model_wine_quality.joblib")
+
+
+def publish(max_iter):
+    dump_model_atomic(clone(base).set_params(model__max_iter=max_iter).fit(X, y), model_path)
+
+
+def bundles():
+    return {name for name in os.listdir(bundle_root) if not name.endswith(".used")}
+
+
+try:
+    publish(5)
+    lagging = ModelHolder(model_path, features_path, check_interval=0, mode="compiled", bundle_root=bundle_root)
+    worker = ModelHolder(model_path, features_path, check_interval=0, mode="compiled", bundle_root=bundle_root)
+    first = lagging.load().version
+    worker.load()
+
+    publish(6)
+    worker.maybe_reload()
+    check(first in bundles(), "the load that publishes a new version must not prune the old one")
+    worker.maybe_reload()
+    check(first in bundles(), f"a version within the last {KEEP_BUNDLES} loads should be kept")
+    check(lagging.current.model.predict(X.to_numpy()[:5]).shape == (5,),
+          "the lagging worker should still score from its bundle")
+
+    for max_iter in range(7, 7 + KEEP_BUNDLES):
+        publish(max_iter)
+        worker.maybe_reload()
+    worker.maybe_reload()
+    kept = bundles()
+    check(first not in kept and worker.current.version in kept and len(kept) == KEEP_BUNDLES,
+          f"only the last {KEEP_BUNDLES} versions should be kept, got {sorted(kept)}")
+    print(f"{worker.reloads} loads, bundles kept: {sorted(bundles())}")
+finally:
+    shutil.rmtree(work, ignore_errors=True)
+check.finish()
@@ -0,0 +1,60 @@
+# Parity check: the compiled flat-array evaluator must reproduce model.predict
+# on the full UCI wine dataset (plus rows with missing values).
+import json
+import sys
+import time
+import warnings
+
+import joblib
+import numpy as np
+from compiled_model import compile_pipeline
+from sweep import region_sweep, sweep_matrix
+from wine_data import load_wine_data
+
+warnings.filterwarnings("ignore", message="X does not have valid feature names")
+
+print("Loading model...")
+model = joblib.load("best_model_wine_quality.joblib")
+with open("feature_names.json", "r") as f:
+    feature_names = json.load(f)
+compiled = compile_pipeline(model, feature_names)
+print(f"Compiled {compiled.n_trees} trees / {compiled.n_nodes} nodes, max depth {compiled.max_depth}")
+
+X = load_wine_data()[0][feature_names].to_numpy(dtype=np.float64)
+X_missing = X[:500].copy()
+X_missing[np.random.default_rng(0).random(X_missing.shape) < 0.2] = np.nan
+
+failed = False
+for name, data in [("UCI", X), ("UCI with NaNs", X_missing)]:
+    expected = model.predict(data)
+    got = compiled.predict(data)
+    max_diff = np.abs(expected - got).max()
+    print(f"{name}: {len(data)} rows, max |diff| = {max_diff:.3e}")
+    failed |= not np.allclose(expected, got, rtol=0, atol=1e-9)
+
+# What-if sweeps: the collapsed-tree evaluator must match scoring the full grid
+rng = np.random.default_rng(1)
+sweep_diff = 0.0
+for i in range(20):
+    base = X_missing[i] if i % 4 == 0 else X[rng.integers(len(X))]
+    columns = rng.choice(X.shape[1], size=1 + i % 2, replace=False)
+    axes = [(int(c), np.quantile(X[:, c], np.linspace(0, 1, 40))) for c in columns]
+    scores, base_score = region_sweep(compiled, base, axes)
+    grid_X, shape = sweep_matrix(base, axes)
+    expected = model.predict(grid_X)
+    sweep_diff = max(sweep_diff, np.abs(scores - expected[:-1].reshape(shape)).max(), abs(base_score - expected[-1]))
+print(f"Sweeps: 20 base rows, 1-2 swept features, max |diff| = {sweep_diff:.3e}")
+failed |= sweep_diff > 1e-9
+
+row = X[:1]
+for name, fn in [("sklearn", model.predict), ("compiled", compiled.predict)]:
+    fn(row)
+    t0 = time.perf_counter()
+    for _ in range(200):
+        fn(row)
+    print(f"{name} single-row predict: {(time.perf_counter() - t0) / 200 * 1e6:.0f} us")
+
+if failed:
+    print("PARITY FAILED")
+    sys.exit(1)
+print("Parity OK")
@@ -0,0 +1,104 @@
+# Drift-monitor check: streaming statistics must match numpy on the same rows,
+# training-like traffic must score as stable and a shifted feature as drifted,
+# memory must stay bounded under any amount of traffic, and /metrics/drift
+# must report what /predict received.
+import asyncio
+import json
+import os
+import shutil
+import tempfile
+import time
+
+import numpy as np
+from check_harness import Checks, load_server, serving
+from drift import PROFILE_FILE, DriftMonitor, build_profile
+from wine_data import load_wine_data
+
+check = Checks()
+MODEL_DIR = tempfile.mkdtemp(prefix="wine_drift_")
+with open("feature_names.json", "r") as f:
+    feature_names = json.load(f)
+X = load_wine_data()[0][feature_names].to_numpy(dtype=np.float64)
+rng = np.random.default_rng(0)
+order = rng.permutation(len(X))
+train, live = X[order[:4000]], X[order[4000:]]
+for name in ("best_model_wine_quality.joblib", "feature_names.json", "metrics.json"):
+    shutil.copy(name, MODEL_DIR)
+profile_path = os.path.join(MODEL_DIR, PROFILE_FILE)
+with open(profile_path, "w") as f:
+    json.dump(build_profile(train, feature_names), f)
+
+# Welford/Chan merges over uneven batches with missing values match numpy
+monitor = DriftMonitor(max_pending=100000, min_rows=100, flush_interval=0)
+monitor.load(profile_path, feature_names)
+rows = live.copy()
+rows[rng.random(rows.shape) < 0.05] = np.nan
+start = 0
+for size in [1, 7, 300, 1, 1000, 64]:
+    for row in rows[start:start + size]:
+        monitor.submit(row)
+    monitor.flush()
+    start += size
+monitor.submit(rows[start:])
+report = monitor.report()
+mean_err = max(abs(report["features"][name]["mean"] - np.nanmean(rows[:, j])) for j, name in enumerate(feature_names))
+std_err = max(abs(report["features"][name]["std"] - np.nanstd(rows[:, j])) for j, name in enumerate(feature_names))
+print(f"Streaming vs numpy over {report['rows']} rows: max |mean diff| {mean_err:.2e}, max |std diff| {std_err:.2e}")
+check(report["rows"] == len(rows) and mean_err < 1e-9 and std_err < 1e-9, "streaming mean/std should match numpy")
+check(all(sum(f["histogram"]) + f["missing"] == len(rows) for f in report["features"].values()),
+      "every non-missing value should land in one bin")
+below = (rows < train.min(axis=0)).sum(axis=0)
+check([f["below_range"] for f in report["features"].values()] == below.tolist(), "out-of-range counts are wrong")
+print(f"Held-out training data: max PSI {report['max_psi']:.4f} ({report['status']})")
+check(report["status"] == "stable", "rows from the training distribution should not look drifted")
+
+# One feature shifted by a standard deviation
+alcohol = feature_names.index("alcohol")
+shifted = live.copy()
+shifted[:, alcohol] += train[:, alcohol].std()
+monitor.load(profile_path, feature_names)
+monitor.submit(shifted)
+report = monitor.report()
+scores = {name: round(f["psi"], 3) for name, f in report["features"].items()}
+print(f"Alcohol +1 std: drifted {report['drifted_features']}, PSI {scores}")
+check(report["drifted_features"] == ["alcohol"] and report["features"]["alcohol"]["status"] == "significant",
+      "only the shifted feature should be flagged")
+check(report["features"]["alcohol"]["ks"] > 0.2, "the shifted feature should have a large KS distance")
+
+# Bounded: a full queue drops the oldest rows, and the state doesn't grow with traffic
+bounded = DriftMonitor(max_pending=100, flush_interval=0)
+bounded.load(profile_path, feature_names)
+t0 = time.perf_counter()
+for row in np.repeat(live, 5, axis=0)[:10000]:
+    bounded.submit(row)
+submit_us = (time.perf_counter() - t0) / 10000 * 1e6
+check(len(bounded._pending) == 100 and bounded.dropped == 9900, "the pending queue should stay bounded")
+bounded.flush()
+state = sum(a.nbytes for a in [bounded._mean, bounded._m2, bounded._count, *bounded._hist])
+for _ in range(20):
+    bounded.submit(np.repeat(live, 20, axis=0))
+    bounded.flush()
+check(sum(a.nbytes for a in [bounded._mean, bounded._m2, bounded._count, *bounded._hist]) == state,
+      "statistics should stay the same size however many rows arrive")
+print(f"submit: {submit_us:.2f} us per row; {bounded.rows} rows summarized in {state} bytes")
+check(submit_us < 20, "submit should be a cheap append")
+
+server = load_server(WINE_EXPLAIN="0", WINE_MODEL_DIR=MODEL_DIR)
+
+
+async def check_endpoint():
+    async with serving(server) as client:
+        for row in shifted[:300]:
+            response = await client.post("/predict", json={"values": row.tolist()})
+            check(response.status_code == 200, f"/predict returned {response.status_code}")
+        return (await client.get("/metrics/drift")).json()
+
+
+try:
+    body = asyncio.run(check_endpoint())
+finally:
+    shutil.rmtree(MODEL_DIR, ignore_errors=True)
+print(f"/metrics/drift: {body['rows']} rows, status {body['status']}, drifted {body['drifted_features']}")
+check(body["enabled"] and body["rows"] == 300, "/metrics/drift should count every /predict row")
+check(body["drifted_features"][:1] == ["alcohol"], "/metrics/drift should flag the shifted feature first")
+check.finish()
@@ -0,0 +1,152 @@
+# Attribution check: TreeSHAP contributions must add up to the prediction
+# (base_value + sum(contributions) == model.predict) on the UCI wine dataset,
+# match brute-force Shapley values on a few trees, and come back from
+# /predict?explain=true and /predict/batch {"explain": true}.
+import asyncio
+import dataclasses
+import itertools
+import json
+import math
+import sys
+import time
+import warnings
+
+import joblib
+import numpy as np
+from check_harness import load_server, serving
+from compiled_model import CompiledModel, compile_pipeline
+from treeshap import TreeExplainer
+from wine_data import load_wine_data
+
+warnings.filterwarnings("ignore", message="X does not have valid feature names")
+
+
+def brute_force_shapley(model, x):
+    """Exact Shapley values of the path-dependent game by enumerating all subsets."""
+    count = model.node_count.astype(np.float64)
+
+    def expectation(node, subset):
+        if model.left[node] == node:
+            return model.value[node]
+        feature, left, right = model.feature_idx[node], model.left[node], model.right[node]
+        if feature in subset:
+            v = x[feature]
+            go_left = v <= model.threshold[node] or (np.isnan(v) and model.missing_go_left[node])
+            return expectation(left if go_left else right, subset)
+        return (count[left] * expectation(left, subset) + count[right] * expectation(right, subset)) / count[node]
+
+    n = len(x)
+    game = {}
+    for size in range(n + 1):
+        for subset in itertools.combinations(range(n), size):
+            game[subset] = sum(expectation(root, set(subset)) for root in model.roots)
+    phi = np.zeros(n)
+    for subset, value in game.items():
+        if not subset:
+            continue
+        weight_in = math.factorial(len(subset) - 1) * math.factorial(n - len(subset)) / math.factorial(n)
+        for i in subset:
+            # v(S) - v(S \ {i}) weighted for S \ {i}
+            phi[i] += weight_in * (value - game[tuple(j for j in subset if j != i)])
+    return phi
+
+
+print("Loading model...")
+model = joblib.load("best_model_wine_quality.joblib")
+with open("feature_names.json", "r") as f:
+    feature_names = json.load(f)
+compiled = compile_pipeline(model, feature_names)
+t0 = time.perf_counter()
+explainer = TreeExplainer(compiled)
+print(f"Explainer for {compiled.n_trees} trees built in {(time.perf_counter() - t0) * 1000:.0f} ms "
+      f"({explainer.table_bytes / 2 ** 20:.1f} MB pattern table)")
+
+X = load_wine_data()[0][feature_names].to_numpy(dtype=np.float64)
+X_missing = X[:500].copy()
+X_missing[np.random.default_rng(0).random(X_missing.shape) < 0.2] = np.nan
+
+failed = False
+for name, data in [("UCI", X), ("UCI with NaNs", X_missing)]:
+    contributions, base = explainer.explain(data)
+    expected = model.predict(data)
+    if compiled.link == "log":
+        expected = np.log(expected)
+    max_diff = np.abs(base + contributions.sum(axis=1) - expected).max()
+    print(f"{name}: {len(data)} rows, max |base + sum(contributions) - predict| = {max_diff:.3e}")
+    failed |= max_diff > 1e-9
+
+# Without the pattern table the same values come from the per-row integral
+direct = TreeExplainer(compiled, table_mb=0)
+table_diff = np.abs(direct.shap_values(X_missing[:100]) - explainer.shap_values(X_missing[:100])).max()
+print(f"Pattern table vs direct integral: max |diff| = {table_diff:.3e}")
+failed |= table_diff > 1e-9
+
+# Brute force over all 2**11 feature subsets on the first few trees
+few = CompiledModel(compiled.feature_idx, compiled.threshold, compiled.left, compiled.right, compiled.value,
+                    compiled.missing_go_left, compiled.roots[:4], 0.0, compiled.max_depth,
+                    feature_names, compiled.link, compiled.node_count)
+few_explainer = TreeExplainer(few)
+brute_diff = max(np.abs(few_explainer.shap_values(row)[0] - brute_force_shapley(few, row)).max()
+                 for row in [X[0], X[100], X_missing[3]])
+print(f"Brute-force Shapley on {few.n_trees} trees, 3 rows: max |diff| = {brute_diff:.3e}")
+failed |= brute_diff > 1e-9
+
+row = X[:1]
+explainer.shap_values(row)
+times = []
+for _ in range(200):
+    t0 = time.perf_counter()
+    explainer.shap_values(row)
+    times.append(time.perf_counter() - t0)
+print(f"single row: {np.median(times) * 1000:.3f} ms median")
+
+
+server = load_server()
+
+
+async def check_endpoints():
+    async with serving(server) as client:
+        built_at_load = bool(server.model_holder._explainers)
+        single = await client.post("/predict?explain=true", json={"values": X[0].tolist()})
+        batch = await client.post("/predict/batch", json={"rows": X[:5].tolist(), "explain": True})
+        plain = await client.post("/predict", json={"values": X[0].tolist()})
+        # A model that can't be explained still answers, just without the explanation
+        snapshot = server.model_holder.current
+        server.model_holder.current = dataclasses.replace(snapshot, explain_source=None)
+        unexplained = await client.post("/predict?explain=true", json={"values": X[0].tolist()})
+        unexplained_batch = await client.post("/predict/batch", json={"rows": X[:5].tolist(), "explain": True})
+        server.model_holder.current = snapshot
+    errors = []
+    if built_at_load:
+        errors.append("the explainer should be built on the first ?explain request, not at load")
+    if unexplained.status_code != 200 or "explanation" in unexplained.json() \
+            or unexplained_batch.status_code != 200 or "explanation" in unexplained_batch.json():
+        errors.append(f"without an explainer /predict should still score: {unexplained.status_code} "
+                      f"{unexplained.text} / {unexplained_batch.status_code}")
+    if single.status_code != 200 or batch.status_code != 200:
+        return [f"status {single.status_code} / {batch.status_code}: {single.text} {batch.text}"]
+    explanation = single.json()["explanation"]
+    total = explanation["base_value"] + sum(explanation["contributions"].values())
+    print(f"/predict?explain=true: score {single.json()['score']}, base {explanation['base_value']}, "
+          f"base + contributions = {total:.4f}")
+    if list(explanation["contributions"]) != server.model_holder.current.feature_order:
+        errors.append("contributions should be keyed by feature in feature order")
+    if abs(total - model.predict(X[:1])[0]) > 1e-4:
+        errors.append("single-row contributions do not add up to the prediction")
+    body = batch.json()["explanation"]
+    totals = body["base_value"] + np.sum(body["contributions"], axis=1)
+    if np.abs(totals - model.predict(X[:5])).max() > 1e-4:
+        errors.append("batch contributions do not add up to the predictions")
+    if "explanation" in plain.json():
+        errors.append("explanations should only be returned on request")
+    return errors
+
+
+for error in asyncio.run(check_endpoints()):
+    print(f"ERROR: {error}")
+    failed = True
+
+if failed:
+    print("ERROR: attributions do not match the model")
+    sys.exit(1)
+print("OK")
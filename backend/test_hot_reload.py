@@ -0,0 +1,101 @@
+# Hot-reload check: a new artifact written with dump_model_atomic while
+# /predict/batch requests are in flight is picked up by the watcher, and every
+# response comes from either the old version or the new one, with that
+# version's score, never an error. A corrupt artifact keeps the new model
+# serving and counts a reload error.
+import asyncio
+import json
+import os
+import shutil
+import tempfile
+import time
+import warnings
+
+import joblib
+import numpy as np
+from sklearn.base import clone
+from advisor import advise
+from check_harness import Checks, load_server, serving
+from model_store import dump_model_atomic
+from wine_data import load_wine_data
+
+CLIENTS = 8
+CHECK_INTERVAL = 0.05
+
+warnings.filterwarnings("ignore", message="X does not have valid feature names")
+check = Checks()
+model_dir = tempfile.mkdtemp(prefix="wine_reload_")
+model_path = os.path.join(model_dir, "best_model_wine_quality.joblib")
+for name in ("best_model_wine_quality.joblib", "feature_names.json"):
+    shutil.copy(name, model_dir)
+server = load_server(WINE_MODEL_DIR=model_dir, WINE_MODEL_CHECK_INTERVAL=str(CHECK_INTERVAL))
+
+with open("feature_names.json", "r") as f:
+    feature_names = json.load(f)
+X_all, y_all = load_wine_data()[:2]
+rows = X_all[feature_names].to_numpy(dtype=np.float64)[:4]
+old_model = joblib.load(model_path)
+new_model = clone(old_model).set_params(model__max_iter=1).fit(X_all[feature_names], y_all)
+
+
+async def main():
+    async with serving(server) as client:
+        old_version = server.model_holder.current.version
+        seen = {}
+        errors = []
+        done = asyncio.Event()
+
+        async def keep_predicting():
+            while not done.is_set():
+                response = await client.post("/predict/batch", json={"rows": rows.tolist()})
+                if response.status_code != 200:
+                    errors.append(f"{response.status_code}: {response.text}")
+                    continue
+                body = response.json()
+                seen.setdefault(body["model_version"], set()).add(tuple(body["scores"]))
+
+        clients = [asyncio.create_task(keep_predicting()) for _ in range(CLIENTS)]
+        await asyncio.sleep(0.2)
+        await asyncio.to_thread(dump_model_atomic, new_model, model_path)
+        deadline = time.time() + 10
+        while server.model_holder.current.version == old_version and time.time() < deadline:
+            await asyncio.sleep(CHECK_INTERVAL)
+        await asyncio.sleep(0.2)
+        done.set()
+        await asyncio.gather(*clients)
+        new_version = server.model_holder.current.version
+
+        check(not errors, f"no request should fail during the reload: {errors[:3]}")
+        check(new_version != old_version, "the watcher should load the new artifact")
+        check(set(seen) == {old_version, new_version}, f"responses came from versions {sorted(seen)}")
+        for version, model in ((old_version, old_model), (new_version, new_model)):
+            expected = {tuple(advise(model.predict(rows))[0].tolist())}
+            check(seen.get(version) == expected,
+                  f"every response from {version} should carry its scores {expected}, got {seen.get(version)}")
+        print(f"{sum(len(s) for s in seen.values())} distinct answers from {old_version} and {new_version} "
+              f"with {CLIENTS} clients during the swap")
+
+        # A corrupt artifact: the new model keeps serving and the failure is counted
+        reload_errors = server.model_holder.reload_errors
+        tmp_path = f"{model_path}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(b"not a joblib file")
+        os.replace(tmp_path, model_path)
+        deadline = time.time() + 10
+        while server.model_holder.reload_errors == reload_errors and time.time() < deadline:
+            await asyncio.sleep(CHECK_INTERVAL)
+        check(server.model_holder.reload_errors > reload_errors, "a corrupt artifact should count a reload error")
+        response = await client.post("/predict/batch", json={"rows": rows.tolist()})
+        check(response.status_code == 200 and response.json()["model_version"] == new_version,
+              f"the last good version should keep serving: {response.status_code} {response.text}")
+        ready = (await client.get("/ready")).json()
+        check(ready["model_version"] == new_version and ready["last_reload_error"],
+              f"/ready should report the kept version and the reload error: {ready}")
+        print(f"Corrupt artifact: still serving {new_version}, reload error '{ready['last_reload_error']}'")
+
+
+try:
+    asyncio.run(main())
+finally:
+    shutil.rmtree(model_dir, ignore_errors=True)
+check.finish()
@@ -0,0 +1,105 @@
+# Startup regression check: how long a fresh interpreter takes to import
+# server.py and answer its first prediction, per model mode.
+#
+# Each mode runs in its own interpreter (best of --repeats) with
+# `python -X importtime`, so the heaviest imports are listed too. The wqm
+# serving path must not import pandas, joblib, sklearn, scipy or uvicorn and
+# must stay under the import budget.
+#
+#   python test_import_time.py                       # wqm vs sklearn, 1500 ms budget
+#   WINE_IMPORT_BUDGET_MS=800 python test_import_time.py --output import_profile.json
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+# Modules the slim serving path must never load
+HEAVY_MODULES = ("pandas", "joblib", "sklearn", "scipy", "uvicorn")
+
+PROBE = """
+import json, sys, time
+t0 = time.perf_counter()
+import server
+t1 = time.perf_counter()
+import numpy as np
+server.model_holder.load()
+snapshot = server.model_holder.current
+snapshot.model.predict(np.zeros((1, len(snapshot.feature_order))))
+t2 = time.perf_counter()
+print("RESULT", json.dumps({{
+    "import_ms": (t1 - t0) * 1000,
+    "first_prediction_ms": (t2 - t0) * 1000,
+    "heavy_modules": [m for m in {heavy!r} if m in sys.modules],
+}}))
+"""
+
+
+def parse_importtime(stderr, top=8):
+    """Top-level imports (direct children of the probe) by cumulative microseconds."""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        # One level of indentation: imported directly by the probe or server.py
+        if name.startswith("   ") and not name.startswith("     ") and cumulative.strip().isdigit():
+            rows.append((name.strip(), int(cumulative) / 1000))
+    return sorted(rows, key=lambda r: r[1], reverse=True)[:top]
+
+
+def probe(mode, repeats):
+    env = {**os.environ, "WINE_MODEL_MODE": mode, "WINE_MODEL_CHECK_INTERVAL": "0", "WINE_MODEL_DIR": "."}
+    best = None
+    for _ in range(repeats):
+        out = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", PROBE.format(heavy=HEAVY_MODULES)],
+            capture_output=True, text=True, env=env, cwd=os.path.dirname(os.path.abspath(__file__)),
+        )
+        if out.returncode != 0:
+            raise RuntimeError(f"{mode} probe failed:\n{out.stderr[-2000:]}")
+        line = next(l for l in out.stdout.splitlines() if l.startswith("RESULT "))
+        result = json.loads(line[len("RESULT "):])
+        result["top_imports_ms"] = parse_importtime(out.stderr)
+        if best is None or result["import_ms"] < best["import_ms"]:
+            best = result
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Profile server import time and first-prediction latency.")
+    parser.add_argument("--modes", nargs="+", default=["wqm", "sklearn"])
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--budget-ms", type=float, default=float(os.environ.get("WINE_IMPORT_BUDGET_MS", "1500")),
+                        help="maximum `import server` time in wqm mode")
+    parser.add_argument("--output", help="write the profile as JSON")
+    args = parser.parse_args()
+
+    report = {}
+    for mode in args.modes:
+        report[mode] = result = probe(mode, args.repeats)
+        print(f"{mode}: import {result['import_ms']:.0f} ms, first prediction at "
+              f"{result['first_prediction_ms']:.0f} ms, heavy modules: {result['heavy_modules'] or 'none'}")
+        for name, ms in result["top_imports_ms"]:
+            print(f"  {name:28s} {ms:8.1f} ms")
+
+    failed = False
+    if "wqm" in report:
+        wqm = report["wqm"]
+        if wqm["heavy_modules"]:
+            print(f"FAIL: wqm serving path imported {wqm['heavy_modules']}")
+            failed = True
+        if wqm["import_ms"] > args.budget_ms:
+            print(f"FAIL: import server took {wqm['import_ms']:.0f} ms (budget {args.budget_ms:.0f} ms)")
+            failed = True
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Saved {args.output}")
+    if failed:
+        sys.exit(1)
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+# Incremental-training check: `train_model.py --incremental` in a scratch
+# directory with its own registry. An accepted update is gated against the
+# production version (not the last unpromoted retrain), every batch is kept
+# in the labelled-sample store and later runs train on all of them, a batch
+# passed twice is only stored once, and a rejected update falls back to a
+# full search on the combined data.
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+import numpy as np
+from check_harness import Checks
+from model_registry import ModelRegistry
+from wine_data import TARGET, load_wine_data
+
+BACKEND = os.path.dirname(os.path.abspath(__file__))
+BATCH_ROWS = 50
+
+check = Checks()
+work = tempfile.mkdtemp(prefix="wine_incremental_")
+registry = ModelRegistry(os.path.join(work, "model_registry"))
+
+with open("feature_names.json", "r") as f:
+    feature_names = json.load(f)
+X, y = load_wine_data()[:2]
+rng = np.random.default_rng(0)
+batches = []
+for i in range(3):
+    rows = rng.choice(len(y), BATCH_ROWS, replace=False)
+    path = os.path.join(work, f"batch{i}.csv")
+    X.iloc[rows][feature_names].assign(**{TARGET: y[rows]}).to_csv(path, index=False)
+    batches.append(path)
+
+
+def train(*args):
+    result = subprocess.run([sys.executable, os.path.join(BACKEND, "train_model.py"), *args], cwd=work,
+                            capture_output=True, text=True)
+    if result.returncode != 0:
+        print(result.stdout[-3000:], result.stderr[-3000:])
+        raise SystemExit(f"train_model.py {' '.join(args)} failed")
+    newest = registry.versions()[-1]
+    stored = registry.labelled_samples()
+    print(f"train_model.py {' '.join(args)}: version {newest['version']} ({newest.get('mode')}), "
+          f"{0 if stored is None else len(stored)} stored samples")
+    return newest, stored, result.stdout
+
+
+try:
+    # A quick baseline (one search candidate) trained on the same split; the first version is promoted
+    train("--budget-minutes", "0")
+    production = registry.alias("production")
+    first, stored, _ = train("--incremental", batches[0])
+    check(first["mode"] == "incremental-refit" and first["baseline_version"] == production,
+          "a small batch of real samples should be accepted, gated against production")
+    check(stored is not None and len(stored) == BATCH_ROWS, "the accepted batch should be stored")
+
+    # Not promoted: the next update must still be gated against production and keep batch 0
+    second, stored, _ = train("--incremental", batches[1])
+    check(second["baseline_version"] == production,
+          "the gate should use production, not the unpromoted model train_model.py left in place")
+    check(len(stored) == 2 * BATCH_ROWS and second["labelled_samples"] == 2 * BATCH_ROWS,
+          "both batches should be stored and trained on")
+    second_train_rows = int((~stored["holdout"].astype(bool))[BATCH_ROWS:].sum())
+    check(second["n_train"] == first["n_train"] + second_train_rows,
+          "the second update should train on the first batch's rows as well as its own")
+
+    _, stored, out = train("--incremental", batches[1])
+    check(len(stored) == 2 * BATCH_ROWS and "already added" in out, "a batch passed twice is stored once")
+
+    # A negative allowance rejects any update: full (budget-capped) search on everything stored
+    rejected, stored, out = train("--incremental", batches[2], "--max-degradation", "-1", "--budget-minutes", "0")
+    check("running a full search" in out and rejected["mode"] == "search-random",
+          "a rejected update should fall back to a full search")
+    check(len(stored) == 3 * BATCH_ROWS and rejected["labelled_samples"] == 3 * BATCH_ROWS,
+          "the full search should train on every stored batch")
+finally:
+    shutil.rmtree(work, ignore_errors=True)
+check.finish()
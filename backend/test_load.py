@@ -1,13 +1,42 @@
 import joblib
 import sys
+import time
+import warnings
+
+import numpy as np
 
 try:
     print("Loading model...")
+    t0 = time.perf_counter()
     model = joblib.load("best_model_wine_quality.joblib")
-    print("Model loaded successfully.")
+    print(f"Model loaded successfully ({(time.perf_counter() - t0) * 1000:.1f} ms).")
     print(f"Model type: {type(model)}")
 except Exception as e:
     print(f"ERROR: {e}")
     # Print full traceback
     import traceback
     traceback.print_exc()
+    sys.exit(1)
+
+try:
+    from wqm_format import WQM_PATH, load_wqm
+
+    print(f"Loading {WQM_PATH}...")
+    t0 = time.perf_counter()
+    compiled, meta = load_wqm(WQM_PATH)
+    print(f"Artifact loaded ({(time.perf_counter() - t0) * 1000:.1f} ms, format v{meta['format_version']}, "
+          f"{meta['model']['n_trees']} trees, checksum {meta['checksum'][:12]}).")
+    warnings.filterwarnings("ignore", message="X does not have valid feature names")
+    X = np.random.default_rng(0).random((256, len(meta["feature_names"]))) * 10
+    diff = np.abs(model.predict(X) - compiled.predict(X)).max()
+    print(f"Max prediction difference vs joblib: {diff:.2e}")
+    if diff > 1e-9:
+        print("ERROR: .wqm predictions do not match the joblib model")
+        sys.exit(1)
+except FileNotFoundError:
+    print("No .wqm artifact yet (run train_model.py or `python wqm_format.py export`).")
+except Exception as e:
+    print(f"ERROR: {e}")
+    import traceback
+    traceback.print_exc()
+    sys.exit(1)
@@ -0,0 +1,85 @@
+# Pipeline check: `pipeline.py` into a scratch artifact root and registry.
+# A second run with nothing changed republishes nothing, a forced stage
+# publishes a new generation that reuses the fresh stages, and all the while
+# artifacts/current resolves to a complete generation (its pipeline.json and
+# every artifact it lists), never a partial one.
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+
+from check_harness import Checks
+
+BACKEND = os.path.dirname(os.path.abspath(__file__))
+
+check = Checks()
+work = tempfile.mkdtemp(prefix="wine_pipeline_")
+root = os.path.join(work, "artifacts")
+current = os.path.join(root, "current")
+incomplete = []
+seen = set()
+stop = threading.Event()
+
+
+def watch_current():
+    """Resolve current as a server would, every millisecond, and check what it points at."""
+    while not stop.wait(0.001):
+        target = os.path.realpath(current)
+        if not os.path.lexists(current):
+            continue
+        try:
+            with open(os.path.join(target, "pipeline.json"), "r") as f:
+                manifest = json.load(f)
+            missing = [name for name in manifest["artifacts"] if not os.path.exists(os.path.join(target, name))]
+        except (OSError, ValueError) as e:
+            missing = [repr(e)]
+        if missing:
+            incomplete.append((target, missing))
+        seen.add(os.path.basename(target))
+
+
+def run(*args):
+    result = subprocess.run([sys.executable, os.path.join(BACKEND, "pipeline.py"), "--root", root,
+                             "--train-args", "--budget-minutes 0", *args],
+                            env={**os.environ, "WINE_REGISTRY_DIR": os.path.join(work, "model_registry")},
+                            capture_output=True, text=True)
+    if result.returncode != 0:
+        print(result.stdout[-3000:], result.stderr[-3000:])
+        raise SystemExit(f"pipeline.py {' '.join(args)} failed")
+    with open(os.path.join(current, "pipeline.json"), "r") as f:
+        return json.load(f), result.stdout
+
+
+def generations():
+    return sorted(name for name in os.listdir(root) if name != "current")
+
+
+watcher = threading.Thread(target=watch_current, daemon=True)
+watcher.start()
+try:
+    first, _ = run()
+    published = generations()
+    check(published == [first["generation"]], f"the first run should publish one generation: {published}")
+
+    second, out = run()
+    check("All stages up to date" in out and second == first and generations() == published,
+          "a second run with nothing changed should republish nothing")
+
+    third, out = run("--force", "report")
+    check(third["generation"] != first["generation"] and len(generations()) == 2,
+          "a forced stage should publish a new generation")
+    check(not third["stages"]["train"]["ran"] and not third["stages"]["eda"]["ran"] and third["stages"]["report"]["ran"],
+          f"only the forced stage should run: {json.dumps({k: v['ran'] for k, v in third['stages'].items()})}")
+    check(third["model_version"] == first["model_version"], "the reused model should keep its version")
+finally:
+    stop.set()
+    watcher.join()
+    shutil.rmtree(work, ignore_errors=True)
+check(not incomplete, f"current resolved to an incomplete generation: {incomplete[:3]}")
+check(seen == {first["generation"], third["generation"]}, f"current should only name published generations: {seen}")
+print(f"Generations {first['generation']} and {third['generation']}; current was always complete "
+      f"({len(seen)} generations seen while polling)")
+check.finish()
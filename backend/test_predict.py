@@ -1,22 +1,47 @@
 import urllib.request
 import json
+import struct
 
 url = "http://127.0.0.1:8000/predict"
-data = {
-    "features": {
-        "alcohol": 12.0,
-        "volatile_acidity": 0.5
-    }
-}
-jsondata = json.dumps(data).encode("utf-8")
+# One wine in feature_names.json order
+values = [7.4, 0.7, 0.0, 1.9, 0.076, 11.0, 34.0, 0.9978, 3.51, 0.56, 9.4]
+
+
+def post(body, content_type):
+    req = urllib.request.Request(url, data=body, headers={'Content-Type': content_type})
+    try:
+        with urllib.request.urlopen(req) as response:
+            return response.getcode(), json.loads(response.read().decode('utf-8'))
+    except urllib.error.HTTPError as e:
+        return e.code, json.loads(e.read().decode('utf-8'))
 
-req = urllib.request.Request(url, data=jsondata, headers={'Content-Type': 'application/json'})
 
 try:
-    with urllib.request.urlopen(req) as response:
-        print(f"Status: {response.getcode()}")
-        print(f"Response: {response.read().decode('utf-8')}")
-except urllib.error.HTTPError as e:
-    print(f"HTTP Error {e.code}: {e.read().decode('utf-8')}")
+    with urllib.request.urlopen("http://127.0.0.1:8000/features") as response:
+        features = json.loads(response.read().decode('utf-8'))["features"]
+
+    cases = [
+        ("features by name", json.dumps({"features": dict(zip(features, values))}).encode("utf-8"),
+         "application/json", 200),
+        ("positional values", json.dumps({"values": values}).encode("utf-8"), "application/json", 200),
+        ("packed float64", struct.pack(f"<{len(values)}d", *values), "application/x-wine-f64", 200),
+        # Missing features are rejected, not filled with 0
+        ("missing features", json.dumps({"features": {"alcohol": 12.0, "volatile_acidity": 0.5}}).encode("utf-8"),
+         "application/json", 422),
+    ]
+    scores = []
+    failed = False
+    for name, body, content_type, expected in cases:
+        status, result = post(body, content_type)
+        print(f"{name}: status {status}, response {result}")
+        if status != expected:
+            print(f"ERROR: expected status {expected}")
+            failed = True
+        elif status == 200:
+            scores.append(result["score"])
+    if len(set(scores)) > 1:
+        print(f"ERROR: payload formats disagree: {scores}")
+        failed = True
+    print("FAILED" if failed else "OK")
 except Exception as e:
     print(f"Error: {e}")
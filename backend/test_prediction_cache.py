@@ -0,0 +1,81 @@
+# Prediction-cache check: a repeated /predict is answered from the cache, the
+# least recently used entry is evicted at WINE_CACHE_SIZE, and hot-reloading a
+# different model empties the cache so the next answer (and entry) comes from
+# the new version.
+import asyncio
+import json
+import os
+import shutil
+import tempfile
+
+import joblib
+import numpy as np
+from sklearn.base import clone
+from check_harness import Checks, load_server, serving
+from model_store import dump_model_atomic
+from wine_data import load_wine_data
+
+CACHE_SIZE = 4
+
+check = Checks()
+model_dir = tempfile.mkdtemp(prefix="wine_cache_")
+for name in ("best_model_wine_quality.joblib", "feature_names.json"):
+    shutil.copy(name, model_dir)
+server = load_server(WINE_CACHE_SIZE=str(CACHE_SIZE), WINE_MODEL_DIR=model_dir)
+
+with open("feature_names.json", "r") as f:
+    feature_names = json.load(f)
+X_all, y_all = load_wine_data()[:2]
+X = X_all[feature_names].to_numpy(dtype=np.float64)
+# Best wines first: a one-round model scores them well below the served one
+rows = X[np.argsort(-np.asarray(y_all), kind="stable")[:CACHE_SIZE + 2]]
+
+
+async def main():
+    cache = server.prediction_cache
+
+    async def score(row):
+        response = await client.post("/predict", json={"values": row.tolist()})
+        check(response.status_code == 200, f"/predict returned {response.status_code}")
+        return response.json()["score"]
+
+    async with serving(server) as client:
+        first = await score(rows[0])
+        check(await score(rows[0]) == first and cache.stats()["hits"] == 1,
+              f"a repeated row should be a cache hit: {cache.stats()}")
+
+        # Fill the cache, touching row 0 so row 1 is the least recently used
+        for row in rows[1:CACHE_SIZE]:
+            await score(row)
+        await score(rows[0])
+        await score(rows[CACHE_SIZE])
+        version = server.model_holder.current.version
+        stats = cache.stats()
+        check(stats["entries"] == CACHE_SIZE and stats["evictions"] == 1,
+              f"the cache should hold {CACHE_SIZE} entries after one eviction: {stats}")
+        check(cache.get(version, rows[1]) is None and cache.get(version, rows[0]) is not None,
+              "the least recently used row should be the one evicted")
+        print(f"Cache after {CACHE_SIZE + 1} distinct rows: {cache.stats()}")
+
+        # A different model published under the served path
+        invalidations = stats["invalidations"]
+        model = joblib.load(os.path.join(model_dir, "best_model_wine_quality.joblib"))
+        dump_model_atomic(clone(model).set_params(model__max_iter=1).fit(X_all[feature_names], y_all),
+                          os.path.join(model_dir, "best_model_wine_quality.joblib"))
+        check(server.model_holder.maybe_reload(), "the new artifact should be loaded")
+        new_version = server.model_holder.current.version
+        stats = cache.stats()
+        check(new_version != version and stats["entries"] == 0 and stats["invalidations"] == invalidations + 1,
+              f"a reload should empty the cache: {stats}")
+        rescored = await score(rows[0])
+        check(rescored != first, f"the reloaded model should answer: score {first} before, {rescored} after")
+        check(cache.get(new_version, rows[0]) is not None and cache.get(version, rows[0]) is None,
+              "the new entry should be keyed by the new version")
+        print(f"Reloaded {version} -> {new_version}: score {first} -> {rescored}")
+
+
+try:
+    asyncio.run(main())
+finally:
+    shutil.rmtree(model_dir, ignore_errors=True)
+check.finish()
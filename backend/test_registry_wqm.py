@@ -0,0 +1,66 @@
+# Registry version ids in wqm mode: a version registered from a .joblib and
+# the .wqm exported from it, promoted and loaded through the production alias,
+# is reported by ModelHolder under the registry's id, across a promotion to
+# another version too. A .wqm left over from another model is not copied in.
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+import joblib
+from sklearn.base import clone
+from check_harness import Checks
+from model_registry import MODEL_FILE, WQM_FILE, ModelRegistry
+from model_store import ModelHolder
+from wine_data import load_wine_data
+
+BACKEND = os.path.dirname(os.path.abspath(__file__))
+
+check = Checks()
+work = tempfile.mkdtemp(prefix="wine_registry_wqm_")
+registry = ModelRegistry(os.path.join(work, "model_registry"))
+
+with open("feature_names.json", "r") as f:
+    feature_names = json.load(f)
+X, y = load_wine_data()[:2]
+
+
+def stage(name, max_iter):
+    """A small model in its own directory, exported to .wqm with `wqm_format.py export`."""
+    staging = os.path.join(work, name)
+    os.makedirs(staging)
+    model = clone(joblib.load(MODEL_FILE)).set_params(model__max_iter=max_iter).fit(X[feature_names], y)
+    joblib.dump(model, os.path.join(staging, MODEL_FILE))
+    shutil.copy("feature_names.json", staging)
+    shutil.copy("metrics.json", staging)
+    subprocess.run([sys.executable, os.path.join(BACKEND, "wqm_format.py"), "export"], cwd=staging,
+                   check=True, stdout=subprocess.DEVNULL)
+    return staging
+
+
+try:
+    first = registry.register(stage("first", 10))
+    second = registry.register(stage("second", 20))
+    registry.promote(first)
+    production = os.path.join(registry.root, "production")
+    holder = ModelHolder(os.path.join(production, WQM_FILE), os.path.join(production, "feature_names.json"),
+                         check_interval=0, mode="wqm")
+    check(holder.load().version == first,
+          f"wqm mode should report registry version {first}, got {holder.current.version}")
+    registry.promote(second)
+    holder.maybe_reload()
+    check(holder.current.version == second,
+          f"after promoting {second}, wqm mode reports {holder.current.version}")
+    print(f"wqm mode reports the registry ids {first} and {second}")
+
+    # A stale .wqm next to a retrained .joblib would otherwise be served under the new id
+    stale = stage("stale", 30)
+    shutil.copy(os.path.join(work, "first", WQM_FILE), stale)
+    third = registry.register(stale)
+    check(not os.path.exists(os.path.join(registry.version_dir(third), WQM_FILE)),
+          "a .wqm exported from another model should not be registered")
+finally:
+    shutil.rmtree(work, ignore_errors=True)
+check.finish()
@@ -0,0 +1,72 @@
+# Search checkpoint check: a randomized search stopped by a spent budget,
+# with the end of its checkpoint torn off as a kill mid-write would leave it,
+# resumes without refitting the fits the checkpoint still holds and picks the
+# same candidate, with the same score, as an uninterrupted search.
+import json
+import os
+import shutil
+import tempfile
+
+import numpy as np
+from sklearn.ensemble import HistGradientBoostingRegressor
+from sklearn.metrics import make_scorer, mean_absolute_error
+from check_harness import Checks
+from search import Budget, randomized_search
+from wine_data import load_wine_data
+
+N_ITER = 8
+CV = 2
+# Two candidates (all their folds) per launch, so the budget stops after the first two
+N_JOBS = 4
+KEPT_LINES = 3
+
+check = Checks()
+work = tempfile.mkdtemp(prefix="wine_search_")
+X, y = load_wine_data()[:2]
+X, y = X.to_numpy(dtype=np.float64)[:600], np.asarray(y)[:600]
+estimator = HistGradientBoostingRegressor(random_state=0)
+space = {"learning_rate": [0.05, 0.1, 0.2], "max_iter": [20, 40], "max_leaf_nodes": [7, 15, 31]}
+scorer = make_scorer(mean_absolute_error, greater_is_better=False)
+
+
+def search(path, budget=None):
+    return randomized_search(estimator, space, X, y, scorer, n_iter=N_ITER, cv=CV, checkpoint_path=path,
+                             n_jobs=N_JOBS, random_state=0, data_hash="resume-check", budget=budget)
+
+
+def read_keys(path):
+    with open(path, "r") as f:
+        return [json.loads(line)["key"] for line in f]
+
+
+try:
+    full = search(os.path.join(work, "full.jsonl"))
+
+    path = os.path.join(work, "interrupted.jsonl")
+    partial = search(path, Budget(seconds=0))
+    check(partial["stopped"] and 0 < len(partial["fits"]) < N_ITER * CV,
+          f"a spent budget should stop the search early ({len(partial['fits'])} fits)")
+    # Killed while appending: some whole lines survive, then half a record
+    with open(path, "r") as f:
+        lines = f.readlines()
+    with open(path, "w") as f:
+        f.writelines(lines[:KEPT_LINES])
+        f.write(lines[KEPT_LINES][:len(lines[KEPT_LINES]) // 2])
+    kept = {json.loads(line)["key"] for line in lines[:KEPT_LINES]}
+
+    resumed = search(path)
+    reused = [fit for fit in resumed["fits"] if fit["from_checkpoint"]]
+    check(len(reused) == KEPT_LINES and len(resumed["fits"]) == N_ITER * CV,
+          f"the {KEPT_LINES} checkpointed fits should be reused and only the rest fitted "
+          f"({len(reused)} reused of {len(resumed['fits'])})")
+    keys = [key for key in read_keys(path) if key not in kept]
+    check(len(keys) == len(set(keys)) == N_ITER * CV - KEPT_LINES,
+          f"the resumed run should append each missing fit once ({len(keys)} appended)")
+    check(resumed["best_params_"] == full["best_params_"] and resumed["best_score_"] == full["best_score_"],
+          f"resumed best {resumed['best_params_']} ({resumed['best_score_']}) should match the uninterrupted "
+          f"{full['best_params_']} ({full['best_score_']})")
+    print(f"Stopped after {len(partial['fits'])} fits, kept {KEPT_LINES}, resumed with "
+          f"{N_ITER * CV - KEPT_LINES} new fits; best {resumed['best_params_']}")
+finally:
+    shutil.rmtree(work, ignore_errors=True)
+check.finish()
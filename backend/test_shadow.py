@@ -0,0 +1,143 @@
+# Registry and shadow-scoring check: versions are promoted and rolled back by
+# switching the production alias (and the server hot-reloads onto it, with the
+# /report attached to the version it serves), and a
+# candidate shadow-scored on live /predict traffic collects error and latency
+# statistics without slowing the primary responses down.
+import asyncio
+import json
+import os
+import shutil
+import tempfile
+import time
+import warnings
+
+import joblib
+import numpy as np
+from sklearn.base import clone
+from check_harness import Checks, load_server, serving
+from model_registry import ModelRegistry, RegistryError
+from wine_data import load_wine_data
+
+REQUESTS = 300
+
+warnings.filterwarnings("ignore", message="X does not have valid feature names")
+check = Checks()
+REGISTRY = tempfile.mkdtemp(prefix="wine_registry_")
+registry = ModelRegistry(REGISTRY)
+# A model from before the registry is adopted as production once (pipeline.py, or the adopt command)
+current = registry.adopt(".")
+check(current is not None and registry.adopt(".") == current and len(registry.history()) == 1,
+      "adopt should promote the in-place model once")
+
+# A quick, deliberately different candidate trained on the same features
+print("Training a small candidate model...")
+with open("feature_names.json", "r") as f:
+    feature_names = json.load(f)
+X_all, y_all = load_wine_data()[:2]
+X = X_all[feature_names].to_numpy(dtype=np.float64)
+candidate_model = clone(joblib.load("best_model_wine_quality.joblib")).set_params(model__max_iter=20)
+candidate_model.fit(X_all[feature_names], y_all)
+staging = tempfile.mkdtemp(prefix="wine_candidate_")
+joblib.dump(candidate_model, os.path.join(staging, "best_model_wine_quality.joblib"))
+shutil.copy("feature_names.json", staging)
+shutil.copy("metrics.json", staging)
+candidate = registry.register(staging)
+shutil.rmtree(staging)
+check(candidate != current, "a different model should get a new version")
+check(registry.register(".") == current, "registering the same model again should return its version")
+
+# Promote, roll back, and nothing further to roll back to
+registry.promote(candidate)
+check(registry.alias("production") == candidate, "promote should move the production alias")
+check(registry.rollback() == current and registry.alias("production") == current,
+      "rollback should restore the previous production version")
+try:
+    registry.rollback()
+    check(False, "a second rollback has nothing to return to")
+except RegistryError:
+    pass
+registry.set_candidate(candidate)
+# Each version's own report, attached the way generate_report.py and pipeline.py do
+for version in (current, candidate):
+    report_dir = tempfile.mkdtemp(prefix="wine_report_")
+    with open(os.path.join(report_dir, "Wine_Quality_Report.md"), "w") as f:
+        f.write(f"# Report for {version}\n")
+    check(registry.attach(report_dir, version) == version, f"attach should add the report to {version}")
+    shutil.rmtree(report_dir)
+print(f"Registry: production {registry.alias('production')}, candidate {registry.alias('candidate')}, "
+      f"{len(registry.history())} history entries")
+
+server = load_server(WINE_EXPLAIN="0", WINE_MODEL_DIR=os.path.join(REGISTRY, "production"),
+                     WINE_SHADOW_DIR=os.path.join(REGISTRY, "candidate"))
+
+X_rows = X[np.random.default_rng(0).choice(len(X), REQUESTS)]
+
+
+async def timed_requests(client, rows):
+    times = []
+    for row in rows:
+        t0 = time.perf_counter()
+        response = await client.post("/predict", json={"values": row.tolist()})
+        times.append(time.perf_counter() - t0)
+        check(response.status_code == 200, f"/predict returned {response.status_code}")
+    return times
+
+
+async def main():
+    async with serving(server) as client:
+        check(server.model_holder.current.version == current, "server should load the production alias")
+        await timed_requests(client, X_rows[:20])
+
+        # Alternate blocks with shadow scoring on and off so drift in the machine hits both
+        scorer = server.shadow_scorer
+        with_shadow, without_shadow = [], []
+        for block in range(0, REQUESTS, 50):
+            with_shadow += await timed_requests(client, X_rows[block:block + 50])
+            server.shadow_scorer = None
+            without_shadow += await timed_requests(client, X_rows[block:block + 50])
+            server.shadow_scorer = scorer
+
+        deadline = time.time() + 30
+        while scorer.stats()["pending"] and time.time() < deadline:
+            await asyncio.sleep(0.05)
+        stats = (await client.get("/metrics/shadow")).json()
+
+        # Promotion reaches the running server through the alias
+        reports = [(await client.get("/report")).json()["content"]]
+        registry.promote(candidate)
+        server.model_holder.maybe_reload()
+        promoted = server.model_holder.current.version
+        reports.append((await client.get("/report")).json()["content"])
+        registry.rollback()
+        server.model_holder.maybe_reload()
+        rolled_back = server.model_holder.current.version
+        reports.append((await client.get("/report")).json()["content"])
+
+    print(json.dumps(stats, indent=2))
+    on, off = np.median(with_shadow) * 1000, np.median(without_shadow) * 1000
+    print(f"/predict median latency: {on:.3f} ms with shadow scoring, {off:.3f} ms without")
+    check(stats["candidate_version"] == candidate and stats["primary_version"] == current,
+          "shadow metrics should name both versions")
+    check(stats["compared"] == 20 + len(with_shadow) and stats["dropped"] == 0,
+          "every row served with shadow scoring on should be compared")
+    # The same comparison offline, over the rows that were shadow-scored
+    served = np.vstack([X_rows[:20], X_rows])
+    diff = candidate_model.predict(served) - joblib.load("best_model_wine_quality.joblib").predict(served)
+    check(stats["rmse"] > 0 and abs(stats["rmse"] - np.sqrt(np.mean(diff ** 2))) < 1e-9
+          and abs(stats["mean_diff"] - diff.mean()) < 1e-9 and 0 <= stats["verdict_agreement"] <= 1,
+          "shadow statistics should match the candidate's offline error against production")
+    check(stats["candidate_latency_ms"] is not None and stats["primary_latency_ms"] is not None,
+          "both latencies should be tracked")
+    # Lenient: timing noise on a shared machine, but a synchronous candidate predict would double it
+    check(on <= off * 1.3 + 0.3, "shadow scoring should not slow down /predict")
+    check(promoted == candidate and rolled_back == current,
+          "the server should follow promote and rollback through the production alias")
+    check([report.strip() for report in reports] == [f"# Report for {v}" for v in (current, candidate, current)],
+          f"/report should describe the served version, got {reports}")
+
+
+try:
+    asyncio.run(main())
+finally:
+    shutil.rmtree(REGISTRY, ignore_errors=True)
+check.finish()
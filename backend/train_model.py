@@ -1,14 +1,41 @@
-# Wine Quality - RandomizedSearchCV (fast + high-quality)
-# Assumes you have ucimlrepo installed and sklearn recent enough to include HistGradientBoostingRegressor.
+# Wine Quality - randomized / successive-halving search (fast + high-quality)
+# Assumes sklearn recent enough to include HistGradientBoostingRegressor. The dataset comes from
+# the local cache in wine_data.py (fetched from UCI with ucimlrepo on first use, or set
+# WINE_DATA_CSV to a local CSV on offline machines).
+#
+#   python train_model.py                      # randomized search (30 candidates x 4 folds)
+#   python train_model.py --search halving     # successive halving
+#   python train_model.py --search halving --compare   # also run the other search, write search_report.json
+#   python train_model.py --budget-minutes 10 --budget-mb 2048   # stop launching candidates past a budget
+#   python train_model.py --incremental new_batch.csv   # refit the current model's params on base + new rows
+#
+# Both searches resume from search_checkpoint.jsonl after an interruption. Every
+# candidate/fold's fit and predict time, peak RSS and boosting iterations used are
+# written to training_report.json next to the CV results. Every published model is
+# also registered in model_registry/; the server only serves it once it is promoted
+# there (see model_registry.py).
 
-from ucimlrepo import fetch_ucirepo
+import argparse
+import atexit
+import copy
+import hashlib
+import os
+import sys
+from wine_data import TARGET, load_wine_data, read_labelled_csv
+from bin_cache import BinCachedHGBRegressor, bin_cache_dir, clear_bin_cache
+from drift import PROFILE_FILE, build_profile
+from model_registry import PRODUCTION, ModelRegistry
+from model_store import save_versioned_model, write_json_atomic
+from wqm_format import export_wqm
+from search import RESOURCES, Budget, cv_results_to_json, randomized_search, successive_halving_search
 import pandas as pd
 import numpy as np
 import time
 import joblib
 
 from scipy.stats import randint, uniform
-from sklearn.model_selection import train_test_split, RandomizedSearchCV
+from sklearn.model_selection import train_test_split
+from sklearn.base import clone
 from sklearn.pipeline import Pipeline
 from sklearn.metrics import mean_squared_error, mean_absolute_error, r2_score, make_scorer
 
@@ -21,15 +48,42 @@ if USE_HIST:
 else:
     from sklearn.ensemble import GradientBoostingRegressor as EstimatorClass
 
+parser = argparse.ArgumentParser(description="Train the wine quality model.")
+parser.add_argument("--search", choices=["random", "halving"], default="random",
+                    help="hyperparameter search strategy (default: random)")
+parser.add_argument("--resource", choices=RESOURCES, default="max_iter",
+                    help="budget grown between halving rungs: boosting rounds or training rows")
+parser.add_argument("--candidates", type=int, default=81, help="candidates sampled for halving")
+parser.add_argument("--factor", type=int, default=3, help="halving elimination factor")
+parser.add_argument("--checkpoint", default="search_checkpoint.jsonl",
+                    help="JSONL of finished CV fits; re-running resumes from it")
+parser.add_argument("--no-bin-cache", action="store_true",
+                    help="re-bin each fold in every CV fit instead of binning it once")
+parser.add_argument("--budget-minutes", type=float,
+                    help="stop launching new candidates after this much wall-clock time")
+parser.add_argument("--budget-mb", type=float,
+                    help="stop launching new candidates once a fit's peak RSS reaches this")
+parser.add_argument("--incremental", nargs="+", metavar="CSV",
+                    help="newly labelled samples: update the current model instead of searching")
+parser.add_argument("--update", choices=["refit", "warm"], default="refit",
+                    help="incremental update: refit the stored params, or warm-start extra rounds")
+parser.add_argument("--extra-rounds", type=int, default=100,
+                    help="boosting rounds added by --update warm")
+parser.add_argument("--max-degradation", type=float, default=0.02,
+                    help="relative holdout weighted MAE increase that triggers a full search")
+parser.add_argument("--compare", action="store_true",
+                    help="run both searches and write search_report.json")
+args = parser.parse_args()
+
+OUTPATH = "best_model_wine_quality.joblib"
+# Same model as a memory-mappable .wqm artifact (see wqm_format.py)
+WQM_PATH = "best_model_wine_quality.wqm"
+
 # ---------------------
 # 1) Load dataset
 # ---------------------
-print("Loading dataset from UCI repository (id=186)...")
-wine_quality = fetch_ucirepo(id=186)
-
-# fetch_ucirepo returns structures with .data.features and .data.targets typically as pandas DataFrames/Series
-X = wine_quality.data.features
-y = wine_quality.data.targets
+X, y, data_meta = load_wine_data()
+print(f"Dataset hash: {data_meta['hash']} (source: {data_meta['source']})")
 
 # Ensure correct types
 if not isinstance(X, pd.DataFrame):
@@ -51,6 +105,47 @@ bins = np.digitize(y, bins=[6, 7])
 X_train, X_test, y_train, y_test = train_test_split(
     X, y, test_size=0.20, random_state=42, stratify=bins
 )
+data_hash = data_meta["hash"]
+
+# 2b) Labelled samples added after the base dataset. Each --incremental batch is
+# split 80/20 once and kept, with its side of the split, in the registry's
+# labelled_samples.csv; every later run (incremental or a full search) trains
+# and gates on all stored batches plus this run's, not just this run's CSVs.
+registry = ModelRegistry()
+stored_samples = registry.labelled_samples()
+new_samples = None
+if args.incremental:
+    parts = [read_labelled_csv(path, list(X.columns)) for path in args.incremental]
+    X_new = pd.concat([p[0] for p in parts], ignore_index=True)
+    y_new = np.concatenate([p[1] for p in parts])
+    h = hashlib.sha256(np.ascontiguousarray(X_new.to_numpy()).tobytes())
+    h.update(y_new.tobytes())
+    batch = h.hexdigest()[:12]
+    if stored_samples is not None and batch in set(stored_samples["batch"]):
+        print(f"These {len(y_new)} samples were already added (batch {batch}); not adding them again")
+    else:
+        holdout = np.zeros(len(y_new), dtype=bool)
+        if len(y_new) >= 10:
+            _, test_idx = train_test_split(np.arange(len(y_new)), test_size=0.20, random_state=42)
+            holdout[test_idx] = True
+        new_samples = X_new.assign(**{TARGET: y_new, "holdout": holdout, "batch": batch})
+        print(f"Adding {len(y_new)} new labelled samples ({(~holdout).sum()} train, {holdout.sum()} holdout)")
+frames = [f for f in (stored_samples, new_samples) if f is not None]
+extra_samples = pd.concat(frames, ignore_index=True) if frames else None
+if extra_samples is not None:
+    in_holdout = extra_samples["holdout"].astype(bool).to_numpy()
+    X_extra = extra_samples[list(X.columns)].astype(np.float64)
+    y_extra = extra_samples[TARGET].to_numpy(dtype=np.int64)
+    X_train = pd.concat([X_train, X_extra[~in_holdout]], ignore_index=True)
+    X_test = pd.concat([X_test, X_extra[in_holdout]], ignore_index=True)
+    y_train = np.concatenate([y_train, y_extra[~in_holdout]])
+    y_test = np.concatenate([y_test, y_extra[in_holdout]])
+    h = hashlib.sha256(data_hash.encode("utf-8"))
+    h.update(np.ascontiguousarray(X_extra.to_numpy()).tobytes())
+    h.update(y_extra.tobytes())
+    data_hash = h.hexdigest()[:16]
+    print(f"Training on the base dataset plus {len(y_extra)} labelled samples "
+          f"({(~in_holdout).sum()} train, {in_holdout.sum()} holdout)")
 print("Train shape:", X_train.shape, "Test shape:", X_test.shape)
 
 # ---------------------
@@ -71,6 +166,15 @@ else:
         ("model", EstimatorClass(random_state=42, n_iter_no_change=10, validation_fraction=0.1, tol=1e-4))
     ])
 
+# Search-time copy of the pipeline: identical hyperparameters and results, but each
+# CV fold is binned once and the uint8 matrix is memory-mapped by every later fit
+# (see bin_cache.py). The final model is refit with the plain pipeline.
+search_pipeline = pipeline
+if USE_HIST and not args.no_bin_cache:
+    search_pipeline = Pipeline([
+        ("model", BinCachedHGBRegressor(random_state=42, early_stopping=True))
+    ])
+
 # ---------------------
 # 4) Parameter distributions (Randomized)
 # ---------------------
@@ -95,7 +199,7 @@ else:
     }
 
 # ---------------------
-# 5) RandomizedSearchCV setup
+# 5) Search setup (randomized or successive halving)
 # ---------------------
 
 # Custom weighted MAE scorer (double penalty for high quality wines >= 7)
@@ -106,90 +210,256 @@ def weighted_mae(y_true, y_pred):
 
 custom_scorer = make_scorer(weighted_mae, greater_is_better=False)
 
-rnd = RandomizedSearchCV(
-    estimator=pipeline,
-    param_distributions=param_distributions,
-    n_iter=30,                  # budget: 30 random combos (good default)
-    scoring=custom_scorer,      # custom metric
-    cv=4,                       # 4-fold CV for a balance of speed/robustness
-    random_state=42,
-    n_jobs=-1,                  # use all cores
-    verbose=2,
-    return_train_score=True,
-    refit=True
-)
+
+def refit_best(best_params):
+    return clone(pipeline).set_params(**best_params).fit(X_train, y_train)
+
+
+def test_metrics(model):
+    y_pred = model.predict(X_test)
+    return {
+        "rmse": float(np.sqrt(mean_squared_error(y_test, y_pred))),
+        "mae": float(mean_absolute_error(y_test, y_pred)),
+        "r2": float(r2_score(y_test, y_pred)),
+        "weighted_mae": float(weighted_mae(y_test, y_pred)),
+    }
+
+
+def publish(model, metrics, meta):
+    """Feature names and metrics first, the model (.joblib, then .wqm) last: the server hot-reloads on it."""
+    write_json_atomic(list(X.columns), "feature_names.json")
+    print("\nSaved feature_names.json")
+    write_json_atomic(metrics, "metrics.json")
+    print("Saved metrics.json")
+    # Reference for the server's input-drift monitor (drift.py)
+    write_json_atomic(build_profile(X_train[list(X.columns)], list(X.columns), meta={"dataset_hash": data_hash}),
+                      PROFILE_FILE)
+    print(f"Saved {PROFILE_FILE}")
+    meta = {**meta, "n_train": len(y_train), "labelled_samples": 0 if extra_samples is None else len(extra_samples)}
+    version = save_versioned_model(model, OUTPATH, meta={**meta, "metrics": metrics, "dataset_hash": data_hash})
+    print(f"Saved best model to: {OUTPATH} (version {version}, copy in model_versions/)")
+    if USE_HIST:
+        # Stamped with the .joblib's version so wqm mode reports the same id as the registry
+        export_wqm(model, WQM_PATH, feature_names=list(X.columns), metrics=metrics,
+                   extra_meta={"dataset_hash": data_hash, "model_version": version})
+        print(f"Saved {WQM_PATH}")
+    register(meta)
+    if new_samples is not None:
+        stored = registry.add_labelled_samples(new_samples)
+        print(f"Stored the new samples in {registry.root}/; {stored} labelled samples in total")
+    return version
+
+
+def register(meta):
+    """Add the published artifacts to the model registry; only the first version is promoted automatically."""
+    version = registry.register(".", meta={**meta, "dataset_hash": data_hash})
+    if registry.alias("production") is None:
+        registry.promote(version)
+        print(f"Registered version {version} in {registry.root}/ and promoted it to production")
+    elif registry.alias("production") != version:
+        print(f"Registered version {version} in {registry.root}/. The server keeps serving production "
+              f"({registry.alias('production')}) until it is promoted: compare it with "
+              f"'python model_registry.py shadow {version}', then 'python model_registry.py promote {version}'")
+
+
+def make_budget():
+    seconds = args.budget_minutes * 60 if args.budget_minutes is not None else None
+    return Budget(seconds=seconds, memory_mb=args.budget_mb)
+
+
+def search_result(search, t0):
+    return {
+        "best_estimator": refit_best(search["best_params_"]),
+        "best_params": search["best_params_"],
+        "best_score": search["best_score_"],
+        "cv_results": search["cv_results_"],
+        "rungs": search["rungs"],
+        "fits": search["fits"],
+        "stopped": search["stopped"],
+        "n_fits": len(search["fits"]),
+        "wall_s": time.time() - t0,
+    }
+
+
+def run_random_search():
+    # Same sampler and unshuffled 4 folds as RandomizedSearchCV(n_iter=30, cv=4),
+    # so the same scores, plus per-fit profiling, checkpointing and the budget.
+    print("Starting randomized search (this can take a few minutes depending on CPU)...")
+    t0 = time.time()
+    search = randomized_search(
+        search_pipeline, param_distributions, X_train, y_train, custom_scorer,
+        n_iter=30,                  # budget: 30 random combos (good default)
+        cv=4,                       # 4-fold CV for a balance of speed/robustness
+        checkpoint_path=args.checkpoint, random_state=42, data_hash=data_hash,
+        n_jobs=-1,                  # use all cores
+        budget=make_budget(),
+    )
+    return search_result(search, t0)
+
+
+def run_halving_search():
+    # Same 4 folds and scorer; candidates start on a small budget and only the
+    # best third moves on to 3x more boosting rounds (or rows) each rung.
+    print(f"Starting successive halving ({args.candidates} candidates, factor {args.factor}, "
+          f"resource {args.resource})...")
+    t0 = time.time()
+    search = successive_halving_search(
+        search_pipeline, param_distributions, X_train, y_train, custom_scorer, cv=4,
+        n_candidates=args.candidates, factor=args.factor, resource=args.resource,
+        checkpoint_path=args.checkpoint, random_state=42, data_hash=data_hash,
+        iter_param="model__max_iter" if USE_HIST else "model__n_estimators",
+        budget=make_budget(),
+    )
+    return search_result(search, t0)
+
+
+SEARCHES = {"random": run_random_search, "halving": run_halving_search}
+
+# ---------------------
+# 5b) Incremental update: the production model's hyperparameters on the combined
+# data, in one fit. Falls back to the full search below if the holdout weighted
+# MAE gets worse than production's by more than --max-degradation. Gating against
+# production, not the last unpromoted retrain, keeps the loss from compounding.
+# ---------------------
+if args.incremental:
+    baseline_version = registry.alias(PRODUCTION)
+    baseline_path = os.path.join(registry.version_dir(baseline_version), OUTPATH) if baseline_version else OUTPATH
+    print(f"Updating from {'production version ' + baseline_version if baseline_version else OUTPATH}")
+    current = joblib.load(baseline_path)
+    current_wmae = weighted_mae(y_test, current.predict(X_test))
+    t0 = time.time()
+    if args.update == "warm":
+        candidate = copy.deepcopy(current)
+        estimator = candidate.steps[-1][1]
+        estimator.set_params(warm_start=True, max_iter=estimator.n_iter_ + args.extra_rounds)
+        candidate.fit(X_train, y_train)
+        estimator.set_params(warm_start=False)
+    else:
+        candidate = clone(current).fit(X_train, y_train)
+    update_s = time.time() - t0
+    metrics = test_metrics(candidate)
+    limit = current_wmae * (1 + args.max_degradation)
+    print(f"Incremental {args.update} in {update_s:.2f}s: holdout weighted MAE "
+          f"{current_wmae:.4f} -> {metrics['weighted_mae']:.4f} (limit {limit:.4f})")
+    if metrics["weighted_mae"] <= limit:
+        publish(candidate, metrics, {
+            "mode": f"incremental-{args.update}",
+            "new_samples": args.incremental,
+            "baseline_version": baseline_version,
+            "previous_weighted_mae": current_wmae,
+            "update_s": update_s,
+        })
+        sys.exit(0)
+    print("Holdout error got worse beyond the threshold; running a full search on the combined data")
 
 # ---------------------
 # 6) Fit
 # ---------------------
-print("Starting RandomizedSearchCV (this can take a few minutes depending on CPU)...")
-t0 = time.time()
+if search_pipeline is not pipeline:
+    # Set before any joblib worker starts, so the workers share the same cache
+    atexit.register(clear_bin_cache, bin_cache_dir())
 try:
-    rnd.fit(X_train, y_train)
+    result = SEARCHES[args.search]()
 except Exception as e:
     print("ERROR during fit:", e)
     raise
-elapsed = time.time() - t0
-print(f"RandomizedSearchCV finished in {elapsed/60:.2f} minutes")
+elapsed = result["wall_s"]
+print(f"{args.search} search finished in {elapsed/60:.2f} minutes")
+if result["stopped"]:
+    print(f"Search stopped early ({result['stopped']}); refitting the best candidate found so far "
+          "with the full boosting rounds")
 
 # ---------------------
 # 7) Best results
 # ---------------------
 print("\n=== Best Cross-Validated Results ===")
-print("Best CV R²:        ", rnd.best_score_)
-print("Best parameters:   ", rnd.best_params_)
+print("Best CV score (negated weighted MAE):", result["best_score"])
+print("Best parameters:   ", result["best_params"])
 
 # ---------------------
 # 8) Evaluate on test set
 # ---------------------
-best_model = rnd.best_estimator_
-y_pred = best_model.predict(X_test)
-
-rmse = np.sqrt(mean_squared_error(y_test, y_pred))
-mae = mean_absolute_error(y_test, y_pred)
-r2 = r2_score(y_test, y_pred)
+best_model = result["best_estimator"]
+metrics = test_metrics(best_model)
 
 print("\n=== Test set performance ===")
-print("Test RMSE:  ", rmse)
-print("Test MAE:   ", mae)
-print("Test R²:    ", r2)
+print("Test RMSE:  ", metrics["rmse"])
+print("Test MAE:   ", metrics["mae"])
+print("Test R²:    ", metrics["r2"])
 
 # ---------------------
-# 9) Save best model
+# 9) Save metadata (features & metrics), then the best model
 # ---------------------
-OUTPATH = "best_model_wine_quality.joblib"
-joblib.dump(best_model, OUTPATH)
-print(f"\nSaved best model to: {OUTPATH}")
-
-# ---------------------
-# 9b) Save metadata (Features & Metrics)
-# ---------------------
-import json
-
-# Save feature names
-feature_names = list(X.columns)
-with open("feature_names.json", "w") as f:
-    json.dump(feature_names, f)
-print("Saved feature_names.json")
-
-# Save metrics
-metrics = {
-    "rmse": rmse,
-    "mae": mae,
-    "r2": r2
-}
-with open("metrics.json", "w") as f:
-    json.dump(metrics, f)
-print("Saved metrics.json")
+# Metadata is written before the model: the server hot-reloads when the model
+# file changes, so the matching metadata must already be in place. All writes
+# are atomic renames; every model is also kept under model_versions/.
+publish(best_model, metrics, {
+    "mode": f"search-{args.search}",
+    "best_params": {k: v.item() if isinstance(v, np.generic) else v for k, v in result["best_params"].items()},
+})
 
 # ---------------------
 # 10) Quick CV summary: top 5 candidates
 # ---------------------
 import pandas as pd
-cvres = pd.DataFrame(rnd.cv_results_)
+cvres = pd.DataFrame(result["cv_results"])
 summary_cols = ["rank_test_score", "mean_test_score", "std_test_score", "params"]
 top5 = cvres[summary_cols].sort_values("rank_test_score").head(5)
 pd.set_option("display.max_colwidth", 120)
 print("\nTop 5 candidate results (CV):")
 print(top5.to_string(index=False))
+cost_cols = ["mean_fit_time", "mean_score_time", "max_peak_rss_mb", "mean_n_iter", "params"]
+print("\nMost expensive candidates (mean fit seconds per fold):")
+print(cvres[cost_cols].sort_values("mean_fit_time", ascending=False).head(5).to_string(index=False))
+
+# ---------------------
+# 10b) Training report: per candidate/fold profile next to the CV results
+# ---------------------
+training_report = {
+    "search": args.search,
+    "dataset_hash": data_meta["hash"],
+    "wall_s": elapsed,
+    "budget": {"minutes": args.budget_minutes, "memory_mb": args.budget_mb},
+    "stopped": result["stopped"],
+    "best_params": {k: v.item() if isinstance(v, np.generic) else v for k, v in result["best_params"].items()},
+    "best_cv_weighted_mae": -float(result["best_score"]),
+    "test_metrics": metrics,
+    "rungs": result["rungs"],
+    "fits": result["fits"],
+    "cv_results": cv_results_to_json(result["cv_results"]),
+}
+write_json_atomic(training_report, "training_report.json")
+print(f"\nSaved training_report.json ({len(result['fits'])} fits profiled)")
+
+# ---------------------
+# 11) Optional: compare both search strategies
+# ---------------------
+if args.compare:
+    def summarize(res):
+        pred = res["best_estimator"].predict(X_test)
+        return {
+            "wall_s": res["wall_s"],
+            "fits": res["n_fits"],
+            "best_cv_weighted_mae": -float(res["best_score"]),
+            "test_weighted_mae": float(weighted_mae(y_test, pred)),
+            "test_mae": float(mean_absolute_error(y_test, pred)),
+            "best_params": {k: v.item() if isinstance(v, np.generic) else v
+                            for k, v in res["best_params"].items()},
+            **({"rungs": res["rungs"]} if res["rungs"] else {}),
+        }
+
+    other = "random" if args.search == "halving" else "halving"
+    report = {
+        "dataset_hash": data_meta["hash"],
+        args.search: summarize(result),
+        other: summarize(SEARCHES[other]()),
+    }
+    report["speedup"] = report["random"]["wall_s"] / report["halving"]["wall_s"]
+    write_json_atomic(report, "search_report.json")
+    print("\n=== Search comparison (saved search_report.json) ===")
+    for name in ("random", "halving"):
+        r = report[name]
+        print(f"{name:8s} {r['wall_s']:8.1f}s  {r['fits']:4d} fits  "
+              f"CV wMAE {r['best_cv_weighted_mae']:.4f}  test wMAE {r['test_weighted_mae']:.4f}")
+    print(f"Halving speedup: {report['speedup']:.2f}x")
 # ---------------------
@@ -0,0 +1,248 @@
+# Exact TreeSHAP feature attributions for the compiled tree ensemble.
+#
+# Path-dependent TreeSHAP (Lundberg et al.) treats every leaf as a product
+# game over the features on its path: feature j contributes its "one
+# fraction" o_j (1 if x satisfies all of the path's splits on j, else 0) when
+# present and its "zero fraction" z_j (share of training samples that took
+# the path's branches on j) when absent. The Shapley value of feature i is
+#
+#   phi_i = sum over leaves  v * (o_i - z_i) * Int_0^1 prod_{j != i} (o_j u + (1 - u) z_j) du
+#
+# since Shapley weights are Beta integrals. The integrand is a polynomial of
+# degree < path length, so a few Gauss-Legendre nodes integrate it exactly.
+#
+# Everything that does not depend on the row is precomputed once when the
+# explainer is built: each leaf's path features, intervals, missing-value
+# directions and zero fractions. Since o_j is 0 or 1, a leaf with d path
+# features has only 2**d possible patterns, so (as in Fast TreeSHAP v2) every
+# leaf's contributions are tabulated for all of them. Explaining a row is then
+# one comparison per (leaf, feature) pair, a pattern lookup and a scatter-add.
+# If the table would exceed WINE_SHAP_TABLE_MB (deep trees), the integral is
+# evaluated per row instead. Contributions are in the model's raw (link) space and satisfy
+#
+#   expected_value + contributions.sum() == raw prediction
+#
+#   python treeshap.py            # check additivity and time single-row/batch explanations
+
+import math
+import os
+
+import numpy as np
+
+# Bounds the temporaries when building tables and explaining batches
+MAX_CHUNK_ELEMENTS = 4_000_000
+# Largest pattern table to precompute, in MB (float64 entries)
+TABLE_MB = float(os.environ.get("WINE_SHAP_TABLE_MB", "256"))
+
+
+class TreeExplainer:
+    """Per-feature contributions for a CompiledModel with training node counts."""
+
+    def __init__(self, model, table_mb=TABLE_MB):
+        if getattr(model, "node_count", None) is None:
+            raise ValueError("The model has no per-node training counts; re-export it to explain predictions")
+        self.model = model
+        self.n_features = int(model.feature_idx.max()) + 1 if model.n_nodes else 0
+        if model.feature_names is not None:
+            self.n_features = len(model.feature_names)
+        self._build_paths()
+        self._tables = None
+        if self.n_entries and self._table_size() * 8 <= table_mb * 2 ** 20:
+            self._build_table()
+
+    def _build_paths(self):
+        m, n_features = self.model, self.n_features
+        count = np.asarray(m.node_count, dtype=np.float64)
+        node = np.asarray(m.roots, dtype=np.int64)
+        shape = (len(node), n_features)
+        lo, hi = np.full(shape, -np.inf), np.full(shape, np.inf)
+        zero = np.ones(shape)
+        nan_ok = np.ones(shape, dtype=bool)
+        used = np.zeros(shape, dtype=bool)
+        leaves = []
+        # Walk all trees one level at a time, splitting each path state in two
+        while len(node):
+            leaf = m.left[node] == node
+            leaves.append((node[leaf], lo[leaf], hi[leaf], zero[leaf], nan_ok[leaf], used[leaf]))
+            keep = ~leaf
+            node, lo, hi, zero, nan_ok, used = node[keep], lo[keep], hi[keep], zero[keep], nan_ok[keep], used[keep]
+            rows = np.arange(len(node))
+            feature = m.feature_idx[node]
+            threshold = m.threshold[node]
+            left, right = m.left[node], m.right[node]
+            parent = np.maximum(count[node], 1.0)
+            missing_left = m.missing_go_left[node].astype(bool)
+
+            l_hi, l_zero, l_nan, l_used = hi.copy(), zero.copy(), nan_ok.copy(), used.copy()
+            l_hi[rows, feature] = np.minimum(l_hi[rows, feature], threshold)
+            l_zero[rows, feature] *= count[left] / parent
+            l_nan[rows, feature] &= missing_left
+            l_used[rows, feature] = True
+            r_lo, r_zero, r_nan, r_used = lo.copy(), zero, nan_ok, used
+            r_lo[rows, feature] = np.maximum(r_lo[rows, feature], threshold)
+            r_zero[rows, feature] *= count[right] / parent
+            r_nan[rows, feature] &= ~missing_left
+            r_used[rows, feature] = True
+
+            node = np.concatenate([left, right])
+            lo, hi = np.concatenate([lo, r_lo]), np.concatenate([l_hi, hi])
+            zero = np.concatenate([l_zero, r_zero])
+            nan_ok = np.concatenate([l_nan, r_nan])
+            used = np.concatenate([l_used, r_used])
+
+        leaf_node, lo, hi, zero, nan_ok, used = (np.concatenate(parts) for parts in zip(*leaves))
+        value = np.asarray(m.value, dtype=np.float64)[leaf_node]
+        # E[f] under the training distribution of each path: every leaf weighted by its zero fractions
+        self.expected_value = float(m.baseline + (value * zero.prod(axis=1)).sum())
+
+        # Ragged (leaf, feature) entries for the features each path actually splits on.
+        # Leaves are ordered by path length so that each length is one dense
+        # (leaves x length) block; single-leaf trees only add to the expected value.
+        order = np.argsort(used.sum(axis=1), kind="stable")
+        lo, hi, zero, nan_ok, used, value = lo[order], hi[order], zero[order], nan_ok[order], used[order], value[order]
+        entry_leaf, entry_feature = np.nonzero(used)
+        self._feature = entry_feature
+        self._lo = lo[entry_leaf, entry_feature]
+        self._hi = hi[entry_leaf, entry_feature]
+        self._zero = zero[entry_leaf, entry_feature]
+        self._nan_ok = nan_ok[entry_leaf, entry_feature]
+        self._value = value[entry_leaf]
+        depth = used.sum(axis=1)
+        # (first entry, leaves, length) per block
+        self._blocks = []
+        start = 0
+        for d in np.unique(depth[depth > 0]):
+            n = int((depth == d).sum())
+            self._blocks.append((start, n, int(d)))
+            start += n * int(d)
+        # Exact for integrands of degree < 2 * nodes; the degree is below the longest path
+        longest = int(depth.max()) if len(entry_leaf) else 1
+        u, w = np.polynomial.legendre.leggauss(max(1, math.ceil(longest / 2)))
+        u, self._weights = (u + 1.0) / 2.0, w / 2.0
+        self._absent = (1.0 - u) * self._zero[:, None]
+        self._present = u + self._absent
+        self._onehot = np.zeros((len(entry_feature), self.n_features))
+        self._onehot[np.arange(len(entry_feature)), entry_feature] = 1.0
+
+    def _table_size(self):
+        return sum(n * 2 ** d * d for _, n, d in self._blocks)
+
+    def _build_table(self):
+        """Contributions of each leaf's path features for all 2**d one-patterns, per block."""
+        tables = []
+        for start, n, d in self._blocks:
+            bits = ((np.arange(2 ** d)[:, None] >> np.arange(d)) & 1).astype(bool)
+            table = np.empty((n, 2 ** d, d))
+            step = max(1, MAX_CHUNK_ELEMENTS // (2 ** d * d * len(self._weights)))
+            for first in range(0, n, step):
+                leaves = np.arange(first, min(first + step, n))
+                entries = start + leaves[:, None] * d + np.arange(d)
+                factors = np.where(bits[None, :, :, None], self._present[entries][:, None],
+                                   self._absent[entries][:, None])
+                # Product over the path's features, then divide each feature back out
+                products = factors.prod(axis=2)
+                integrals = (products[:, :, None, :] / factors) @ self._weights
+                table[leaves] = (self._value[entries[:, :1]][:, :, None]
+                                 * (bits[None] - self._zero[entries][:, None, :]) * integrals)
+            # Flattened to one row per (leaf, pattern); leaf l's rows start at l * 2**d
+            tables.append((table.reshape(-1, d), np.arange(n) * 2 ** d, 2.0 ** np.arange(d)))
+        self._tables = tables
+
+    @property
+    def n_entries(self):
+        return len(self._feature)
+
+    @property
+    def table_bytes(self):
+        return sum(table.nbytes for table, _, _ in self._tables or ())
+
+    def shap_values(self, X):
+        """Contributions of shape (n_rows, n_features) in raw model space."""
+        X = np.asarray(X, dtype=np.float64)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        out = np.zeros((len(X), self.n_features))
+        if not self.n_entries:
+            return out
+        if self._tables is not None:
+            # Row by row: the 1-D lookups stay in cache and beat a (rows x entries) batch
+            for i, x in enumerate(X):
+                entries = self._lookup(self._one(x.take(self._feature)))
+                out[i] = np.bincount(self._feature, weights=entries, minlength=self.n_features)
+            return out
+        chunk = max(1, MAX_CHUNK_ELEMENTS // (self.n_entries * len(self._weights)))
+        for start in range(0, len(X), chunk):
+            out[start:start + chunk] = self._explain_integral(X[start:start + chunk])
+        return out
+
+    def _one(self, x):
+        """Whether x satisfies each leaf's splits on each path feature (NaN: missing directions)."""
+        one = (self._lo < x) & (x <= self._hi)
+        missing = np.isnan(x)
+        if missing.any():
+            one = np.where(missing, self._nan_ok, one)
+        return one
+
+    def _lookup(self, one):
+        """Tabulated contribution of every entry given one row's one-pattern."""
+        out = np.empty(len(one))
+        for (start, n, d), (table, first_row, powers) in zip(self._blocks, self._tables):
+            block = one[start:start + n * d].reshape(n, d)
+            rows = first_row + (block @ powers).astype(np.intp)
+            out[start:start + n * d] = table.take(rows, axis=0).ravel()
+        return out
+
+    def _explain_integral(self, X):
+        one = self._one(X[:, self._feature])
+        factors = np.where(one[..., None], self._present, self._absent)
+        out = np.empty(one.shape)
+        for start, n, d in self._blocks:
+            block = factors[:, start:start + n * d].reshape(len(X), n, d, -1)
+            # Product over each leaf's path features, then divide each feature back out
+            products = block.prod(axis=2, keepdims=True)
+            out[:, start:start + n * d] = ((products / block) @ self._weights).reshape(len(X), -1)
+        return (self._value * (one - self._zero) * out) @ self._onehot
+
+    def explain(self, X):
+        """(contributions, expected_value); rows sum to the raw predictions."""
+        return self.shap_values(X), self.expected_value
+
+
+def main():
+    import time
+    import warnings
+
+    from wqm_format import WQM_PATH, load_wqm
+
+    warnings.filterwarnings("ignore", message="X does not have valid feature names")
+    model, meta = load_wqm(WQM_PATH)
+    t0 = time.perf_counter()
+    explainer = TreeExplainer(model)
+    build_ms = (time.perf_counter() - t0) * 1000.0
+    print(f"{model.n_trees} trees, {explainer.n_entries} path entries, "
+          f"{explainer.table_bytes / 2 ** 20:.1f} MB pattern table, built in {build_ms:.1f} ms")
+
+    rng = np.random.default_rng(0)
+    scale = np.array([15, 1.5, 1, 30, 0.3, 100, 300, 1.01, 4, 1.5, 15])[:explainer.n_features]
+    X = rng.random((2000, explainer.n_features)) * scale
+    X[rng.random(X.shape) < 0.05] = np.nan
+    contributions, base = explainer.explain(X)
+    error = np.abs(base + contributions.sum(axis=1) - model.raw_predict(X)).max()
+    print(f"additivity: max |base + sum(contributions) - raw prediction| = {error:.2e} over {len(X)} rows")
+
+    row = X[:1]
+    explainer.shap_values(row)
+    times = []
+    for _ in range(200):
+        t0 = time.perf_counter()
+        explainer.shap_values(row)
+        times.append(time.perf_counter() - t0)
+    t0 = time.perf_counter()
+    explainer.shap_values(X)
+    batch_s = time.perf_counter() - t0
+    print(f"single row: {np.median(times) * 1000:.3f} ms median; "
+          f"batch of {len(X)}: {batch_s * 1000:.0f} ms ({batch_s / len(X) * 1000:.3f} ms/row)")
+
+
+if __name__ == "__main__":
+    main()
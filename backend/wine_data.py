@@ -0,0 +1,153 @@
+# Shared, offline-capable access to the UCI Wine Quality dataset (id=186).
+#
+# The first call fetches the dataset (or reads a local CSV stand-in) and stores
+# it under data_cache/ as raw .npy arrays plus a small meta.json with a content
+# hash. Every later call memory-maps those arrays: no network, no CSV parsing.
+#
+#   python wine_data.py                     # fetch from UCI and cache
+#   python wine_data.py --csv wine.csv      # cache a local CSV instead (air-gapped boxes)
+#   python wine_data.py --refresh           # re-fetch and overwrite the cache
+
+import hashlib
+import json
+import os
+import shutil
+import time
+
+import numpy as np
+
+DEFAULT_CACHE_DIR = os.environ.get(
+    "WINE_DATA_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "data_cache")
+)
+# Point this at a local CSV to skip the UCI fetch entirely
+DEFAULT_CSV = os.environ.get("WINE_DATA_CSV")
+TARGET = "quality"
+# Extra columns some exports carry that are not model features
+NON_FEATURE_COLUMNS = ("color", "is_red", "type")
+
+
+def _content_hash(features, targets, columns):
+    h = hashlib.sha256()
+    h.update(json.dumps(columns).encode("utf-8"))
+    h.update(np.ascontiguousarray(features).tobytes())
+    h.update(np.ascontiguousarray(targets).tobytes())
+    return h.hexdigest()[:16]
+
+
+def _fetch_uci():
+    from ucimlrepo import fetch_ucirepo
+
+    print("Loading dataset from UCI repository (id=186)...")
+    wine_quality = fetch_ucirepo(id=186)
+    X = wine_quality.data.features
+    y = np.ravel(wine_quality.data.targets)
+    return X, y, "uci:186"
+
+
+def _read_csv(path):
+    import pandas as pd
+
+    print(f"Loading dataset from local CSV {path}...")
+    # UCI's own CSVs are ';'-separated; sep=None sniffs the delimiter
+    df = pd.read_csv(path, sep=None, engine="python")
+    df.columns = [c.strip().replace(" ", "_") for c in df.columns]
+    if TARGET not in df.columns:
+        raise ValueError(f"{path} has no '{TARGET}' column")
+    y = df.pop(TARGET).to_numpy()
+    X = df.drop(columns=[c for c in NON_FEATURE_COLUMNS if c in df.columns])
+    return X, y, f"csv:{os.path.abspath(path)}"
+
+
+def _write_cache(cache_dir, X, y, source):
+    columns = list(X.columns)
+    features = np.ascontiguousarray(X.to_numpy(dtype=np.float64))
+    targets = np.ascontiguousarray(np.asarray(y, dtype=np.int64))
+    meta = {
+        "columns": columns,
+        "target": TARGET,
+        "shape": list(features.shape),
+        "hash": _content_hash(features, targets, columns),
+        "source": source,
+        "created": time.time(),
+    }
+    # Build next to the final location, then swap in with renames
+    tmp_dir = f"{cache_dir}.{os.getpid()}.tmp"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+    np.save(os.path.join(tmp_dir, "features.npy"), features)
+    np.save(os.path.join(tmp_dir, "targets.npy"), targets)
+    with open(os.path.join(tmp_dir, "meta.json"), "w") as f:
+        json.dump(meta, f, indent=2)
+    old_dir = f"{cache_dir}.{os.getpid()}.old"
+    if os.path.isdir(cache_dir):
+        os.rename(cache_dir, old_dir)
+    os.rename(tmp_dir, cache_dir)
+    shutil.rmtree(old_dir, ignore_errors=True)
+    print(f"Cached dataset {meta['shape']} (hash {meta['hash']}) in {cache_dir}")
+    return meta
+
+
+def read_meta(cache_dir=DEFAULT_CACHE_DIR):
+    """meta.json of the cached dataset, or None if nothing is cached yet."""
+    try:
+        with open(os.path.join(cache_dir, "meta.json"), "r") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def ensure_cached(csv_path=DEFAULT_CSV, refresh=False, cache_dir=DEFAULT_CACHE_DIR):
+    """Make sure the dataset is cached; returns its meta. Only this hits the network."""
+    meta = None if refresh else read_meta(cache_dir)
+    if meta is not None and (csv_path is None or meta["source"] == f"csv:{os.path.abspath(csv_path)}"):
+        return meta
+    X, y, source = _read_csv(csv_path) if csv_path else _fetch_uci()
+    return _write_cache(cache_dir, X, y, source)
+
+
+def load_wine_data(csv_path=DEFAULT_CSV, refresh=False, cache_dir=DEFAULT_CACHE_DIR, mmap=True):
+    """Return (X DataFrame of features, y 1-D int array, meta dict)."""
+    # Deferred so that meta-only callers (pipeline.py's no-op check) skip pandas
+    import pandas as pd
+
+    meta = ensure_cached(csv_path, refresh, cache_dir)
+    mmap_mode = "r" if mmap else None
+    features = np.load(os.path.join(cache_dir, "features.npy"), mmap_mode=mmap_mode)
+    targets = np.load(os.path.join(cache_dir, "targets.npy"), mmap_mode=mmap_mode)
+    X = pd.DataFrame(features, columns=meta["columns"], copy=False)
+    return X, np.asarray(targets), meta
+
+
+def read_labelled_csv(path, columns):
+    """Newly labelled samples from a CSV: (X with `columns` in order, y int array)."""
+    X, y, _ = _read_csv(path)
+    missing = [c for c in columns if c not in X.columns]
+    if missing:
+        raise ValueError(f"{path} is missing feature columns: {missing}")
+    return X[columns].astype(np.float64), np.asarray(y, dtype=np.int64)
+
+
+def load_wine_frame(csv_path=DEFAULT_CSV, refresh=False, cache_dir=DEFAULT_CACHE_DIR):
+    """Features and the quality target in one DataFrame (for EDA)."""
+    X, y, meta = load_wine_data(csv_path, refresh, cache_dir, mmap=False)
+    df = X.copy()
+    df[TARGET] = y
+    return df, meta
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Cache the wine quality dataset locally.")
+    parser.add_argument("--csv", default=DEFAULT_CSV, help="local CSV stand-in instead of the UCI fetch")
+    parser.add_argument("--refresh", action="store_true", help="re-fetch even if a cache exists")
+    parser.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR)
+    args = parser.parse_args()
+
+    t0 = time.perf_counter()
+    meta = ensure_cached(args.csv, args.refresh, args.cache_dir)
+    t1 = time.perf_counter()
+    X, y, _ = load_wine_data(args.csv, cache_dir=args.cache_dir)
+    t2 = time.perf_counter()
+    print(f"Dataset {meta['shape']} from {meta['source']} (hash {meta['hash']})")
+    print(f"ensure_cached: {(t1 - t0) * 1000:.1f} ms, cached load: {(t2 - t1) * 1000:.1f} ms")
@@ -0,0 +1,282 @@
+# .wqm: a versioned, self-describing binary artifact for the compiled model.
+#
+# Layout (little-endian):
+#
+#   0   magic  b"WQM\0"
+#   4   uint16 format version
+#   6   uint16 reserved (0)
+#   8   uint64 length of the JSON metadata
+#   16  uint64 total file length
+#   24  32-byte SHA-256 of everything after the header (metadata + arrays)
+#   56  JSON metadata: model parameters, feature names, training metrics and an
+#       index of the arrays (dtype, shape, byte offset)
+#   ... arrays, each starting on a 64-byte boundary
+#
+# Loading memory-maps the file and wraps each array with np.frombuffer, so
+# nothing is copied or unpickled and sklearn is never imported. Every process
+# loading the same file shares its page-cache pages.
+#
+#   python wqm_format.py export                  # best_model_wine_quality.joblib -> .wqm
+#   python wqm_format.py info best_model_wine_quality.wqm
+#   python wqm_format.py bench                   # load time and size vs. joblib
+
+import hashlib
+import json
+import mmap
+import os
+import struct
+import time
+
+import numpy as np
+
+from compiled_model import NODE_ARRAYS, CompiledModel, compile_pipeline
+
+MAGIC = b"WQM\x00"
+FORMAT_VERSION = 1
+HEADER = struct.Struct("<4sHHQQ32s")
+ALIGN = 64
+WQM_PATH = "best_model_wine_quality.wqm"
+
+
+class ArtifactError(ValueError):
+    """The file is not a readable .wqm artifact (bad magic, version or checksum)."""
+
+
+def _pad(n):
+    return (-n) % ALIGN
+
+
+def write_wqm(path, arrays, meta):
+    """Write `arrays` (name -> ndarray) and `meta` atomically; returns the checksum hex."""
+    arrays = {name: np.ascontiguousarray(a) for name, a in arrays.items()}
+    index = {}
+    # Offsets depend on the metadata length, which depends on the offsets;
+    # a couple of passes settle it (the index only grows by a few digits).
+    meta_bytes = b""
+    for _ in range(4):
+        start = HEADER.size + len(meta_bytes)
+        offset = start + _pad(start)
+        for name, a in arrays.items():
+            index[name] = {"dtype": a.dtype.str, "shape": list(a.shape), "offset": offset}
+            offset += a.nbytes + _pad(a.nbytes)
+        encoded = json.dumps({**meta, "arrays": index}, separators=(",", ":")).encode("utf-8")
+        if len(encoded) == len(meta_bytes):
+            break
+        meta_bytes = encoded
+    total = offset
+
+    body = bytearray(total - HEADER.size)
+    body[:len(meta_bytes)] = meta_bytes
+    for name, a in arrays.items():
+        at = index[name]["offset"] - HEADER.size
+        body[at:at + a.nbytes] = a.tobytes()
+    checksum = hashlib.sha256(body).digest()
+    header = HEADER.pack(MAGIC, FORMAT_VERSION, 0, len(meta_bytes), total, checksum)
+
+    tmp_path = os.path.join(os.path.dirname(os.path.abspath(path)), f".{os.path.basename(path)}.{os.getpid()}.tmp")
+    try:
+        with open(tmp_path, "wb") as f:
+            f.write(header)
+            f.write(body)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return checksum.hex()
+
+
+def read_wqm(path, verify=True):
+    """Map a .wqm file read-only; returns ({name: zero-copy ndarray view}, meta)."""
+    with open(path, "rb") as f:
+        try:
+            buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            raise ArtifactError(f"{path} is empty")
+    if len(buf) < HEADER.size:
+        raise ArtifactError(f"{path} is too short to be a .wqm artifact")
+    magic, version, _, meta_len, total, checksum = HEADER.unpack_from(buf, 0)
+    if magic != MAGIC:
+        raise ArtifactError(f"{path} is not a .wqm artifact")
+    if version > FORMAT_VERSION:
+        raise ArtifactError(f"{path} uses format version {version}; this reader supports up to {FORMAT_VERSION}")
+    if total != len(buf) or HEADER.size + meta_len > total:
+        raise ArtifactError(f"{path} is truncated ({len(buf)} of {total} bytes)")
+    if verify:
+        with memoryview(buf) as view:
+            if hashlib.sha256(view[HEADER.size:]).digest() != checksum:
+                raise ArtifactError(f"{path} failed its checksum (corrupted or partially written)")
+    meta = json.loads(bytes(buf[HEADER.size:HEADER.size + meta_len]))
+    meta["checksum"] = checksum.hex()
+    meta["format_version"] = version
+    arrays = {}
+    for name, spec in meta["arrays"].items():
+        dtype = np.dtype(spec["dtype"])
+        count = int(np.prod(spec["shape"], dtype=np.int64))
+        # The views keep the mapping alive; it is unmapped once they are garbage
+        arrays[name] = np.frombuffer(buf, dtype=dtype, count=count, offset=spec["offset"]).reshape(spec["shape"])
+    return arrays, meta
+
+
+def load_wqm(path, verify=True):
+    """(CompiledModel over zero-copy views, meta). meta carries feature_names,
+    metrics and the per-feature bin thresholds the model was trained with;
+    the model carries the per-node training counts when the file has them."""
+    arrays, meta = read_wqm(path, verify)
+    model_meta = meta["model"]
+    model = CompiledModel(
+        **{name: arrays[name] for name in NODE_ARRAYS},
+        baseline=model_meta["baseline"],
+        max_depth=model_meta["max_depth"],
+        feature_names=meta.get("feature_names"),
+        link=model_meta["link"],
+        node_count=arrays.get("node_count"),
+    )
+    if "bin_thresholds" in arrays:
+        offsets = arrays["bin_offsets"]
+        meta["bin_thresholds"] = [arrays["bin_thresholds"][offsets[i]:offsets[i + 1]]
+                                  for i in range(len(offsets) - 1)]
+    return model, meta
+
+
+def export_wqm(pipeline, path=WQM_PATH, feature_names=None, metrics=None, extra_meta=None):
+    """Compile a fitted HistGradientBoostingRegressor pipeline into a .wqm file."""
+    compiled = compile_pipeline(pipeline, feature_names)
+    estimator = pipeline.steps[-1][1] if hasattr(pipeline, "steps") else pipeline
+    arrays = {name: getattr(compiled, name) for name in NODE_ARRAYS}
+    # Training-time sample counts per node (used for attributions)
+    arrays["node_count"] = compiled.node_count
+    bin_mapper = getattr(estimator, "_bin_mapper", None)
+    if bin_mapper is not None:
+        thresholds = [np.asarray(t, dtype=np.float64) for t in bin_mapper.bin_thresholds_]
+        arrays["bin_thresholds"] = np.concatenate(thresholds) if thresholds else np.empty(0)
+        arrays["bin_offsets"] = np.cumsum([0] + [len(t) for t in thresholds]).astype(np.int64)
+    try:
+        import sklearn
+        producer = {"sklearn": sklearn.__version__}
+    except ImportError:
+        producer = {}
+    meta = {
+        "format": "wqm",
+        "created": time.time(),
+        "producer": producer,
+        "model": {
+            "type": type(estimator).__name__,
+            "baseline": compiled.baseline,
+            "max_depth": compiled.max_depth,
+            "link": compiled.link,
+            "n_trees": compiled.n_trees,
+            "n_nodes": compiled.n_nodes,
+        },
+        "feature_names": compiled.feature_names,
+        "metrics": metrics or {},
+        **(extra_meta or {}),
+    }
+    return write_wqm(path, arrays, meta)
+
+
+def _timed_subprocess(code):
+    import subprocess
+    import sys
+
+    t0 = time.perf_counter()
+    subprocess.run([sys.executable, "-c", code], check=True, cwd=os.path.dirname(os.path.abspath(__file__)))
+    return time.perf_counter() - t0
+
+
+def bench(joblib_path, wqm_path, repeats=20):
+    """Size, in-process load time and cold-start (fresh interpreter) load time."""
+    import warnings
+
+    import joblib
+
+    warnings.filterwarnings("ignore", message="X does not have valid feature names")
+
+    def median_load(load):
+        times = []
+        for _ in range(repeats):
+            t0 = time.perf_counter()
+            load()
+            times.append(time.perf_counter() - t0)
+        return float(np.median(times))
+
+    joblib_abs, wqm_abs = os.path.abspath(joblib_path), os.path.abspath(wqm_path)
+    X = np.random.default_rng(0).random((1, 11)) * 10
+    return {
+        "size_bytes": {"joblib": os.path.getsize(joblib_path), "wqm": os.path.getsize(wqm_path)},
+        "load_ms": {
+            "joblib": median_load(lambda: joblib.load(joblib_path)) * 1000.0,
+            "wqm": median_load(lambda: load_wqm(wqm_path)) * 1000.0,
+            "wqm_unverified": median_load(lambda: load_wqm(wqm_path, verify=False)) * 1000.0,
+        },
+        # Fresh interpreter: imports + load + first prediction
+        "cold_start_ms": {
+            "joblib": _timed_subprocess(
+                f"import warnings; warnings.simplefilter('ignore'); import joblib, numpy as np; "
+                f"m = joblib.load({joblib_abs!r}); m.predict(np.zeros((1, 11)))"
+            ) * 1000.0,
+            "wqm": _timed_subprocess(
+                f"import numpy as np; from wqm_format import load_wqm; m, _ = load_wqm({wqm_abs!r}); "
+                f"m.predict(np.zeros((1, 11)))"
+            ) * 1000.0,
+            "python_baseline": _timed_subprocess("import numpy") * 1000.0,
+        },
+        "max_abs_diff": float(np.abs(joblib.load(joblib_path).predict(X) - load_wqm(wqm_path)[0].predict(X)).max()),
+    }
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Export, inspect and benchmark .wqm model artifacts.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p_export = sub.add_parser("export", help="convert a joblib pipeline to .wqm")
+    p_export.add_argument("model", nargs="?", default="best_model_wine_quality.joblib")
+    p_export.add_argument("-o", "--output", default=WQM_PATH)
+    p_export.add_argument("--features", default="feature_names.json")
+    p_export.add_argument("--metrics", default="metrics.json")
+    p_info = sub.add_parser("info", help="print the header and metadata of a .wqm file")
+    p_info.add_argument("path", nargs="?", default=WQM_PATH)
+    p_bench = sub.add_parser("bench", help="compare load time and size with joblib")
+    p_bench.add_argument("--joblib", default="best_model_wine_quality.joblib")
+    p_bench.add_argument("--wqm", default=WQM_PATH)
+    p_bench.add_argument("--output", help="write the results as JSON")
+    args = parser.parse_args()
+
+    if args.command == "export":
+        import joblib
+
+        def read_json(path):
+            if not os.path.exists(path):
+                return None
+            with open(path, "r") as f:
+                return json.load(f)
+
+        with open(args.model, "rb") as f:
+            model_version = hashlib.sha256(f.read()).hexdigest()[:12]
+        checksum = export_wqm(joblib.load(args.model), args.output,
+                              feature_names=read_json(args.features), metrics=read_json(args.metrics),
+                              extra_meta={"model_version": model_version})
+        print(f"Wrote {args.output} ({os.path.getsize(args.output)} bytes, sha256 {checksum[:12]})")
+    elif args.command == "info":
+        arrays, meta = read_wqm(args.path)
+        print(json.dumps({k: v for k, v in meta.items() if k != "arrays"}, indent=2))
+        for name, a in arrays.items():
+            print(f"  {name:16s} {a.dtype.str:5s} {a.shape}")
+    else:
+        results = bench(args.joblib, args.wqm)
+        size, load, cold = results["size_bytes"], results["load_ms"], results["cold_start_ms"]
+        print(f"size:        joblib {size['joblib']:>9d} B   wqm {size['wqm']:>9d} B "
+              f"({size['wqm'] / size['joblib']:.0%})")
+        print(f"load:        joblib {load['joblib']:9.3f} ms  wqm {load['wqm']:9.3f} ms "
+              f"(unverified {load['wqm_unverified']:.3f} ms)")
+        print(f"cold start:  joblib {cold['joblib']:9.1f} ms  wqm {cold['wqm']:9.1f} ms "
+              f"(bare interpreter + numpy {cold['python_baseline']:.1f} ms)")
+        print(f"max |prediction difference|: {results['max_abs_diff']:.2e}")
+        if args.output:
+            with open(args.output, "w") as f:
+                json.dump(results, f, indent=2)
+            print(f"Saved {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -6,6 +6,16 @@ import { Loader2, AlertCircle, Wine } from 'lucide-react';
 
 const API_URL = import.meta.env.VITE_API_URL || 'http://localhost:8000';
 
+// FastAPI sends `detail` as a string, or for a rejected body as a list of
+// {loc, msg} errors (e.g. loc ["body", "features", "alcohol"])
+const formatDetail = (detail) => {
+    if (!Array.isArray(detail)) return typeof detail === 'string' ? detail : JSON.stringify(detail);
+    return detail.map(({ loc = [], msg }) => {
+        const field = loc.filter(part => part !== 'body').join('.');
+        return field ? `${field}: ${msg}` : msg;
+    }).join('; ');
+};
+
 export default function Prediction() {
     const [features, setFeatures] = useState([]);
     const [formData, setFormData] = useState({});
@@ -47,11 +57,12 @@ export default function Prediction() {
         setPredicting(true);
         setResult(null);
         try {
-            const res = await axios.post(`${API_URL}/predict`, { features: formData });
+            const res = await axios.post(`${API_URL}/predict?explain=true`, { features: formData });
             setResult(res.data);
         } catch (err) {
             console.error(err);
-            setError("Prediction failed. " + (err.response?.data?.detail || err.message));
+            const detail = err.response?.data?.detail;
+            setError("Prediction failed. " + (detail ? formatDetail(detail) : err.message));
         } finally {
             setPredicting(false);
         }
@@ -117,6 +128,22 @@ export default function Prediction() {
                                 <h4 className="text-gold mb-2 text-sm uppercase font-bold">Sommelier Notes</h4>
                                 <p className="text-gray-300 italic text-sm leading-relaxed">"{result.advice}"</p>
                             </div>
+                            {result.explanation && (
+                                <div className="pt-2 border-t border-gray-700">
+                                    <h4 className="text-gold mb-2 text-sm uppercase font-bold">What Drove the Score</h4>
+                                    <p className="text-gray-500 text-xs mb-2">Average wine: {result.explanation.base_value.toFixed(2)}</p>
+                                    {Object.entries(result.explanation.contributions)
+                                        .sort((a, b) => Math.abs(b[1]) - Math.abs(a[1]))
+                                        .map(([feature, value]) => (
+                                            <div key={feature} className="flex justify-between text-sm">
+                                                <span className="text-gray-400">{feature.replace(/_/g, ' ')}</span>
+                                                <span className={value >= 0 ? 'text-green-400' : 'text-red-400'}>
+                                                    {value >= 0 ? '+' : ''}{value.toFixed(2)}
+                                                </span>
+                                            </div>
+                                        ))}
+                                </div>
+                            )}
                         </motion.div>
                     ) : (
                         <div className="bg-dark-card/50 p-8 rounded-xl border border-dashed border-gray-700 text-center text-gray-500 h-64 flex flex-col items-center justify-center">